@@ -0,0 +1,140 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark for the order compiles are started in.
+
+Simulates a build of a few libraries and an executable that links against them, with compiles of uneven length (most
+short, a few long) and a link for each project that starts once all of its compiles and those of the projects it
+links against are done. Compiles are run through _jobs.WorkerPool in the order they're queued, as they used to be, and
+by their critical path as estimated by _durations.DurationHistory from the durations of an earlier build. Times are
+scaled down so the whole thing takes a few seconds.
+
+Usage: python critical_path_benchmark.py [workers]
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _durations
+from csbuild import _jobs
+
+#Seconds of simulated time per second of real time.
+_SCALE = 0.01
+
+
+class Project( object ):
+	def __init__( self, key, depends, compiles, link ):
+		self.key = key
+		self.reconciledLinkDepends = depends
+		self.srcDepends = []
+		self.compiles = compiles
+		self.link = link
+
+
+class Job( object ):
+	def __init__( self, obj, duration, priority ):
+		self.obj = obj
+		self.duration = duration
+		self.priority = priority
+
+	def Run( self ):
+		time.sleep( self.duration * _SCALE )
+
+
+def MakeProjects( ):
+	rand = random.Random( 1 )
+	projects = []
+	for name in ( "core", "render", "audio", "net" ):
+		depends = ["core"] if name != "core" else []
+		compiles = dict( ( "{}/{}.o".format( name, i ), rand.choice( ( 1, 1, 1, 2, 3 ) ) ) for i in range( 30 ) )
+		#A handful of compiles that take far longer than the rest, as template-heavy files tend to.
+		for i in range( 2 ):
+			compiles["{}/heavy{}.o".format( name, i )] = 25
+		projects.append( Project( name, depends, compiles, 8 ) )
+	projects.append( Project( "app", ["core", "render", "audio", "net"],
+		dict( ( "app/{}.o".format( i ), 2 ) for i in range( 20 ) ), 15 ) )
+	return projects
+
+
+def Simulate( projects, numWorkers, history ):
+	"""Run every compile, then each project's link as soon as it can start. Returns the simulated makespan."""
+	pool = _jobs.WorkerPool( numWorkers )
+	done = dict( ( project.key, threading.Event( ) ) for project in projects )
+	remaining = dict( ( project.key, len( project.compiles ) ) for project in projects )
+	owner = {}
+
+	linkPaths = history.GetLinkPaths( projects ) if history is not None else None
+	start = time.time( )
+	for project in projects:
+		estimates = history.EstimateCompiles( list( project.compiles ) ) if history is not None else None
+		for obj, duration in sorted( project.compiles.items( ) ):
+			priority = estimates[obj] + linkPaths[project.key] if history is not None else 0
+			owner[obj] = project
+			pool.Submit( Job( obj, duration, priority ) )
+
+	def Link( project ):
+		for depend in project.reconciledLinkDepends:
+			done[depend].wait( )
+		time.sleep( project.link * _SCALE )
+		done[project.key].set( )
+
+	linkers = []
+	while pool.GetOutstanding( ):
+		for job in pool.Wait( ):
+			project = owner[job.obj]
+			remaining[project.key] -= 1
+			if not remaining[project.key]:
+				linker = threading.Thread( target = Link, args = ( project, ) )
+				linker.start( )
+				linkers.append( linker )
+	for linker in linkers:
+		linker.join( )
+	pool.Close( )
+	return ( time.time( ) - start ) / _SCALE
+
+
+def Run( numWorkers ):
+	projects = MakeProjects( )
+	history = _durations.DurationHistory( )
+	for project in projects:
+		for obj, duration in project.compiles.items( ):
+			history.RecordCompile( obj, duration )
+		history.RecordLink( project.key, project.link )
+
+	totalWork = sum( sum( project.compiles.values( ) ) for project in projects ) / float( numWorkers )
+	print( "{} workers, {:.0f}s of compiles per worker".format( numWorkers, totalWork ) )
+	print( "{:<16} {:>12}".format( "order", "build (s)" ) )
+	fifo = Simulate( projects, numWorkers, None )
+	print( "{:<16} {:>12.1f}".format( "queued", fifo ) )
+	critical = Simulate( projects, numWorkers, history )
+	print( "{:<16} {:>12.1f}".format( "critical path", critical ) )
+	print( "speedup: {:.2f}x".format( fifo / critical ) )
+
+
+if __name__ == "__main__":
+	Run( int( sys.argv[1] ) if len( sys.argv ) > 1 else 8 )
@@ -0,0 +1,142 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Micro-benchmark for the #include scanner used when following headers.
+
+Generates a few representative headers (a large generated protobuf-style header, a Boost-style header that's mostly
+includes, and a small hand-written header) and times _utils.GetIncludedFiles against the old line-by-line scanner.
+Additional files to time can be passed on the command line.
+
+Usage: python include_scan_benchmark.py [file ...]
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _utils
+
+def LegacyGetIncludedFiles( headerFile ):
+	"""The line-based scanner GetIncludedFiles replaced, kept here as a baseline."""
+	headers = []
+	if sys.version_info >= (3, 0):
+		f = open( headerFile, encoding = "latin-1" )
+	else:
+		f = open( headerFile )
+	with f:
+		for line in f:
+			if line[0] != '#':
+				continue
+
+			RMatch = re.search( r"#\s*include\s*[<\"](.*?)[\">]", line )
+			if RMatch is None:
+				continue
+
+			if "." not in RMatch.group( 1 ):
+				continue
+
+			headers.append( RMatch.group( 1 ) )
+
+	return headers
+
+
+def WriteProtobufHeader( path ):
+	with open( path, "w" ) as f:
+		f.write( "// Generated by the protocol buffer compiler.  DO NOT EDIT!\n" )
+		f.write( "#ifndef PROTOBUF_bench_2eproto__INCLUDED\n#define PROTOBUF_bench_2eproto__INCLUDED\n\n" )
+		f.write( "#include <string>\n" )
+		for name in ( "stubs/common.h", "generated_message_util.h", "message.h", "repeated_field.h",
+				"extension_set.h", "unknown_field_set.h" ):
+			f.write( "#include <google/protobuf/{}>\n".format( name ) )
+		f.write( "#include \"bench_base.pb.h\"\n\n" )
+		for i in range( 2000 ):
+			f.write( "class Message{0} : public ::google::protobuf::Message {{\n public:\n".format( i ) )
+			f.write( "  Message{0}();\n  virtual ~Message{0}();\n".format( i ) )
+			for j in range( 10 ):
+				f.write( "  // optional int32 field_{0} = {0};\n".format( j ) )
+				f.write( "  inline bool has_field_{0}() const;\n  inline ::google::protobuf::int32 field_{0}() const;\n".format( j ) )
+			f.write( "  static const char* kName() {{ return \"bench.Message{0}\"; }}\n}};\n\n".format( i ) )
+		f.write( "#endif  // PROTOBUF_bench_2eproto__INCLUDED\n" )
+
+
+def WriteBoostHeader( path ):
+	with open( path, "w" ) as f:
+		f.write( "//  Copyright (c) 2001-2011 Example Authors\n//\n/*\n * Distributed under the Boost Software License\n */\n" )
+		f.write( "#if !defined(BENCH_ALL_HPP)\n#define BENCH_ALL_HPP\n\n#if defined(_MSC_VER)\n#pragma once\n#endif\n\n" )
+		for i in range( 150 ):
+			f.write( "#include <boost/bench/detail/part_{}.hpp>\n".format( i ) )
+			if i % 10 == 0:
+				f.write( "/* #include <boost/bench/detail/disabled_{}.hpp> */\n".format( i ) )
+		f.write( "\n#endif\n" )
+
+
+def WriteSmallHeader( path ):
+	with open( path, "w" ) as f:
+		f.write( "#pragma once\n\n" )
+		for i in range( 20 ):
+			f.write( "#include \"module_{}.h\"\n".format( i ) )
+		f.write( "\n/*\n#include \"old_module.h\"\n*/\n\nclass Small\n{\npublic:\n\tvoid Run();\n};\n" )
+
+
+def Time( func, path ):
+	iterations = 0
+	start = time.time( )
+	elapsed = 0
+	while elapsed < 0.5:
+		func( path )
+		iterations += 1
+		elapsed = time.time( ) - start
+	return elapsed / iterations * 1000
+
+
+def Run( paths ):
+	#Include counts can legitimately differ: the legacy scanner follows directives inside block comments, misses
+	#indented ones, and leaves out system headers without an extension.
+	print( "{:<24} {:>10} {:>8} {:>8} {:>12} {:>12} {:>8}".format(
+		"file", "size", "legacy", "new", "legacy (ms)", "new (ms)", "speedup" ) )
+	for path in paths:
+		legacyCount = len( LegacyGetIncludedFiles( path ) )
+		newCount = len( _utils.GetIncludedFiles( path ) )
+		legacyTime = Time( LegacyGetIncludedFiles, path )
+		newTime = Time( _utils.GetIncludedFiles, path )
+		print( "{:<24} {:>10} {:>8} {:>8} {:>12.3f} {:>12.3f} {:>7.1f}x".format( os.path.basename( path )[:24],
+			os.path.getsize( path ), legacyCount, newCount, legacyTime, newTime, legacyTime / newTime ) )
+
+
+if __name__ == "__main__":
+	tempDir = tempfile.mkdtemp( )
+	try:
+		generated = []
+		for name, writer in ( ( "bench.pb.h", WriteProtobufHeader ), ( "bench_all.hpp", WriteBoostHeader ),
+				( "small.h", WriteSmallHeader ) ):
+			path = os.path.join( tempDir, name )
+			writer( path )
+			generated.append( path )
+		Run( generated + sys.argv[1:] )
+	finally:
+		shutil.rmtree( tempDir )
@@ -0,0 +1,124 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark for running processes through _jobs.WorkerPool and _async_engine.AsyncEngine.
+
+Each job runs one process, standing in for a compiler: one that exits straight away, one that writes a few megabytes
+of output for the job to collect, and one that takes a while. The time per job and the most threads alive at once are
+printed for each engine at a few -j values; the worker pool needs a thread per job running at once, and the async
+engine the same few whatever -j is.
+
+Usage: python process_engine_benchmark.py [jobs]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _async_engine
+from csbuild import _jobs
+
+
+class Job( object ):
+	def __init__( self, command ):
+		self.priority = 0
+		self.command = command
+
+	def Run( self ):
+		_jobs.RunSteps( self.Steps( ) )
+
+	def Steps( self ):
+		yield _jobs.Process( self.command, None )
+
+
+class PeakThreads( object ):
+	"""Samples the number of live threads from a thread of its own."""
+	def __init__( self ):
+		self.peak = 0
+		self._running = True
+		self._thread = threading.Thread( target = self._Sample )
+		self._thread.start( )
+
+	def _Sample( self ):
+		while self._running:
+			self.peak = max( self.peak, threading.active_count( ) - 2 )
+			time.sleep( 0.0005 )
+
+	def Stop( self ):
+		self._running = False
+		self._thread.join( )
+		return self.peak
+
+
+def Time( engine, command, jobCount ):
+	jobs = [Job( command ) for i in range( jobCount )]
+	sampler = PeakThreads( )
+	start = time.time( )
+	for job in jobs:
+		engine.Submit( job )
+	while engine.GetOutstanding( ):
+		engine.Wait( )
+	engine.Wait( )
+	elapsed = time.time( ) - start
+	return elapsed, sampler.Stop( )
+
+
+def Run( jobCount ):
+	if not _async_engine.available:
+		print( "asyncio can't be used to run processes here." )
+		return
+
+	tempDir = tempfile.mkdtemp( )
+	try:
+		bigFile = os.path.join( tempDir, "output.txt" )
+		with open( bigFile, "w" ) as f:
+			for i in range( 50000 ):
+				f.write( "warning: line {} of some rather long compiler output\n".format( i ) )
+
+		commands = (
+			( "exit", "true", jobCount ),
+			( "output", "cat {}".format( bigFile ), jobCount // 4 ),
+			( "sleep", "sleep 0.05", jobCount // 2 ),
+		)
+
+		print( "{:<8} {:<8} {:>8} {:>14} {:>14}".format( "process", "engine", "-j", "per job (ms)", "peak threads" ) )
+		for numProcesses in ( 8, 64 ):
+			#One engine at a time, so the worker pool's idle threads aren't counted against the async engine.
+			for engineName, engineType in ( ( "threads", _jobs.WorkerPool ), ( "asyncio", _async_engine.AsyncEngine ) ):
+				engine = engineType( numProcesses )
+				for name, command, count in commands:
+					elapsed, peak = Time( engine, command, count )
+					print( "{:<8} {:<8} {:>8} {:>14.2f} {:>14}".format( name, engineName, numProcesses,
+						elapsed / count * 1000, peak ) )
+				engine.Close( )
+	finally:
+		shutil.rmtree( tempDir )
+
+
+if __name__ == "__main__":
+	Run( int( sys.argv[1] ) if len( sys.argv ) > 1 else 800 )
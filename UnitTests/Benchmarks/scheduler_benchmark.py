@@ -0,0 +1,134 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark for the overhead of scheduling compile jobs.
+
+Runs jobs that do nothing through _jobs.WorkerPool and through the thread-per-compile scheduling it replaced, where
+every compile got its own thread gated by a semaphore, plus two more threads to read the compiler's output. The time
+per job is pure scheduling overhead. Jobs that take a couple of milliseconds, standing in for a compiler, are run as well
+to show how many threads each approach has alive at once.
+
+Usage: python scheduler_benchmark.py [jobs]
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _jobs
+
+
+class Job( object ):
+	def __init__( self, duration ):
+		self.priority = 0
+		self.duration = duration
+
+	def Run( self ):
+		if self.duration:
+			time.sleep( self.duration )
+
+
+class PeakThreads( object ):
+	"""Samples the number of live threads from a thread of its own."""
+	def __init__( self ):
+		self.peak = 0
+		self._running = True
+		self._thread = threading.Thread( target = self._Sample )
+		self._thread.start( )
+
+	def _Sample( self ):
+		while self._running:
+			self.peak = max( self.peak, threading.active_count( ) - 2 )
+			time.sleep( 0.0005 )
+
+	def Stop( self ):
+		self._running = False
+		self._thread.join( )
+		return self.peak
+
+
+def LegacySchedule( jobs, numThreads ):
+	"""The scheduling the worker pool replaced, kept here as a baseline."""
+	semaphore = threading.BoundedSemaphore( value = numThreads )
+
+	class ThreadedBuild( threading.Thread ):
+		def __init__( self, job ):
+			threading.Thread.__init__( self )
+			self.job = job
+
+		def run( self ):
+			readers = [threading.Thread( target = self.job.Run ), threading.Thread( target = lambda: None )]
+			for reader in readers:
+				reader.start( )
+			for reader in readers:
+				reader.join( )
+			semaphore.release( )
+
+	for job in jobs:
+		semaphore.acquire( True )
+		ThreadedBuild( job ).start( )
+
+	for i in range( numThreads ):
+		semaphore.acquire( True )
+	for i in range( numThreads ):
+		semaphore.release( )
+
+
+def PoolSchedule( jobs, numThreads, pool ):
+	for job in jobs:
+		pool.Submit( job )
+	while pool.GetOutstanding( ):
+		pool.Wait( )
+	pool.Wait( )
+
+
+def Time( schedule, jobCount, duration, numThreads, pool = None ):
+	jobs = [Job( duration ) for i in range( jobCount )]
+	sampler = PeakThreads( )
+	start = time.time( )
+	if pool is None:
+		schedule( jobs, numThreads )
+	else:
+		schedule( jobs, numThreads, pool )
+	elapsed = time.time( ) - start
+	return elapsed, sampler.Stop( )
+
+
+def Run( jobCount ):
+	print( "{:<8} {:>8} {:>10} {:>16} {:>14}".format( "threads", "job (ms)", "scheduler", "per job (us)", "peak threads" ) )
+	for numThreads in ( 8, 64 ):
+		pool = _jobs.WorkerPool( numThreads )
+		for duration in ( 0, 0.002 ):
+			count = jobCount if not duration else jobCount // 20
+			for name, schedule, arg in ( ( "legacy", LegacySchedule, None ), ( "pool", PoolSchedule, pool ) ):
+				elapsed, peak = Time( schedule, count, duration, numThreads, arg )
+				print( "{:<8} {:>8} {:>10} {:>16.1f} {:>14}".format( numThreads, duration * 1000, name,
+					elapsed / count * 1000000, peak ) )
+		pool.Close( )
+
+
+if __name__ == "__main__":
+	Run( int( sys.argv[1] ) if len( sys.argv ) > 1 else 20000 )
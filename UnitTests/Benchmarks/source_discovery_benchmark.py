@@ -0,0 +1,206 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark for the directory walk that finds a project's source and header files.
+
+Generates a tree of 100,000 files (sources, headers, and the sort of other files that end up in a source tree, with an
+excluded subtree and an object directory mixed in) and times projectSettings.get_files against the old os.walk and
+fnmatch based walk: from scratch, with a directory manifest recorded by an earlier run, and as another variant of a
+project that's already been searched this run. Another directory to search can be passed on the command line instead.
+
+Usage: python source_discovery_benchmark.py [directory]
+"""
+
+import fnmatch
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import log
+from csbuild import projectSettings
+from csbuild import _dir_manifest
+from csbuild import _shared_globals
+
+def LegacyGetFiles( project, sources, headers, cHeaders ):
+	"""The walk get_files replaced, kept here as a baseline."""
+	excludeFiles = set( )
+	excludeDirs = set( )
+	ambiguousHeaders = set()
+
+	for exclude in project.excludeFiles:
+		excludeFiles |= set( glob.glob( exclude ) )
+
+	for exclude in project.excludeDirs:
+		excludeDirs |= set( glob.glob( exclude ) )
+
+	for sourceDir in [ '.' ] + project.extraDirs:
+		for root, dirnames, filenames in os.walk( sourceDir ):
+			absroot = os.path.abspath( root )
+			if absroot in excludeDirs:
+				continue
+			if ".csbuild" in root or project.objDir in root or project.outputDir in root:
+				continue
+			if absroot == project.csbuildDir or absroot.startswith( project.csbuildDir ):
+				continue
+			bFound = False
+			for testDir in excludeDirs:
+				if absroot.startswith( testDir ):
+					bFound = True
+					break
+			if bFound:
+				continue
+			for extension in project.cppExtensions:
+				for filename in fnmatch.filter( filenames, '*'+extension ):
+					path = os.path.join( absroot, filename )
+					if path not in excludeFiles:
+						sources.append( os.path.abspath( path ) )
+						project.hasCppFiles = True
+			for extension in project.cExtensions:
+				for filename in fnmatch.filter( filenames, '*'+extension ):
+					path = os.path.join( absroot, filename )
+					if path not in excludeFiles:
+						sources.append( os.path.abspath( path ) )
+
+			sources.sort( key = str.lower )
+
+			for extension in project.cppHeaderExtensions:
+				for filename in fnmatch.filter( filenames, '*'+extension ):
+					path = os.path.join( absroot, filename )
+					if path not in excludeFiles:
+						headers.append( os.path.abspath( path ) )
+						project.hasCppFiles = True
+			for extension in project.cHeaderExtensions:
+				for filename in fnmatch.filter( filenames, '*'+extension ):
+					path = os.path.join( absroot, filename )
+					if path not in excludeFiles:
+						cHeaders.append( os.path.abspath( path ) )
+
+			for extension in project.ambiguousHeaderExtensions:
+				for filename in fnmatch.filter( filenames, '*'+extension ):
+					path = os.path.join( absroot, filename )
+					if path not in excludeFiles:
+						ambiguousHeaders.add( os.path.abspath( path ) )
+
+	if project.hasCppFiles:
+		headers += list(ambiguousHeaders)
+	else:
+		cHeaders += list(ambiguousHeaders)
+
+	headers.sort( key = str.lower )
+
+
+_extensions = ( ".cpp", ".cpp", ".cc", ".c", ".h", ".h", ".hpp", ".inl", ".txt", ".py", ".o", "" )
+
+def WriteTree( root, fileCount ):
+	"""Spread fileCount files over a tree of modules, each with a few levels of subdirectories."""
+	filesPerDir = 50
+	written = 0
+	module = 0
+	while written < fileCount:
+		for subdir in ( "", "src", "include", os.path.join( "src", "detail" ), "tests" ):
+			directory = os.path.join( root, "module_{}".format( module ), subdir )
+			if not os.path.isdir( directory ):
+				os.makedirs( directory )
+			for i in range( min( filesPerDir, fileCount - written ) ):
+				open( os.path.join( directory, "file_{}{}".format( i, _extensions[i % len( _extensions )] ) ), "w" ).close( )
+				written += 1
+		module += 1
+	#Things get_files should skip: an excluded directory, and object files in the build's own output.
+	for name in ( "third_party", "obj" ):
+		directory = os.path.join( root, name, "nested" )
+		os.makedirs( directory )
+		for i in range( 200 ):
+			open( os.path.join( directory, "skipped_{}.cpp".format( i ) ), "w" ).close( )
+
+
+def MakeProject( root ):
+	project = projectSettings.projectSettings( )
+	project.objDir = os.path.join( root, "obj" )
+	project.outputDir = project.objDir
+	project.csbuildDir = os.path.join( project.objDir, ".csbuild" )
+	project.excludeDirs = [os.path.join( root, "third_party" ), project.csbuildDir]
+	return project
+
+
+def Time( func, project ):
+	iterations = 0
+	start = time.time( )
+	elapsed = 0
+	while elapsed < 2:
+		lists = ( [], [], [] )
+		project.hasCppFiles = False
+		func( project, *lists )
+		iterations += 1
+		elapsed = time.time( ) - start
+	return elapsed / iterations * 1000, lists
+
+
+def Run( root ):
+	os.chdir( root )
+	#Keep the per-directory "Looking in directory" messages out of the timings.
+	log.LOG_INFO = lambda *args: None
+
+	def GetFiles( project, *lists ):
+		_shared_globals.searchedDirectories.clear( )
+		project.get_files( *lists )
+
+	legacyTime, legacyLists = Time( LegacyGetFiles, MakeProject( root ) )
+	newTime, newLists = Time( GetFiles, MakeProject( root ) )
+	#Listings of directories changed in the last couple of seconds aren't kept, but the legacy walk takes long enough
+	#that nothing in a freshly generated tree is that new any more.
+	_shared_globals.directoryManifest = _dir_manifest.DirectoryManifest( )
+	MakeProject( root ).get_files( [], [], [] )
+	manifestTime, manifestLists = Time( GetFiles, MakeProject( root ) )
+	#Another variant with its own output directory; everything else is what the first one already found.
+	variant = MakeProject( root )
+	variant.outputDir = os.path.join( root, "bin" )
+	MakeProject( root ).get_files( [], [], [] )
+	sharedTime, sharedLists = Time( lambda project, *lists: project.get_files( *lists ), variant )
+
+	#The legacy walk doesn't skip the object directory when it's searched by a relative path, so its counts can be
+	#higher.
+	print( "{:<10} {:>10} {:>10} {:>10} {:>12}".format( "walk", "sources", "headers", "cHeaders", "time (ms)" ) )
+	for name, elapsed, lists in ( ( "legacy", legacyTime, legacyLists ), ( "new", newTime, newLists ),
+			( "manifest", manifestTime, manifestLists ), ( "shared", sharedTime, sharedLists ) ):
+		print( "{:<10} {:>10} {:>10} {:>10} {:>12.1f}".format( name, len( lists[0] ), len( lists[1] ), len( lists[2] ),
+			elapsed ) )
+	print( "speedup: {:.1f}x, {:.1f}x with the manifest, {:.1f}x for another variant".format( legacyTime / newTime,
+		legacyTime / manifestTime, legacyTime / sharedTime ) )
+
+
+if __name__ == "__main__":
+	if len( sys.argv ) > 1:
+		Run( os.path.abspath( sys.argv[1] ) )
+	else:
+		tempDir = tempfile.mkdtemp( )
+		try:
+			WriteTree( tempDir, 100000 )
+			Run( tempDir )
+		finally:
+			os.chdir( os.path.dirname( tempDir ) )
+			shutil.rmtree( tempDir )
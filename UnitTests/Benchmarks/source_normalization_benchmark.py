@@ -0,0 +1,130 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Micro-benchmark for the normalization applied to source files before they're hashed.
+
+Generates a few representative files (hand-written style C++ with plenty of comments, a dense generated header, and a
+file full of string and raw string literals) and times _utils.normalize_source, used with
+SourceNormalization.Whitespace, against the comment-stripping regex used by default. Each file is also reformatted
+(reindented, with trailing whitespace, blank lines, and comments added) to check that its normalized form doesn't
+change. Additional files to time can be passed on the command line.
+
+Normalizing is slower than stripping comments alone, by the factor in the ratio column: around 1.5x on files that are
+mostly literals, and up to 7x on dense code with little to skip over.
+
+Usage: python source_normalization_benchmark.py [file ...]
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _utils
+
+def WriteCommentedSource( path ):
+	with open( path, "w" ) as f:
+		f.write( "/*\n * Copyright (c) Example Authors\n *\n * Licensed under the MIT license.\n */\n\n" )
+		f.write( "#include \"bench.h\"\n#include <vector>\n\nnamespace bench\n{\n" )
+		for i in range( 1500 ):
+			f.write( "\t/**\n\t * Processes batch {0}.\n\t *\n\t * @param items The items to process\n\t */\n".format( i ) )
+			f.write( "\tint Process{0}( std::vector<int> const& items, int scale )\n\t{{\n".format( i ) )
+			f.write( "\t\tint total = 0; // running total\n" )
+			f.write( "\t\tfor( size_t j = 0; j < items.size( ); ++j )\n\t\t{\n" )
+			f.write( "\t\t\ttotal += items[j] * scale >> 1; /* halved */\n\t\t}\n" )
+			f.write( "\t\treturn total > 0 ? total : -total;\n\t}\n\n" )
+		f.write( "}\n" )
+
+
+def WriteGeneratedHeader( path ):
+	with open( path, "w" ) as f:
+		f.write( "// Generated code.  DO NOT EDIT!\n#ifndef BENCH_GENERATED_H\n#define BENCH_GENERATED_H\n\n" )
+		for i in range( 2000 ):
+			f.write( "class Message{0} : public ::bench::Message {{\n public:\n".format( i ) )
+			f.write( "  Message{0}();\n  virtual ~Message{0}();\n".format( i ) )
+			for j in range( 8 ):
+				f.write( "  inline ::bench::int32 field_{0}() const {{ return field_{0}_; }}\n".format( j ) )
+			f.write( "};\n\n" )
+		f.write( "#endif  // BENCH_GENERATED_H\n" )
+
+
+def WriteLiteralSource( path ):
+	with open( path, "w" ) as f:
+		f.write( "#include <cstdio>\n\n" )
+		for i in range( 2000 ):
+			f.write( "static const char* kMessage{0} = \"message {0}: /* not a comment */ \\\"quoted\\\"\";\n".format( i ) )
+			f.write( "static const char* kShader{0} = R\"glsl(void main() {{ gl_FragColor = vec4( 1.0 ); }} // {0})glsl\";\n".format( i ) )
+			f.write( "static const char kSeparator{0} = '/';\nstatic const int kMask{0} = 0xFF'FF;\n".format( i ) )
+		f.write( "\n" )
+
+
+_indent = re.compile( r"^[ \t]*(?=\S)", re.MULTILINE )
+
+def Reformat( data ):
+	"""Reindent with spaces, and add trailing whitespace, blank lines, and comments that shouldn't change anything."""
+	data = _indent.sub( lambda match: "  " * len( match.group( 0 ).expandtabs( 1 ) ), data )
+	return data.replace( ";\n", "; \t\n\n// reformatted\n" )
+
+
+def Time( func, data ):
+	iterations = 0
+	start = time.time( )
+	elapsed = 0
+	while elapsed < 0.5:
+		func( data )
+		iterations += 1
+		elapsed = time.time( ) - start
+	return elapsed / iterations * 1000
+
+
+def Run( paths ):
+	#The comment-stripping regex isn't expected to be stable under reformatting; that's what the normalizer is for.
+	print( "{:<24} {:>10} {:>12} {:>14} {:>8} {:>10}".format(
+		"file", "size", "regex (ms)", "normalize (ms)", "ratio", "stable" ) )
+	for path in paths:
+		with open( path, "rb" ) as f:
+			data = f.read( )
+		reformatted = Reformat( data.decode( "latin-1" ) ).encode( "latin-1" )
+		stable = _utils.normalize_source( data ) == _utils.normalize_source( reformatted )
+		regexTime = Time( _utils.remove_comments, data )
+		normalizeTime = Time( _utils.normalize_source, data )
+		print( "{:<24} {:>10} {:>12.3f} {:>14.3f} {:>7.1f}x {:>10}".format( os.path.basename( path )[:24],
+			len( data ), regexTime, normalizeTime, normalizeTime / regexTime, "yes" if stable else "NO" ) )
+
+
+if __name__ == "__main__":
+	tempDir = tempfile.mkdtemp( )
+	try:
+		generated = []
+		for name, writer in ( ( "commented.cpp", WriteCommentedSource ), ( "generated.h", WriteGeneratedHeader ),
+				( "literals.cpp", WriteLiteralSource ) ):
+			path = os.path.join( tempDir, name )
+			writer( path )
+			generated.append( path )
+		Run( generated + sys.argv[1:] )
+	finally:
+		shutil.rmtree( tempDir )
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+"""
+Checks for _build_graph.BuildGraph: steps becoming ready as what they depend on finishes, failures spreading to
+everything that depends on the failed step, and dependencies on steps that have already finished. Exits with an
+assertion error on the first check that fails.
+
+Usage: python buildGraphTest.py
+"""
+
+import os
+import sys
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _build_graph
+
+
+def TestReady( ):
+	graph = _build_graph.BuildGraph( )
+	graph.Add( "compile a" )
+	graph.Add( "compile b" )
+	graph.Add( "link", ["compile a", "compile b"] )
+
+	assert graph.PopReady( ) == ["compile a", "compile b"]
+	assert graph.running == 2
+	graph.Finish( "compile a" )
+	assert graph.PopReady( ) == []
+	graph.Finish( "compile b" )
+	assert graph.PopReady( ) == ["link"]
+	graph.Finish( "link" )
+	assert graph.running == 0
+	assert graph.IsFinished( "link" )
+	assert graph.GetPending( ) == []
+
+
+def TestFailure( ):
+	graph = _build_graph.BuildGraph( )
+	graph.Add( "lib" )
+	graph.Add( "app", ["lib"] )
+	graph.Add( "tool", ["lib"] )
+	graph.Add( "installer", ["app", "tool"] )
+	graph.Add( "docs" )
+
+	assert graph.PopReady( ) == ["lib", "docs"]
+	skipped = graph.Fail( "lib" )
+	#Everything depending on the failed step is failed with it, directly or not, and only once.
+	assert sorted( skipped ) == ["app", "installer", "tool"], skipped
+	assert skipped.index( "app" ) < skipped.index( "installer" )
+	assert graph.running == 1
+	assert graph.PopReady( ) == []
+
+	#A step that was never started can be failed too, taking its dependents with it.
+	graph.Add( "package", ["docs"] )
+	graph.Add( "upload", ["package"] )
+	assert graph.Fail( "package" ) == ["upload"]
+	graph.Finish( "docs" )
+	assert graph.PopReady( ) == []
+	assert graph.running == 0
+	assert graph.GetPending( ) == []
+
+
+def TestFinishedDependency( ):
+	graph = _build_graph.BuildGraph( )
+	graph.Add( "lib" )
+	assert graph.PopReady( ) == ["lib"]
+	graph.Finish( "lib" )
+
+	#Depending on a step that's already finished doesn't hold anything up.
+	graph.Add( "app", ["lib"] )
+	graph.Add( "tool" )
+	graph.AddDependency( "tool", "lib" )
+	assert graph.PopReady( ) == ["app", "tool"]
+	assert graph.running == 2
+
+
+if __name__ == "__main__":
+	TestReady( )
+	TestFailure( )
+	TestFinishedDependency( )
+	print( "OK" )
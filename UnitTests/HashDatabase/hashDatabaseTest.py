@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+"""
+Checks for _hash_db.HashDatabase: reloading a log with a damaged tail, compacting the log after many updates, and
+dropping recorded dependencies when the settings change. Exits with an assertion error on the first check that fails.
+
+Usage: python hashDatabaseTest.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _hash_db
+
+_SETTINGS = ( "settings", )
+_HASHER = "hasher"
+
+
+def Open( filename, settingsKey = _SETTINGS ):
+	database = _hash_db.HashDatabase( filename )
+	database.Load( settingsKey, _HASHER )
+	return database
+
+
+def TestDamagedTail( directory ):
+	filename = os.path.join( directory, "damaged.csbc" )
+	database = Open( filename )
+	database.SetFile( "/a.cpp", ( 1, 1, 1, 1 ), b"a" )
+	database.SetUnit( "/a.cpp", ( "/a.h", ) )
+	database.Flush( )
+	database.SetFile( "/b.cpp", ( 2, 2, 2, 2 ), b"b" )
+	database.Flush( )
+	intactSize = os.path.getsize( filename )
+	database.SetUnit( "/b.cpp", tuple( "/{}.h".format( i ) for i in range( 20 ) ) )
+	database.Flush( )
+	with open( filename, "rb" ) as f:
+		data = f.read( )
+
+	#Cut the last record off at every point a build killed while appending it could have.
+	for size in range( intactSize + 1, len( data ) ):
+		with open( filename, "wb" ) as f:
+			f.write( data[:size] )
+
+		database = Open( filename )
+		assert sorted( database.files ) == ["/a.cpp", "/b.cpp"], ( size, database.files )
+		assert database.units == { "/a.cpp": ( "/a.h", ) }
+
+		#The damaged tail has to be rewritten before anything else is appended, or the new records would be lost with
+		#it.
+		database.SetFile( "/d.cpp", ( 4, 4, 4, 4 ), b"d" )
+		database.Flush( )
+		database = Open( filename )
+		assert sorted( database.files ) == ["/a.cpp", "/b.cpp", "/d.cpp"], ( size, database.files )
+
+
+def TestCompaction( directory ):
+	filename = os.path.join( directory, "compact.csbc" )
+	database = Open( filename )
+	database.SetFile( "/a.cpp", ( 0, 0, 0, 0 ), b"0" )
+	database.Flush( )
+	snapshotSize = os.path.getsize( filename )
+
+	for i in range( 1, 200 ):
+		database.SetFile( "/a.cpp", ( i, i, i, i ), str( i ).encode( "utf-8" ) )
+		database.Flush( )
+		#Superseded records never get to outnumber the live ones for long.
+		assert database._recordCount <= 2, database._recordCount
+
+	assert os.path.getsize( filename ) < snapshotSize * 4
+	database = Open( filename )
+	assert database.files == { "/a.cpp": ( ( 199, 199, 199, 199 ), b"199" ) }, database.files
+
+
+def TestSettingsChange( directory ):
+	filename = os.path.join( directory, "settings.csbc" )
+	database = Open( filename )
+	database.SetFile( "/a.cpp", ( 1, 1, 1, 1 ), b"a" )
+	database.SetUnit( "/a.cpp", ( "/a.h", ) )
+	database.SetCommand( "/a.cpp", b"command" )
+	database.Flush( )
+
+	database = Open( filename, ( "other settings", ) )
+	assert database.units == { }
+	assert sorted( database.files ) == ["/a.cpp"]
+	assert sorted( database.commands ) == ["/a.cpp"]
+
+	#The change itself is recorded, so the next load doesn't see the old dependencies either.
+	database.Flush( )
+	database = Open( filename, ( "other settings", ) )
+	assert database.units == { }
+	assert sorted( database.files ) == ["/a.cpp"]
+
+
+if __name__ == "__main__":
+	directory = tempfile.mkdtemp( )
+	try:
+		TestDamagedTail( directory )
+		TestCompaction( directory )
+		TestSettingsChange( directory )
+	finally:
+		shutil.rmtree( directory )
+	print( "OK" )
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+"""
+Checks for _include_graph.IncludeGraph: closures over an include cycle and a diamond, and which files
+GetChangedMask reports. Exits with an assertion error on the first check that fails.
+
+Usage: python includeGraphTest.py
+"""
+
+import os
+import sys
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." ) )
+#Keeps csbuild from trying to run a build when it's imported.
+sys.runningSphinx = True
+
+from csbuild import _include_graph
+
+
+class Includes( object ):
+	"""Stands in for the include scanner, counting how many times each file is resolved."""
+	def __init__( self, includes ):
+		self.includes = includes
+		self.resolved = dict( ( path, 0 ) for path in includes )
+
+	def __call__( self, path ):
+		self.resolved[path] += 1
+		return self.includes[path]
+
+
+def Dependencies( graph, path, includes ):
+	return set( graph.GetPaths( graph.GetDependencies( path, includes ) ) )
+
+
+def TestCycle( ):
+	includes = Includes( {
+		"/main.cpp": ["/a.h"],
+		"/a.h": ["/b.h"],
+		"/b.h": ["/c.h"],
+		"/c.h": ["/a.h", "/leaf.h"],
+		"/leaf.h": [],
+	} )
+	graph = _include_graph.IncludeGraph( )
+
+	assert Dependencies( graph, "/main.cpp", includes ) == { "/a.h", "/b.h", "/c.h", "/leaf.h" }
+	#Every header in the cycle reaches the others and itself, but a file is never its own dependency.
+	assert Dependencies( graph, "/b.h", includes ) == { "/a.h", "/c.h", "/leaf.h" }
+	assert Dependencies( graph, "/leaf.h", includes ) == set( )
+	assert all( count == 1 for count in includes.resolved.values( ) ), includes.resolved
+
+
+def TestDiamond( ):
+	includes = Includes( {
+		"/main.cpp": ["/left.h", "/right.h"],
+		"/left.h": ["/common.h"],
+		"/right.h": ["/common.h"],
+		"/common.h": [],
+	} )
+	graph = _include_graph.IncludeGraph( )
+
+	assert Dependencies( graph, "/main.cpp", includes ) == { "/left.h", "/right.h", "/common.h" }
+	assert Dependencies( graph, "/right.h", includes ) == { "/common.h" }
+	assert includes.resolved["/common.h"] == 1
+	#Limited to one level, the shared header isn't reached at all.
+	assert set( graph.GetPaths( graph.GetDependencies( "/main.cpp", includes, maxDepth = 1 ) ) ) == { "/left.h", "/right.h" }
+
+	checked = []
+	def Changed( path ):
+		checked.append( path )
+		return path == "/common.h"
+
+	mask = graph.GetDependencies( "/main.cpp", includes )
+	assert graph.GetPaths( graph.GetChangedMask( mask, Changed ) ) == ["/common.h"]
+	assert sorted( checked ) == ["/common.h", "/left.h", "/right.h"]
+	#Each file is only checked once; after that the answer comes from the mask.
+	assert graph.GetPaths( graph.GetChangedMask( graph.GetDependencies( "/right.h", includes ), Changed ) ) == ["/common.h"]
+	assert len( checked ) == 3
+	assert graph.GetChangedMask( graph.GetMask( ["/left.h"] ), Changed ) == 0
+
+
+if __name__ == "__main__":
+	TestCycle( )
+	TestDiamond( )
+	print( "OK" )
@@ -0,0 +1,9 @@
+#include <cstdio>
+
+int f();
+
+int main()
+{
+	printf( "%d\n", f() );
+	return 0;
+}
@@ -0,0 +1,15 @@
+#!/usr/bin/python
+
+import csbuild
+
+csbuild.SetCxxCommand("g++")
+csbuild.SetCcCommand("gcc")
+
+@csbuild.project(
+	name="app",
+	workingDirectory="app",
+	depends=[],
+)
+def app():
+	csbuild.SetOutput("app", csbuild.ProjectType.Application)
+	csbuild.SetOutputDirectory("bin")
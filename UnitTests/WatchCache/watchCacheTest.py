@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+"""
+Regression check for --watch with --object-cache: after a source is edited, the rebuild has to miss the object cache
+and link the new code, not fetch the object built from the file's old contents.
+
+Builds a copy of the project next to this script in a temporary directory, so the cache starts out empty. Exits with
+an assertion error if the check fails.
+
+Usage: python watchCacheTest.py
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+_root = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", ".." )
+_colors = re.compile( r"\x1b\[[0-9;]*m" )
+
+
+def ReadLines( pipe, lines ):
+	for line in iter( pipe.readline, b"" ):
+		lines.put( _colors.sub( "", line.decode( "utf-8", "replace" ) ).rstrip( ) )
+	lines.put( None )
+
+
+def WaitForBuild( lines, timeout = 120 ):
+	"""Collect output up to the point the build starts watching for changes again."""
+	output = []
+	deadline = time.time( ) + timeout
+	while True:
+		line = lines.get( timeout = max( deadline - time.time( ), 0.1 ) )
+		assert line is not None, "csbuild exited:\n" + "\n".join( output )
+		output.append( line )
+		if "Watching for changes" in line:
+			return output
+
+
+def Printed( output, text ):
+	#Log lines can be prefixed with the progress bar and the log level.
+	return any( text in line for line in output )
+
+
+def RunApp( directory ):
+	return subprocess.check_output( [os.path.join( directory, "bin", "app" )] ).decode( "utf-8" ).strip( )
+
+
+def Run( ):
+	directory = tempfile.mkdtemp( )
+	process = None
+	try:
+		project = os.path.join( directory, "project" )
+		shutil.copytree( os.path.dirname( os.path.abspath( __file__ ) ), project,
+			ignore = shutil.ignore_patterns( "watchCacheTest.py", "__pycache__" ) )
+
+		env = dict( os.environ )
+		env["PYTHONPATH"] = os.path.abspath( _root ) + os.pathsep + env.get( "PYTHONPATH", "" )
+		process = subprocess.Popen( [sys.executable, "make.py", "--watch", "--object-cache"], cwd = project,
+			stdout = subprocess.PIPE, stderr = subprocess.STDOUT, env = env )
+		lines = queue.Queue( )
+		reader = threading.Thread( target = ReadLines, args = ( process.stdout, lines ) )
+		reader.daemon = True
+		reader.start( )
+
+		output = WaitForBuild( lines )
+		assert Printed( output, "Object cache: 0 hits, 2 misses" ), "\n".join( output )
+		assert RunApp( project ) == "10"
+
+		with open( os.path.join( project, "app", "f.cpp" ), "w" ) as f:
+			f.write( "int f()\n{\n\treturn 20;\n}\n" )
+
+		output = WaitForBuild( lines )
+		assert Printed( output, "Object cache: 0 hits, 1 misses" ), "\n".join( output )
+		assert RunApp( project ) == "20"
+	finally:
+		if process is not None:
+			process.kill( )
+			process.wait( )
+		shutil.rmtree( directory )
+
+
+if __name__ == "__main__":
+	Run( )
+	print( "OK" )
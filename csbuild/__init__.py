@@ -83,7 +83,26 @@ class StaticLinkMode( object ):
 	LinkLibs = 0
 	LinkIntermediateObjects = 1
 
+class DependencyMode( object ):
+	ScanHeaders = 0
+	CompilerOutput = 1
+
+class SourceNormalization( object ):
+	Comments = 0
+	Whitespace = 1
+
 from . import _utils
+from . import _include_cache
+from . import _dir_manifest
+from . import _durations
+from . import _build_graph
+from . import _hash_db
+from . import _object_cache
+from . import _daemon
+from . import _file_watcher
+from . import _include_graph
+from . import _jobs
+from . import _async_engine
 from . import toolchain
 from . import toolchain_msvc
 from . import toolchain_gcc
@@ -534,6 +553,19 @@ def StopOnFirstError():
 	_shared_globals.stopOnError = True
 
 
+def SetFileHasher( name, hashFactory ):
+	"""
+	Set the hash function used to detect changes to the contents of source files and headers.
+	The default is BLAKE2 where it's available and MD5 otherwise.
+
+	:type name: str
+	:param name: Name of the hash function. It's recorded with the digests; if it changes, every file is rehashed.
+	:type hashFactory: function
+	:param hashFactory: Function returning a new hash object with update() and digest() methods, such as hashlib.sha1
+	"""
+	_shared_globals.fileHasher = ( name, hashFactory )
+
+
 def SetNumFilesPerChunk( i ):
 	"""
 	Set the size of the chunks used in the chunked build. This indicates the number of files per compilation unit.
@@ -642,6 +674,41 @@ def IgnoreExternalHeaders( ):
 	projectSettings.currentProject.SetValue("ignoreExternalHeaders", True)
 
 
+def SetDependencyMode( mode ):
+	"""
+	Sets how csbuild determines which headers each source file depends on.
+
+	With :DependencyMode.ScanHeaders: (the default), csbuild scans source and header files for #include directives
+	itself. With :DependencyMode.CompilerOutput:, the compiler is asked to write out a dependency file alongside each
+	object it generates, and those dependencies are used on later builds instead. This costs nothing beyond the compile
+	itself and takes preprocessor conditionals into account, so it's both faster and more exact than scanning.
+
+	Toolchains whose compiler can't generate dependency files, and objects that were built without one, fall back to
+	scanning.
+
+	:type mode: :DependencyMode:
+	:param mode: The dependency mode to use
+	"""
+	projectSettings.currentProject.SetValue("dependencyMode", mode)
+
+
+def SetSourceNormalization( mode ):
+	"""
+	Sets which changes to a source or header file are ignored when deciding whether the files that depend on it have to
+	be recompiled.
+
+	With :SourceNormalization.Comments: (the default), only edits to comments are ignored. With
+	:SourceNormalization.Whitespace:, whitespace that doesn't change how the file is tokenized is ignored as well, so
+	reindenting or reformatting a file doesn't cause a rebuild. Line breaks still count, since they end preprocessor
+	directives. Changes that only move code to different lines, or that only affect the spacing of text that's turned
+	into a string with the # operator, won't cause a rebuild in this mode either.
+
+	:type mode: :SourceNormalization:
+	:param mode: The normalization to use
+	"""
+	projectSettings.currentProject.SetValue("sourceNormalization", mode)
+
+
 def DisableWarnings( ):
 	"""
 	Disables all warnings.
@@ -1342,8 +1409,6 @@ _shared_globals.starttime = time.time( )
 
 sys.stdout = log.stdoutWriter(sys.stdout)
 
-_building = False
-
 class _LinkStatus(object):
 	"""
 	Defines the current link status of a project.
@@ -1352,138 +1417,190 @@ class _LinkStatus(object):
 	Success = 1
 	UpToDate = 2
 
-def _build( ):
+class _BuildStep(object):
+	"""
+	Defines the steps of a project's build, other than its individual compiles.
+	"""
+	Start = 0
+	Precompile = 1
+	Compile = 2
+	Link = 3
+
+def _build( projects = None ):
 	"""
 	Build the project.
 	This step handles:
 	Checking library dependencies.
 	Checking which files need to be built.
-	And spawning a build thread for each one that does.
+	And queueing a compile job for each one that does.
+
+	:param projects: Projects to build, in build order, if not all of them. Any they depend on are treated as already built.
+	:type projects: list[csbuild.projectSettings.projectSettings]
 	"""
+	if projects is None:
+		projects = _shared_globals.sortedProjects
 
 	if _guiModule:
 		_guiModule.run()
 
 	built = False
-	global _building
-	_building = True
-
-	linker_threads_blocked = _shared_globals.max_linker_threads - 1
-	for i in range( linker_threads_blocked ):
-		_shared_globals.link_semaphore.acquire(True)
 
-	for project in _shared_globals.sortedProjects:
+	for project in projects:
 		_shared_globals.total_compiles += len( project._finalChunkSet )
 
 	_shared_globals.total_compiles += _shared_globals.total_precompiles
 	_shared_globals.current_compile = 1
 
-	projects_in_flight = []
-	projects_done = set()
-	pending_links = set()
-	pending_builds = _shared_globals.sortedProjects
-	#projects_needing_links = set()
+	pool = _shared_globals.workerPool
+	if pool is None:
+		if _async_engine.available:
+			pool = _async_engine.AsyncEngine( _shared_globals.max_threads )
+		else:
+			pool = _jobs.WorkerPool( _shared_globals.max_threads )
+		_shared_globals.workerPool = pool
+
+	#Whatever's furthest from the end of the build goes first: a compile's own duration, plus the links and source
+	#dependents' compiles that can't start until it's done. Otherwise one slow compile started last can leave every other core idle while it finishes.
+	durations = _shared_globals.buildDurations
+	if durations is None:
+		durations = _durations.DurationHistory( )
+		_shared_globals.buildDurations = durations
+
+	def GetObjs( project ):
+		"""Object files for each of a project's chunks, in the same order."""
+		return [
+			_utils.GetSourceObjPath( project, chunk, sourceIsChunkPath = project.ContainsChunk( chunk ) )
+			for chunk in project._finalChunkSet
+		]
+
+	#Compiles run side by side, so a project takes about as long to compile as its longest compile does.
+	compileTimes = {}
+	for project in projects:
+		estimates = durations.EstimateCompiles( [os.path.abspath( obj ) for obj in GetObjs( project )] )
+		compileTimes[project.key] = max( list( estimates.values( ) ) or [0.0] )
+	linkPaths = durations.GetLinkPaths( projects, compileTimes )
 
-	for project in pending_builds:
+	for project in projects:
 		project.activeToolchain.preMakeStep(project)
 		if project.preMakeStep:
 			log.LOG_BUILD( "Running pre-make step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
 			project.preMakeStep(project)
 
-	for project in _shared_globals.sortedProjects:
+	for project in projects:
 		log.LOG_BUILD( "Verifying libraries for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
 		if not project.check_libraries( ):
 			return False
 			#if _utils.needs_link(project):
 			#    projects_needing_links.add(project.key)
 
+	for project in projects:
+		project.mark_sources_pending( )
+
 	_shared_globals.starttime = time.time( )
 
-	_linkThread.start()
-
-	def ReconcilePostBuild():
-		LinkedSomething = True
-		while LinkedSomething:
-			LinkedSomething = False
-			for otherProj in list( projects_in_flight ):
-				with otherProj.mutex:
-					complete = otherProj.compilationCompleted
-
-				if complete >= len( otherProj._finalChunkSet ) + int(
-						otherProj.needsPrecompileC ) + int(
-						otherProj.needsPrecompileCpp ):
-					totaltime = (time.time( ) - otherProj.starttime)
-					minutes = math.floor( totaltime / 60 )
-					seconds = math.floor( totaltime % 60 )
-
-					log.LOG_BUILD(
-						"Compile of {0} ({3} {4}) took {1}:{2:02}".format( otherProj.outputName, int( minutes ),
-							int( seconds ), otherProj.targetName, otherProj.outputArchitecture ) )
-					otherProj.buildEnd = time.time()
-					projects_in_flight.remove( otherProj )
-					if otherProj.compilationFailed:
-						log.LOG_ERROR( "Build of {} ({} {}/{}) failed! Finishing up non-dependent build tasks...".format(
-							otherProj.outputName, otherProj.targetName, otherProj.outputArchitecture, otherProj.activeToolchainName ) )
-						otherProj.state = _shared_globals.ProjectState.FAILED
-						otherProj.linkQueueStart = time.time()
-						otherProj.linkStart = otherProj.linkQueueStart
-						otherProj.endTime = otherProj.linkQueueStart
-						continue
+	#Every step of the build and what it has to wait for, so that anything that can run does as soon as there's room
+	#for it. A project's compiles wait only for the projects it has source dependencies on and its own precompiled
+	#headers; its link waits for its own compiles and the links of the projects it links against. Projects that aren't
+	#being built this time are already done, so nothing waits on them.
+	graph = _build_graph.BuildGraph( )
+	building = dict( ( project.key, project ) for project in projects )
+	for project in projects:
+		graph.Add( ( _BuildStep.Start, project ) )
+		graph.Add( ( _BuildStep.Precompile, project ), [( _BuildStep.Start, project )] )
+		graph.Add( ( _BuildStep.Compile, project ), [( _BuildStep.Precompile, project )] )
+		graph.Add( ( _BuildStep.Link, project ), [( _BuildStep.Compile, project )] )
+	for project in projects:
+		for depend in project.srcDepends:
+			if depend in building:
+				graph.AddDependency( ( _BuildStep.Start, project ), ( _BuildStep.Link, building[depend] ) )
+		for depend in project.reconciledLinkDepends:
+			if depend in building:
+				graph.AddDependency( ( _BuildStep.Link, project ), ( _BuildStep.Link, building[depend] ) )
+
+	def Fail( step ):
+		"""Fail a step and give up on everything that depends on it."""
+		_shared_globals.build_success = False
+		for skipped in [step] + graph.Fail( step ):
+			if isinstance( skipped, _jobs.CompileJob ):
+				if skipped.state == _shared_globals.ProjectState.PENDING:
+					skipped.Abort( )
+					_shared_globals.total_compiles -= 1
+				continue
 
-					okToLink = True
-					if otherProj.reconciledLinkDepends:
-						for depend in otherProj.reconciledLinkDepends:
-							if depend not in projects_done:
-								okToLink = False
-								break
-					if okToLink:
-						_link( otherProj )
-						LinkedSomething = True
-						projects_done.add( otherProj.key )
-					else:
-						log.LOG_LINKER(
-							"Linking for {} ({} {}/{}) deferred until all dependencies have finished building...".format(
-								otherProj.outputName, otherProj.targetName, otherProj.outputArchitecture, otherProj.activeToolchainName ) )
-						otherProj.state = _shared_globals.ProjectState.WAITING_FOR_LINK
-						pending_links.add( otherProj )
-
-			for otherProj in list( pending_links ):
-				okToLink = True
-				for depend in otherProj.reconciledLinkDepends:
-					if depend not in projects_done:
-						okToLink = False
-						break
-				if okToLink:
-					_link( otherProj )
-					LinkedSomething = True
-					projects_done.add( otherProj.key )
-					pending_links.remove( otherProj )
-
-	while pending_builds:
-		theseBuilds = pending_builds
-		pending_builds = []
-		for project in theseBuilds:
-			for depend in project.srcDepends:
-				if depend not in projects_done:
-					pending_builds.append( project )
+			kind, project = skipped
+			if kind == _BuildStep.Start:
+				log.LOG_ERROR( "Build of {} ({} {}/{}) aborted.".format(
+					project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+				with project.mutex:
+					for chunk in project._finalChunkSet:
+						project.fileStatus[os.path.normcase(chunk)] = _shared_globals.ProjectState.ABORTED
+				_shared_globals.total_compiles -= len( project._finalChunkSet ) + int( project.needsPrecompileC ) + \
+					int( project.needsPrecompileCpp )
+				project.state = _shared_globals.ProjectState.ABORTED
+			elif kind == _BuildStep.Compile:
+				if project.state != _shared_globals.ProjectState.BUILDING:
+					continue
+				log.LOG_ERROR( "Build of {} ({} {}/{}) failed! Finishing up non-dependent build tasks...".format(
+					project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+				project.buildEnd = time.time()
+				project.state = _shared_globals.ProjectState.FAILED
+			elif kind == _BuildStep.Link:
+				if project.state not in ( _shared_globals.ProjectState.BUILDING, _shared_globals.ProjectState.WAITING_FOR_LINK ):
+					continue
+				log.LOG_ERROR( "Linking for {} ({} {}/{}) aborted, a project it links against failed.".format(
+					project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+				project.state = _shared_globals.ProjectState.ABORTED
+			else:
+				continue
+
+			project.linkQueueStart = time.time()
+			project.linkStart = project.linkQueueStart
+			project.endTime = project.linkQueueStart
+
+	precompiles = {}
+	#Links run on the worker pool with the compiles, but no more than max_linker_threads at once; the rest wait here.
+	links = []
+	linksRunning = 0
+	stopping = False
+	lastOutstanding = None
+	while True:
+		ready = graph.PopReady( )
+		for step in ready:
+			if isinstance( step, _jobs.CompileJob ):
+				if stopping:
+					Fail( step )
+				else:
+					pool.Submit( step )
+				continue
+
+			kind, project = step
+			if kind == _BuildStep.Start:
+				if stopping:
+					Fail( step )
 					continue
-			projects_in_flight.append( project )
 
-			projectSettings.currentProject = project
+				projectSettings.currentProject = project
+
+				project.starttime = time.time( )
 
-			project.starttime = time.time( )
+				project.activeToolchain.preBuildStep(project)
+				if project.preBuildStep:
+					log.LOG_BUILD( "Running pre-build step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+					project.preBuildStep( project )
 
-			project.activeToolchain.preBuildStep(project)
-			if project.preBuildStep:
-				log.LOG_BUILD( "Running pre-build step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
-				project.preBuildStep( project )
+				log.LOG_BUILD( "Building {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+				project.state = _shared_globals.ProjectState.BUILDING
+				project.startTime = time.time()
 
-			log.LOG_BUILD( "Building {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
-			project.state = _shared_globals.ProjectState.BUILDING
-			project.startTime = time.time()
+				precompile = ( _BuildStep.Precompile, project )
+				precompiles[project] = project.precompile_headers( )
+				for job in precompiles[project]:
+					graph.Add( job )
+					graph.AddDependency( precompile, job )
 
-			if project.precompile_headers( ):
-				for chunk in projectSettings.currentProject._finalChunkSet:
+				objs = GetObjs( project )
+				estimates = durations.EstimateCompiles( [os.path.abspath( obj ) for obj in objs] )
+				for chunk, obj in zip( project._finalChunkSet, objs ):
 					#not set until here because _finalChunkSet may be empty.
 					project._builtSomething = True
 
@@ -1498,140 +1615,110 @@ def _build( ):
 						)
 
 					built = True
-					obj = _utils.GetSourceObjPath(projectSettings.currentProject, chunk, sourceIsChunkPath=projectSettings.currentProject.ContainsChunk(chunk))
-					if not _shared_globals.semaphore.acquire( False ):
-						if _shared_globals.max_threads != 1:
-							log.LOG_INFO( "Waiting for a build thread to become available..." )
-						_shared_globals.semaphore.acquire( True )
-
-					ReconcilePostBuild()
-
-					if _shared_globals.interrupted:
-						Exit( 2 )
-					if not _shared_globals.build_success and _shared_globals.stopOnError:
-						log.LOG_ERROR("Errors encountered during build, finishing current tasks and exiting...")
-						_shared_globals.semaphore.release()
-						break
-					if _shared_globals.times:
-						totaltime = (time.time( ) - _shared_globals.starttime)
-						_shared_globals.lastupdate = totaltime
-						minutes = math.floor( totaltime / 60 )
-						seconds = math.floor( totaltime % 60 )
-						avgtime = sum( _shared_globals.times ) / (len( _shared_globals.times ))
-						esttime = totaltime + ((avgtime * (
-							_shared_globals.total_compiles - len(
-								_shared_globals.times ))) / _shared_globals.max_threads)
-						if esttime < totaltime:
-							esttime = totaltime
-							_shared_globals.esttime = esttime
-						estmin = math.floor( esttime / 60 )
-						estsec = math.floor( esttime % 60 )
-						log.LOG_BUILD(
-							"Compiling {0}{7}... ({1}/{2}) - {3}:{4:02}/{5}:{6:02}".format( os.path.basename( obj ),
-								_shared_globals.current_compile, _shared_globals.total_compiles, int( minutes ),
-								int( seconds ), int( estmin ),
-								int( estsec ), chunkFileStr ) )
-					else:
-						totaltime = (time.time( ) - _shared_globals.starttime)
-						minutes = math.floor( totaltime / 60 )
-						seconds = math.floor( totaltime % 60 )
-						log.LOG_BUILD(
-							"Compiling {0}{5}... ({1}/{2}) - {3}:{4:02}".format( os.path.basename( obj ),
-								_shared_globals.current_compile,
-								_shared_globals.total_compiles, int( minutes ), int( seconds ), chunkFileStr ) )
-					_utils.ThreadedBuild( chunk, obj, project ).start( )
-					_shared_globals.current_compile += 1
-			else:
-				projects_in_flight.remove( project )
-				log.LOG_ERROR( "Build of {} ({} {}/{}) failed! Finishing up non-dependent build tasks...".format(
-					project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName  ) )
-
-				with project.mutex:
-					for chunk in project._finalChunkSet:
-						project.fileStatus[os.path.normcase(chunk)] = _shared_globals.ProjectState.ABORTED
+					job = _jobs.CompileJob( chunk, obj, project, description = chunkFileStr,
+						priority = estimates[os.path.abspath( obj )] + linkPaths[project.key] )
+					graph.Add( job, [precompile] )
+					graph.AddDependency( ( _BuildStep.Compile, project ), job )
 
-				_shared_globals.total_compiles -= len(project._finalChunkSet)
+				graph.Finish( step )
 
-				project.linkQueueStart = time.time()
-				project.linkStart = project.linkQueueStart
-				project.endTime = project.linkQueueStart
-				project.state = _shared_globals.ProjectState.FAILED
+			elif kind == _BuildStep.Precompile:
+				if project.finish_precompile( precompiles.pop( project ) ):
+					graph.Finish( step )
+				else:
+					Fail( step )
+
+			elif kind == _BuildStep.Compile:
+				totaltime = (time.time( ) - project.starttime)
+				minutes = math.floor( totaltime / 60 )
+				seconds = math.floor( totaltime % 60 )
+
+				log.LOG_BUILD(
+					"Compile of {0} ({3} {4}) took {1}:{2:02}".format( project.outputName, int( minutes ),
+						int( seconds ), project.targetName, project.outputArchitecture ) )
+				project.buildEnd = time.time()
+				if project.compilationFailed:
+					Fail( step )
+					continue
 
-			if not _shared_globals.build_success and _shared_globals.stopOnError:
-				break
+				graph.Finish( step )
+				for depend in project.reconciledLinkDepends:
+					if depend in building and not graph.IsFinished( ( _BuildStep.Link, building[depend] ) ):
+						log.LOG_LINKER(
+							"Linking for {} ({} {}/{}) deferred until all dependencies have finished building...".format(
+								project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
+						project.state = _shared_globals.ProjectState.WAITING_FOR_LINK
+						break
 
-		#Wait until all threads are finished. Simple way to do this is acquire the semaphore until it's out of
-		# resources.
-		for j in range( _shared_globals.max_threads ):
-			if not _shared_globals.semaphore.acquire( False ):
-				if _shared_globals.max_threads != 1:
-					if _shared_globals.times:
-						totaltime = (time.time( ) - _shared_globals.starttime)
-						_shared_globals.lastupdate = totaltime
-						minutes = math.floor( totaltime / 60 )
-						seconds = math.floor( totaltime % 60 )
-						avgtime = sum( _shared_globals.times ) / (len( _shared_globals.times ))
-						esttime = totaltime + ((avgtime * (_shared_globals.total_compiles - len(
-							_shared_globals.times ))) / _shared_globals.max_threads)
-						if esttime < totaltime:
-							esttime = totaltime
-						estmin = math.floor( esttime / 60 )
-						estsec = math.floor( esttime % 60 )
-						_shared_globals.esttime = esttime
-						log.LOG_THREAD(
-							"Waiting on {0} more build thread{1} to finish... ({2}:{3:02}/{4}:{5:02})".format(
-								_shared_globals.max_threads - j,
-								"s" if _shared_globals.max_threads - j != 1 else "", int( minutes ),
-								int( seconds ), int( estmin ), int( estsec ) ) )
-					else:
-						log.LOG_THREAD(
-							"Waiting on {0} more build thread{1} to finish...".format(
-								_shared_globals.max_threads - j,
-								"s" if _shared_globals.max_threads - j != 1 else "" ) )
-
-				ReconcilePostBuild()
-				_shared_globals.semaphore.acquire( True )
-
-				if linker_threads_blocked > 0:
-					_shared_globals.link_semaphore.release()
-					linker_threads_blocked -= 1
-
-				if _shared_globals.interrupted:
-					Exit( 2 )
-
-		#Then immediately release all the semaphores once we've reclaimed them.
-		#We're not using any more threads so we don't need them now.
-		for j in range( _shared_globals.max_threads ):
-			if _shared_globals.stopOnError:
-				projects_in_flight = set()
-			_shared_globals.semaphore.release( )
-
-		ReconcilePostBuild()
-
-	if projects_in_flight:
-		log.LOG_ERROR( "Could not complete all projects. This is probably very bad and should never happen."
-					   " Remaining projects: {0}".format( [p.key for p in projects_in_flight] ) )
-	if pending_links:
+			elif kind == _BuildStep.Link:
+				if stopping:
+					Fail( step )
+					continue
+				links.append( _LinkJob( project, linkPaths[project.key] ) )
+
+		while links and linksRunning < _shared_globals.max_linker_threads:
+			pool.Submit( links.pop( 0 ) )
+			linksRunning += 1
+
+		if ready:
+			continue
+
+		if not graph.running:
+			break
+
+		outstanding = pool.GetOutstanding( )
+		if outstanding and outstanding != lastOutstanding and _shared_globals.max_threads != 1 and outstanding <= _shared_globals.max_threads:
+			lastOutstanding = outstanding
+			log.LOG_THREAD( "Waiting on {0} more build job{1} to finish...".format( outstanding,
+				"s" if outstanding != 1 else "" ) )
+
+		#Every job that finishes makes ready whatever was waiting only on it, and nothing else has to be looked at.
+		#A timeout keeps the wait from holding off an interrupt indefinitely.
+		finished = pool.Wait( 0.5 )
+		for job in finished:
+			if isinstance( job, _LinkJob ):
+				linksRunning -= 1
+				step = ( _BuildStep.Link, job.project )
+				if job.project.state in ( _shared_globals.ProjectState.LINK_FAILED, _shared_globals.ProjectState.ABORTED ):
+					Fail( step )
+				else:
+					graph.Finish( step )
+			elif job.state == _shared_globals.ProjectState.ABORTED:
+				Fail( job )
+			else:
+				graph.Finish( job )
+				_recordCompileDurations( [job] )
+
+		if _shared_globals.interrupted:
+			Exit( 2 )
+
+		if not stopping and not _shared_globals.build_success and _shared_globals.stopOnError:
+			log.LOG_ERROR("Errors encountered during build, finishing current tasks and exiting...")
+			pool.Cancel( )
+			stopping = True
+			for job in links:
+				job.Abort( )
+				Fail( ( _BuildStep.Link, job.project ) )
+			links = []
+
+	#Only a dependency cycle can leave anything waiting once nothing else is running.
+	stuck = [step[1] for step in graph.GetPending( ) if not isinstance( step, _jobs.CompileJob ) and step[0] == _BuildStep.Link]
+	if stuck:
 		log.LOG_ERROR( "Could not link all projects. Do you have unmet dependencies in your makefile?"
-					   " Remaining projects: {0}".format( [p.key for p in pending_links] ) )
-		for p in pending_links:
+					   " Remaining projects: {0}".format( sorted( p.key for p in stuck ) ) )
+		for p in stuck:
 			p.state = _shared_globals.ProjectState.ABORTED
 		_shared_globals.build_success = False
-	for proj in _shared_globals.sortedProjects:
-		proj.save_md5s( proj.allsources, proj.allheaders )
+	for proj in projects:
+		proj.save_hashes( )
 
 	if not built:
 		log.LOG_BUILD( "Nothing to build." )
-	_building = False
-	global _linkCond
-	global _linkMutex
-	with _linkMutex:
-		_linkCond.notify()
-	log.LOG_THREAD("Waiting for linker tasks to finish.")
-	_linkThread.join()
-
-	if not projects_in_flight and not pending_links:
-		for project in _shared_globals.sortedProjects:
+
+	durations.Save( os.path.join( _shared_globals.cacheDirectory, "durations.csbc" ) )
+
+	if not stuck:
+		for project in projects:
 			project.activeToolchain.postMakeStep(project)
 			if project.postMakeStep:
 				log.LOG_BUILD( "Running post-make step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
@@ -1642,49 +1729,47 @@ def _build( ):
 	totalsec = math.floor( compiletime % 60 )
 	log.LOG_BUILD( "Compilation took {0}:{1:02}".format( int( totalmin ), int( totalsec ) ) )
 
+	objectCache = _shared_globals.objectCache
+	if objectCache is not None:
+		if objectCache.hits or objectCache.misses:
+			log.LOG_BUILD( "Object cache: {} hits, {} misses".format( objectCache.hits, objectCache.misses ) )
+		objectCache.Finish( )
+
 	_shared_globals.buildFinished = True
 
 	return _shared_globals.build_success
 
-_linkMutex = threading.Lock()
-_linkCond = threading.Condition(_linkMutex)
-_linkQueue = []
-_currentLinkThreads = set()
-_linkThreadMutex = threading.Lock()
-_recheckDeferredLinkTasks = False
+def _recordCompileDurations( jobs ):
+	"""Record how long each finished compile took. Objects fetched from the cache say nothing about the compile."""
+	durations = _shared_globals.buildDurations
+	for job in jobs:
+		if job.state == _shared_globals.ProjectState.FINISHED and not job.forPrecompiledHeader and not job.fromCache:
+			durations.RecordCompile( job.obj, job.endTime - job.startTime )
 
-def _link( project, *objs ):
-	"""
-	Linker:
-	Links all the built files.
-	Accepts an optional list of object files to link; if this list is not provided it will use the auto-generated
-	list created by build()
-	This function also checks (if nothing was built) the modified times of all the required libraries, to see if we need
-	to relink anyway, even though nothing was compiled.
-	"""
-	global _linkQueue
-	global _linkMutex
-	global _linkCond
-
-	project.state = _shared_globals.ProjectState.LINK_QUEUED
-	project.linkQueueStart = time.time()
-	with _linkMutex:
-		_linkQueue.append( (project, list(objs)) )
-		_linkCond.notify()
 
+def _printObjectCacheStats( objectCache ):
+	"""Print the object cache's size and the statistics accumulated over every build that has used it."""
+	entries = objectCache.GetContents( )
+	size = sum( entry[1] for entry in entries )
+	stats = objectCache.GetStats( )
+	lookups = stats["hits"] + stats["misses"]
+	print( "Object cache: {}".format( objectCache.directory ) )
+	print( "  Entries:   {}".format( len( entries ) ) )
+	print( "  Size:      {:.1f} MB of {:.1f} MB".format( size / 1048576.0, objectCache.maxSize / 1048576.0 ) )
+	print( "  Hits:      {}{}".format( stats["hits"],
+		" ({:.1f}%)".format( stats["hits"] * 100.0 / lookups ) if lookups else "" ) )
+	print( "  Misses:    {}".format( stats["misses"] ) )
+	print( "  Stored:    {}".format( stats["stores"] ) )
+	print( "  Evicted:   {}".format( stats["evictions"] ) )
 
-def _performLink(project, objs):
-	project.linkStart = time.time()
 
-	project.activeToolchain.preLinkStep(project)
-	if project.preLinkStep:
-		log.LOG_BUILD( "Running pre-link step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName  ) )
-		project.preLinkStep(project)
-
-	project.activeToolchain.SetActiveTool("linker")
-
-	starttime = time.time( )
+def _prepareLink(project, objs):
+	"""
+	Work out whether the project needs linking, and if it does, get the linker ready to run.
 
+	:return: The linker process, or the link's status if there's no need to run it
+	:rtype: csbuild._jobs.Process or int
+	"""
 	output = os.path.join( project.outputDir, project.outputName )
 
 	log.LOG_LINKER( "Linking {0}...".format( os.path.abspath( output ) ) )
@@ -1801,20 +1886,19 @@ def _performLink(project, objs):
 	if _shared_globals.show_commands:
 		print(cmd)
 	project.linkCommand = cmd
-	if platform.system() != "Windows":
-		cmd = shlex.split(cmd)
+	return _jobs.Process( cmd, project.objDir )
 
-	fd = subprocess.Popen( cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = project.objDir )
 
-	(output, errors) = fd.communicate( )
+def _finishLink(project, ret, output, errors, starttime):
+	"""
+	Take the linker's results.
 
-	ret = fd.returncode
+	:return: The link's status
+	:rtype: int
+	"""
 	sys.stdout.flush( )
 	sys.stderr.flush( )
 
-	if sys.version_info >= (3, 0):
-		output = output.decode("utf-8")
-		errors = errors.decode("utf-8")
 	sys.stdout.write( output )
 	sys.stderr.write( errors )
 
@@ -1847,31 +1931,72 @@ def _performLink(project, objs):
 		return _LinkStatus.Fail
 
 	totaltime = time.time( ) - starttime
+	if _shared_globals.buildDurations is not None:
+		_shared_globals.buildDurations.RecordLink( project.key, totaltime )
 	totalmin = math.floor( totaltime / 60 )
 	totalsec = math.floor( totaltime % 60 )
 	log.LOG_LINKER( "Link time: {0}:{1:02}".format( int( totalmin ), int( totalsec ) ) )
 
 	return _LinkStatus.Success
 
-class _LinkThread(threading.Thread):
-	def __init__(self, project, objs):
-		threading.Thread.__init__( self )
-		self._project = project
-		self._objs = objs
-		#Prevent certain versions of python from choking on dummy threads.
-		if not hasattr( threading.Thread, "_Thread__block" ):
-			threading.Thread._Thread__block = _shared_globals.dummy_block( )
-
-
-	def run( self ):
-		global _linkThreadMutex
-		global _currentLinkThreads
-		global _linkCond
-		global _recheckDeferredLinkTasks
+class _LinkJob( object ):
+	"""
+	Links all of a project's built files, on the worker pool alongside the compiles. If nothing was compiled, the
+	project is only relinked if the libraries it links against have changed since it was last linked.
+
+	:ivar project: The project to link
+	:type project: csbuild.projectSettings.projectSettings
+
+	:ivar priority: Jobs with a higher priority are started first
+	:type priority: float
+	"""
+	def __init__( self, project, priority = 0 ):
+		self.project = project
+		self.priority = priority
+		project.state = _shared_globals.ProjectState.LINK_QUEUED
+		project.linkQueueStart = time.time()
+
+
+	def Abort( self ):
+		"""
+		Mark a link that never started as aborted.
+		"""
+		self.project.state = _shared_globals.ProjectState.ABORTED
+		self.project.linkStart = time.time()
+		self.project.endTime = self.project.linkStart
+
+
+	def Run( self ):
+		"""
+		Link the project on the calling thread, then run its post-build step.
+		"""
+		_jobs.RunSteps( self.Steps( ) )
+
+
+	def Steps( self ):
+		"""
+		Link the project, then run its post-build step. Never raises; a link that can't be run is failed.
+
+		Yields the linker's :class:`csbuild._jobs.Process`, if it needs running, and expects to be sent back its return
+		code, stdout, and stderr.
+		"""
+		project = self.project
 		try:
-			project = self._project
 			project.state = _shared_globals.ProjectState.LINKING
-			ret = _performLink(project, self._objs)
+			project.linkStart = time.time()
+
+			project.activeToolchain.preLinkStep(project)
+			if project.preLinkStep:
+				log.LOG_BUILD( "Running pre-link step for {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName  ) )
+				project.preLinkStep(project)
+
+			project.activeToolchain.SetActiveTool("linker")
+
+			starttime = time.time( )
+			ret = _prepareLink(project, [])
+			if isinstance( ret, _jobs.Process ):
+				ret, output, errors = yield ret
+				ret = _finishLink(project, ret, output, errors, starttime)
 
 			if ret == _LinkStatus.Fail:
 				_shared_globals.build_success = False
@@ -1894,76 +2019,13 @@ class _LinkThread(threading.Thread):
 				project.state = _shared_globals.ProjectState.UP_TO_DATE
 			project.endTime = time.time()
 			log.LOG_BUILD( "Finished {} ({} {}/{})".format( project.outputName, project.targetName, project.outputArchitecture, project.activeToolchainName ) )
-
-			_shared_globals.link_semaphore.release()
-
-			with _linkThreadMutex:
-				_currentLinkThreads.remove(project.key)
-			with _linkMutex:
-				_recheckDeferredLinkTasks = True
-				_linkCond.notify()
 		except Exception:
+			_shared_globals.build_success = False
+			project.state = _shared_globals.ProjectState.LINK_FAILED
+			project.endTime = time.time()
 			traceback.print_exc()
 
 
-def _linkThreadLoop():
-	global _linkQueue
-	global _linkMutex
-	global _linkCond
-	global _currentLinkThreads
-	global _linkThreadMutex
-	global _recheckDeferredLinkTasks
-
-	try:
-		global _building
-		deferredLinks = []
-		while True:
-			projectsToLink = []
-			with _linkMutex:
-				if _recheckDeferredLinkTasks:
-					if _linkQueue:
-						_linkQueue += deferredLinks
-					else:
-						_linkQueue = deferredLinks
-					deferredLinks = []
-					_recheckDeferredLinkTasks = False
-				if not _linkQueue:
-					if not _building and not deferredLinks and not _currentLinkThreads:
-						return
-					_linkQueue = deferredLinks
-					deferredLinks = []
-					_linkCond.wait()
-				projectsToLink = _linkQueue
-				_linkQueue = []
-
-
-			for ( project, objs ) in projectsToLink:
-				okToLink = True
-				with _linkThreadMutex:
-					for depend in project.reconciledLinkDepends:
-						if depend in _currentLinkThreads:
-							okToLink = False
-							break
-
-						for ( otherProj, otherObjs ) in projectsToLink:
-							if otherProj.key == depend:
-								okToLink = False
-								break
-						if not okToLink:
-							break
-
-				if okToLink:
-					with _linkThreadMutex:
-						_currentLinkThreads.add(project.key)
-					_shared_globals.link_semaphore.acquire(True)
-					_LinkThread(project, objs).start()
-				else:
-					deferredLinks.append( ( project, objs ) )
-	except Exception:
-		traceback.print_exc()
-
-_linkThread = threading.Thread(target=_linkThreadLoop)
-
 def _clean( silent = False ):
 	"""
 	Cleans the project.
@@ -1986,6 +2048,10 @@ def _clean( silent = False ):
 					log.LOG_INFO( "Deleting {0}".format( obj ) )
 				os.remove( obj )
 
+			depFile = _utils.GetDepFilePath(obj)
+			if os.access(depFile , os.F_OK):
+				os.remove( depFile )
+
 		# Individual source files may not be in the chunks list, so we're gonna play it safe and delete any single source file objects that may exist.
 		for source in project.sources:
 			obj = _utils.GetSourceObjPath(project, source)
@@ -1993,6 +2059,9 @@ def _clean( silent = False ):
 				if not silent:
 					log.LOG_INFO( "Deleting {0}".format( obj ) )
 				os.remove( obj )
+			depFile = _utils.GetDepFilePath(obj)
+			if os.access(depFile , os.F_OK):
+				os.remove( depFile )
 
 		# Delete the project's C++ precompiled header.
 		headerfile = os.path.join(project.csbuildDir, "{}_cpp_precompiled_headers_{}.hpp".format(
@@ -2084,12 +2153,12 @@ def _install( ):
 	_installOutput()
 
 
-def _make( ):
+def _make( projects = None ):
 	"""
 	Performs both the build and link steps of the process.
 	Aborts if the build fails.
 	"""
-	if not _build( ):
+	if not _build( projects ):
 		_shared_globals.build_success = False
 		log.LOG_ERROR( "Build failed." )
 	else:
@@ -2309,7 +2378,10 @@ class _dummy( object ):
 		return ""
 
 
+_executedScripts = set( )
+
 def _execfile( file, glob, loc ):
+	_executedScripts.add( os.path.abspath( file ) )
 	if sys.version_info >= (3, 0):
 		with open( file, "r" ) as f:
 			exec (f.read( ), glob, loc)
@@ -2320,6 +2392,31 @@ def _execfile( file, glob, loc ):
 mainFile = ""
 mainFileDir = ""
 
+def _openLogFile( ):
+	logDirectory = os.path.join(mainFileDir, ".csbuild", "log")
+	if not os.path.exists(logDirectory):
+		os.makedirs(logDirectory)
+
+	logFile = os.path.join(logDirectory, "build.log")
+
+	logBackup = "{}.4".format(logFile)
+	if os.path.exists(logBackup):
+		os.remove(logBackup)
+
+	for i in range(3,0,-1):
+		logBackup = "{}.{}".format(logFile, i)
+		if os.path.exists(logBackup):
+			newBackup = "{}.{}".format(logFile, i+1)
+			os.rename(logBackup, newBackup)
+
+	if os.path.exists(logFile):
+		logBackup = "{}.1".format(logFile)
+		os.rename(logFile, logBackup)
+
+	if _shared_globals.logFile is not None:
+		_shared_globals.logFile.close()
+	_shared_globals.logFile = open(logFile, "w")
+
 def _run( ):
 
 	_setupdefaults( )
@@ -2348,6 +2445,18 @@ def _run( ):
 		log.LOG_ERROR( "CSB cannot be run from the interactive console." )
 		Exit( 1 )
 
+	#Clients don't need anything but the command line, so hand off to the daemon before doing anything else.
+	stopDaemon = "--stop-daemon" in sys.argv
+	if ( "--client" in sys.argv or stopDaemon ) and _daemon.IsSupported( ):
+		#The daemon keeps the build log; nothing the client says is worth rotating it for.
+		_shared_globals.logFile = open( os.devnull, "w" )
+		code = _daemon.RunClient( _daemon.GetSocketPath( mainFileDir, mainFile ),
+			[arg for arg in sys.argv[1:] if arg != "--client"], stopDaemon )
+		if code is not None:
+			Exit( code )
+		if stopDaemon:
+			Exit( 0 )
+
 	csbDir = os.path.join(mainFileDir, ".csbuild")
 	if not os.path.exists(csbDir):
 		os.makedirs(csbDir)
@@ -2356,27 +2465,7 @@ def _run( ):
 	if not os.path.exists(_shared_globals.cacheDirectory):
 		os.makedirs(_shared_globals.cacheDirectory)
 
-	logDirectory = os.path.join(csbDir, "log")
-	if not os.path.exists(logDirectory):
-		os.makedirs(logDirectory)
-
-	logFile = os.path.join(logDirectory, "build.log")
-
-	logBackup = "{}.4".format(logFile)
-	if os.path.exists(logBackup):
-		os.remove(logBackup)
-
-	for i in range(3,0,-1):
-		logBackup = "{}.{}".format(logFile, i)
-		if os.path.exists(logBackup):
-			newBackup = "{}.{}".format(logFile, i+1)
-			os.rename(logBackup, newBackup)
-
-	if os.path.exists(logFile):
-		logBackup = "{}.1".format(logFile)
-		os.rename(logFile, logBackup)
-
-	_shared_globals.logFile = open(logFile, "w")
+	_openLogFile( )
 
 	epilog = "    ------------------------------------------------------------    \n\nProjects available in this makefile (listed in build order):\n\n"
 
@@ -2486,9 +2575,11 @@ def _run( ):
 		dest = "linker_jobs",
 		type = int,
 		help = "Max number of simultaneous link processes. (If not specified, same value as -j.)"
-		"Note that this pool is shared with build threads, and linker will only get one thread from the pool until compile threads start becoming free."
+		"Note that links run on the same pool of -j workers as compiles, so they only get workers the compiles aren't using."
 		"This value only specifies a maximum."
 	)
+	parser.add_argument( "--scan-jobs", action = "store", dest = "scan_jobs", type = int,
+		help = "Number of threads used to check which files need to be recompiled. (If not specified, same value as -j.)" )
 	parser.add_argument( "-g", "--gui", action = "store_true", dest = "gui", help = "Show GUI while building (experimental)")
 	parser.add_argument( "--auto-close-gui", action = "store_true", help = "Automatically close the gui on build success (will stay open on failure)")
 	parser.add_argument("--profile", action="store_true", help="Collect detailed line-by-line profiling information on compile time. --gui option required to see this information.")
@@ -2525,6 +2616,21 @@ def _run( ):
 		action = "store_true" )
 	parser.add_argument( '--no-chunks', help = "Disable chunking globally, affects all projects",
 		action = "store_true" )
+	parser.add_argument( '--object-cache', help = "Reuse previously compiled objects when a file is compiled again with "
+		"the same command, compiler, and inputs.", action = "store_true" )
+	parser.add_argument( '--object-cache-size', help = "Size limit of the object cache in megabytes (default 5120)",
+		action = "store", type = int, default = 5120 )
+	parser.add_argument( '--cache-stats', help = "Print object cache statistics and exit", action = "store_true" )
+
+	group = parser.add_mutually_exclusive_group( )
+	group.add_argument( '--daemon', help = "Stay resident and run the builds requested with --client, keeping the "
+		"makefile and the state of the last build loaded in between. Builds run with the arguments and environment "
+		"the daemon was started with.", action = "store_true" )
+	group.add_argument( '--client', help = "Have the build daemon for this makefile run the build. Builds locally if no "
+		"daemon is running, or if it was started with different arguments.", action = "store_true" )
+	group.add_argument( '--stop-daemon', help = "Stop the build daemon for this makefile", action = "store_true" )
+	group.add_argument( '--watch', help = "After building, keep watching the source and include directories and build "
+		"again whenever something in them changes.", action = "store_true" )
 	parser.add_argument( '--dg', '--dependency-graph', help="Generate dependency graph", action="store_true")
 	parser.add_argument( '--with-libs', help="Include linked libraries in dependency graph", action="store_true" )
 
@@ -2588,6 +2694,25 @@ def _run( ):
 		print("\nMaintainer: {} - {}".format( __maintainer__, __email__ ))
 		return
 
+	if ( args.daemon or args.stop_daemon ) and not _daemon.IsSupported( ):
+		log.LOG_ERROR( "The build daemon is not supported on this platform." )
+		Exit( 1 )
+	if args.daemon and args.gui:
+		log.LOG_ERROR( "The build daemon can't be used with --gui." )
+		Exit( 1 )
+	if args.watch and ( args.gui or args.clean or args.install or args.install_headers or args.install_output
+			or args.generate_solution is not None ):
+		log.LOG_ERROR( "--watch can only be used for regular builds." )
+		Exit( 1 )
+
+	if args.object_cache or args.cache_stats:
+		objectCache = _object_cache.ObjectCache( os.path.join( _shared_globals.cacheDirectory, "objects" ),
+			args.object_cache_size * 1024 * 1024 )
+		if args.cache_stats:
+			_printObjectCacheStats( objectCache )
+			return
+		_shared_globals.objectCache = objectCache
+
 	_shared_globals.CleanBuild = args.clean
 	_shared_globals.do_install = args.install or args.install_headers or args.install_output
 	_shared_globals.quiet = args.quiet
@@ -2624,11 +2749,14 @@ def _run( ):
 
 	if args.jobs:
 		_shared_globals.max_threads = args.jobs
-		_shared_globals.semaphore = threading.BoundedSemaphore( value = _shared_globals.max_threads )
+
+	if args.scan_jobs:
+		_shared_globals.max_scan_threads = args.scan_jobs
+	else:
+		_shared_globals.max_scan_threads = _shared_globals.max_threads
 
 	if args.linker_jobs:
 		_shared_globals.max_linker_threads = max(args.linker_jobs, _shared_globals.max_threads)
-		_shared_globals.link_semaphore = threading.BoundedSemaphore( value = _shared_globals.max_linker_threads )
 
 	_shared_globals.profile = args.profile
 	_shared_globals.disable_chunks = args.no_chunks
@@ -3075,27 +3203,34 @@ def _run( ):
 			log.LOG_BUILD("Wrote depends.png")
 		return
 
-	#headerCacheFile = os.path.join(_shared_globals.cacheDirectory, "header_info.csbc")
-	#if os.path.exists(headerCacheFile):
-	#	log.LOG_BUILD("Loading cache data...")
-	#	with open(headerCacheFile, "rb") as f:
-	#		_shared_globals.allheaders = pickle.load(f)
-	#	mtime = os.path.getmtime(headerCacheFile)
-	#	for header in _shared_globals.allheaders.keys():
-	#		if not header:
-	#			continue
-	#		try:
-	#			htime = os.path.getmtime(header)
-	#			if htime > mtime:
-	#				del _shared_globals.allheaders[header]
-	#		except:
-	#			del _shared_globals.allheaders[header]
+	if args.daemon:
+		_serveBuilds( )
+		return
+
+	code = _runBuild( )
+	if args.watch:
+		_watchBuilds( )
+	Exit( code )
+
+
+def _runBuild( ):
+	headerCacheFile = os.path.join( _shared_globals.cacheDirectory, "header_info.csbc" )
+	if _shared_globals.includeCache is None:
+		_shared_globals.includeCache = _include_cache.IncludeCache( )
+		_shared_globals.includeCache.Load( headerCacheFile )
+
+	manifestFile = os.path.join( _shared_globals.cacheDirectory, "directories.csbc" )
+	if _shared_globals.directoryManifest is None:
+		_shared_globals.directoryManifest = _dir_manifest.DirectoryManifest( )
+		_shared_globals.directoryManifest.Load( manifestFile )
 
 	for proj in _shared_globals.sortedProjects:
 		proj.prepareBuild( )
+	_shared_globals.directoryManifest.Save( manifestFile )
 
-	#with open(headerCacheFile, "wb") as f:
-	#	pickle.dump(_shared_globals.allheaders, f, 2)
+	if _shared_globals.buildDurations is None:
+		_shared_globals.buildDurations = _durations.DurationHistory( )
+		_shared_globals.buildDurations.Load( os.path.join( _shared_globals.cacheDirectory, "durations.csbc" ) )
 
 	_utils.CheckVersion( )
 
@@ -3138,6 +3273,12 @@ def _run( ):
 	else:
 		_make( )
 
+	#Most headers are only scanned once the build has finished, when each project records what it compiled.
+	_shared_globals.includeCache.Save( headerCacheFile )
+	return _reportBuild( )
+
+
+def _reportBuild( ):
 	#Print out any errors or warnings incurred so the user doesn't have to scroll to see what went wrong
 	if _shared_globals.warnings:
 		print("\n")
@@ -3151,9 +3292,134 @@ def _run( ):
 			log.LOG_ERROR( error )
 
 	if not _shared_globals.build_success:
+		return 1
+	return 0
+
+
+def _serveBuilds( ):
+	daemon = _daemon.BuildDaemon( _daemon.GetSocketPath( mainFileDir, mainFile ),
+		[arg for arg in sys.argv[1:] if arg != "--daemon"], _executedScripts,
+		[sys.executable, os.path.join( mainFileDir, mainFile )] + sys.argv[1:],
+		{ "on" : True, "off" : False }.get( args.force_color ) )
+	_warmDaemon( None )
+	if not daemon.Serve( _daemonBuild, _daemonState, _warmDaemon ):
+		log.LOG_ERROR( "A build daemon is already running on {}".format( daemon.socketPath ) )
 		Exit( 1 )
-	else:
-		Exit( 0 )
+
+
+def _daemonBuild( request ):
+	#Runs in a child of the daemon, with the project settings exactly as the makefile left them.
+	_openLogFile( )
+	_shared_globals.starttime = time.time( )
+	if args.force_color is None:
+		_shared_globals.color_supported = request["color"]
+	if args.force_progress_bar is None:
+		_shared_globals.forceProgressBar = "on" if request["columns"] else "off"
+	return _runBuild( )
+
+
+def _daemonState( code ):
+	snapshot = None
+	if code == 0 and not ( _shared_globals.CleanBuild or _shared_globals.do_install or _shared_globals.rebuild
+			or args.generate_solution is not None ):
+		snapshot = {}
+		for project in _shared_globals.sortedProjects:
+			projectSnapshot = project.get_build_snapshot( )
+			if projectSnapshot is None:
+				snapshot = None
+				break
+			snapshot.update( projectSnapshot )
+
+	databases = [( hashDatabase.filename, hashDatabase.settingsKey, hashDatabase.hasherName )
+		for hashDatabase in _shared_globals.hashDatabases.values( )]
+	return snapshot, databases
+
+
+def _warmDaemon( databases ):
+	#Runs in the daemon after each build, reloading what it wrote so the next build doesn't have to.
+	includeCache = _include_cache.IncludeCache( )
+	includeCache.Load( os.path.join( _shared_globals.cacheDirectory, "header_info.csbc" ) )
+	_shared_globals.includeCache = includeCache
+
+	for filename, settingsKey, hasherName in databases or ():
+		hashDatabase = _hash_db.HashDatabase( filename )
+		hashDatabase.Load( settingsKey, hasherName )
+		_shared_globals.hashDatabases[filename] = hashDatabase
+
+
+def _watchBuilds( ):
+	watchDirs = set( os.path.dirname( script ) for script in _executedScripts )
+	ignoreDirs = set( )
+	for project in _shared_globals.sortedProjects:
+		watchDirs.update( project.get_watch_dirs( ) )
+		ignoreDirs.update( ( project.objDir, project.outputDir, project.csbuildDir ) )
+	watcher = _file_watcher.FileWatcher( watchDirs, ignoreDirs )
+	headerCacheFile = os.path.join( _shared_globals.cacheDirectory, "header_info.csbc" )
+
+	log.LOG_BUILD( "Watching for changes ({})...".format( watcher.method ) )
+	while True:
+		changed = watcher.Wait( )
+		if changed is None:
+			log.LOG_WARN_NOPUSH( "Lost track of which files changed, checking all of them." )
+			changed = set( )
+			for project in _shared_globals.sortedProjects:
+				hashDatabase = project.get_hash_database( )
+				hashDatabase.Refresh( )
+				changed |= hashDatabase.changedFiles
+
+		if not _executedScripts.isdisjoint( changed ):
+			log.LOG_BUILD( "The makefile has changed, restarting..." )
+			watcher.Close( )
+			sys.stdout.flush( )
+			sys.stderr.flush( )
+			os.execv( sys.executable, [sys.executable, os.path.join( mainFileDir, mainFile )] + sys.argv[1:] )
+
+		#Everything remembered about the files from one build to the next has to be forgotten for the ones that changed.
+		#The include graph and resolver are just rebuilt from scratch, for whatever this build ends up looking at.
+		for path in changed:
+			_shared_globals.fileDigests.pop( path, None )
+			_shared_globals.fileIdentifiers.pop( path, None )
+		_shared_globals.includeCache.Forget( changed )
+		if _shared_globals.objectCache is not None:
+			_shared_globals.objectCache.Forget( changed )
+		_shared_globals.includeResolver.Clear( )
+		_shared_globals.includeGraph = _include_graph.IncludeGraph( )
+
+		projects = []
+		rebuiltKeys = set( )
+		for project in _shared_globals.sortedProjects:
+			project.reset_build_state( )
+			#Anything linked against a project that's rebuilt has to be relinked.
+			if project.apply_file_changes( changed ) or not rebuiltKeys.isdisjoint( project.reconciledLinkDepends ):
+				projects.append( project )
+				rebuiltKeys.add( project.key )
+			else:
+				project.state = _shared_globals.ProjectState.UP_TO_DATE
+
+		if not projects:
+			continue
+
+		_shared_globals.build_success = True
+		_shared_globals.called_something = False
+		_shared_globals.buildFinished = False
+		_shared_globals.interrupted = False
+		_shared_globals.total_compiles = 0
+		_shared_globals.total_precompiles = 0
+		_shared_globals.precompiles_done = 0
+		_shared_globals.times = []
+		_shared_globals.errors = []
+		_shared_globals.warnings = []
+		_shared_globals.warningcount = 0
+		_shared_globals.errorcount = 0
+		_shared_globals.starttime = time.time( )
+
+		_utils.ChunkedBuild( )
+		_utils.PreparePrecompiles( projects )
+		_make( projects )
+		_shared_globals.includeCache.Save( headerCacheFile )
+		_reportBuild( )
+		log.LOG_BUILD( "Watching for changes ({})...".format( watcher.method ) )
+
 
 #Regular sys.exit can't be called because we HAVE to reacquore the import lock at exit.
 #We stored sys.exit earlier, now we overwrite it to call our wrapper.
@@ -0,0 +1,264 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Async engine module**
+
+Defines the engine that runs every compiler and linker process from a single asyncio event loop, where asyncio is
+available.
+
+:var available: Whether or not the engine can be used here. It needs asyncio to be able to wait on processes from a
+	loop on a thread other than the main one, which it can from Python 3.8 on. On Windows, commands are passed to the
+	process as strings, which asyncio doesn't support, so _jobs.WorkerPool is used there instead.
+:type available: bool
+"""
+
+import heapq
+import itertools
+import os
+import platform
+import subprocess
+import sys
+import threading
+import traceback
+
+try:
+	import asyncio
+	import concurrent.futures
+except ImportError:
+	asyncio = None
+
+available = asyncio is not None and sys.version_info >= (3, 8) and platform.system() != "Windows"
+
+#Threads that run the jobs' own work between processes: building commands, hashing inputs, parsing output. It's all
+#python, so more of them than this would only contend for the interpreter.
+_HELPER_THREADS = 4
+
+
+def _Advance( steps, result, error ):
+	#Run a job up to the next process it needs. Runs on a helper thread.
+	try:
+		if error is not None:
+			return steps.throw( error )
+		return steps.send( result )
+	except StopIteration:
+		return None
+
+
+if asyncio is not None:
+	class _ProcessProtocol( asyncio.SubprocessProtocol ):
+		"""Collects a process's output in whatever size chunks the pipes deliver it in, and reports it once the process
+		has exited and both pipes are closed."""
+		def __init__( self, finished ):
+			self._finished = finished
+			self._transport = None
+			self._output = []
+			self._errors = []
+
+		def connection_made( self, transport ):
+			self._transport = transport
+
+		def pipe_data_received( self, fd, data ):
+			if fd == 1:
+				self._output.append( data )
+			else:
+				self._errors.append( data )
+
+		def connection_lost( self, exc ):
+			#Anything raised here would be swallowed by the loop and leave the job waiting forever, so it's passed on to
+			#the job instead.
+			try:
+				ret = self._transport.get_returncode( )
+				self._transport.close( )
+				output = b"".join( self._output ).decode( "utf-8", "replace" )
+				errors = b"".join( self._errors ).decode( "utf-8", "replace" )
+			except Exception as e:
+				self._finished( None, e )
+				return
+			self._finished( ( ret, output, errors ), None )
+
+
+class AsyncEngine( object ):
+	"""
+	Runs jobs from a shared priority queue, with every process they start run from one asyncio event loop.
+
+	Jobs are the same as for :class:`csbuild._jobs.WorkerPool`, and are run through their Steps( ). Each job's own
+	work is done on one of a few helper threads, and each process it needs is started and waited on from the loop,
+	so the number of threads stays the same however many jobs run at once. An asyncio semaphore limits how many jobs
+	are running at a time; as each one finishes, the job with the highest priority still queued takes its place.
+
+	:ivar numProcesses: Most jobs to run at once
+	:type numProcesses: int
+	"""
+
+	def __init__( self, numProcesses ):
+		self.numProcesses = numProcesses
+		self._queue = []
+		self._sequence = itertools.count( )
+		self._running = 0
+		self._finished = []
+
+		self._lock = threading.Lock( )
+		self._jobFinished = threading.Condition( self._lock )
+
+		self._executor = concurrent.futures.ThreadPoolExecutor( _HELPER_THREADS )
+		self._loop = asyncio.new_event_loop( )
+		self._semaphore = None
+
+		started = threading.Event( )
+		self._thread = threading.Thread( target = self._LoopMain, args = ( started, ), name = "csbuild event loop" )
+		self._thread.daemon = True
+		self._thread.start( )
+		started.wait( )
+
+
+	def Submit( self, job ):
+		"""
+		Queue a job to be run once there's room for it.
+
+		:param job: The job
+		:type job: csbuild._jobs.CompileJob
+		"""
+		with self._lock:
+			heapq.heappush( self._queue, ( -job.priority, next( self._sequence ), job ) )
+		self._loop.call_soon_threadsafe( self._Acquire )
+
+
+	def GetOutstanding( self ):
+		"""
+		:return: Number of jobs that are either queued or running
+		:rtype: int
+		"""
+		with self._lock:
+			return len( self._queue ) + self._running
+
+
+	def Wait( self, timeout = None ):
+		"""
+		Block until a job finishes, unless one has already finished since the last call or nothing is outstanding.
+
+		:param timeout: Longest to wait, in seconds, or None to wait as long as it takes
+		:type timeout: float
+
+		:return: Every job that finished or was cancelled since the last call, in the order they finished
+		:rtype: list[csbuild._jobs.CompileJob]
+		"""
+		with self._lock:
+			if not self._finished and ( self._queue or self._running ):
+				self._jobFinished.wait( timeout )
+			finished = self._finished
+			self._finished = []
+			return finished
+
+
+	def Cancel( self ):
+		"""
+		Abort every job that hasn't started yet. Jobs that are running are left to finish.
+		"""
+		with self._lock:
+			queued = [entry[2] for entry in sorted( self._queue )]
+			self._queue = []
+		for job in queued:
+			job.Abort( )
+		with self._lock:
+			self._finished += queued
+			self._jobFinished.notify_all( )
+
+
+	def Close( self ):
+		"""
+		Wait for every job to finish, then stop the loop and the helper threads.
+		"""
+		with self._lock:
+			while self._queue or self._running:
+				self._jobFinished.wait( )
+		self._loop.call_soon_threadsafe( self._loop.stop )
+		self._thread.join( )
+		self._loop.close( )
+		self._executor.shutdown( )
+
+
+	def _LoopMain( self, started ):
+		asyncio.set_event_loop( self._loop )
+		#Before 3.12, asyncio waits on each process from a thread of its own unless it's told it can wait on a pidfd.
+		if sys.version_info < (3, 12) and hasattr( asyncio, "PidfdChildWatcher" ) and hasattr( os, "pidfd_open" ):
+			watcher = asyncio.PidfdChildWatcher( )
+			watcher.attach_loop( self._loop )
+			asyncio.set_child_watcher( watcher )
+		self._semaphore = asyncio.Semaphore( self.numProcesses )
+		started.set( )
+		self._loop.run_forever( )
+
+
+	def _Acquire( self ):
+		#Every queued job gets a slot of its own. Which job runs in it is only decided once it's free, so it's whichever
+		#has the highest priority by then.
+		self._loop.create_task( self._semaphore.acquire( ) ).add_done_callback( self._StartNext )
+
+
+	def _StartNext( self, acquired ):
+		with self._lock:
+			if not self._queue:
+				#Cancelled while it was waiting.
+				self._semaphore.release( )
+				return
+			job = heapq.heappop( self._queue )[2]
+			self._running += 1
+		self._Step( job, job.Steps( ), None, None )
+
+
+	def _Step( self, job, steps, result, error ):
+		future = self._loop.run_in_executor( self._executor, _Advance, steps, result, error )
+		future.add_done_callback( lambda done: self._OnStep( job, steps, done ) )
+
+
+	def _OnStep( self, job, steps, done ):
+		error = done.exception( )
+		if error is not None:
+			#Jobs handle their own errors, so this is a bug; don't leave the build waiting on the job forever.
+			traceback.print_exception( type( error ), error, error.__traceback__ )
+			self._Finish( job )
+			return
+
+		process = done.result( )
+		if process is None:
+			self._Finish( job )
+			return
+
+		def ProcessFinished( result, error ):
+			self._Step( job, steps, result, error )
+
+		started = self._loop.subprocess_exec( lambda: _ProcessProtocol( ProcessFinished ), *process.command,
+			stdin = None, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = process.cwd )
+
+		def Started( task ):
+			#A process that couldn't be started is reported to the job the same way Popen would report it.
+			if task.exception( ) is not None:
+				ProcessFinished( None, task.exception( ) )
+
+		self._loop.create_task( started ).add_done_callback( Started )
+
+
+	def _Finish( self, job ):
+		self._semaphore.release( )
+		with self._lock:
+			self._running -= 1
+			self._finished.append( job )
+			self._jobFinished.notify_all( )
@@ -0,0 +1,163 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Build graph module**
+
+Defines the graph of steps in a build and what each one has to wait for.
+"""
+
+
+class BuildGraph( object ):
+	"""
+	Steps of a build and the steps each one depends on. A step is ready once everything it depends on has finished,
+	and can never run if anything it depends on has failed.
+
+	Steps are any hashable object. Steps can be added and given more dependencies as the build goes, so long as they
+	haven't been started yet.
+
+	:ivar running: Number of steps that have been started and haven't finished or failed yet
+	:type running: int
+	"""
+	PENDING = 0
+	STARTED = 1
+	FINISHED = 2
+	FAILED = 3
+
+	def __init__( self ):
+		self.running = 0
+		self._state = {}
+		self._waitingOn = {}
+		self._dependents = {}
+		self._ready = []
+
+
+	def Add( self, step, depends = () ):
+		"""
+		Add a step.
+
+		:param step: The step
+		:type step: object
+
+		:param depends: Steps already in the graph that have to finish before this one can start
+		:type depends: list[object]
+		"""
+		self._state[step] = BuildGraph.PENDING
+		self._waitingOn[step] = 0
+		self._dependents[step] = []
+		self._ready.append( step )
+		for depend in depends:
+			self.AddDependency( step, depend )
+
+
+	def AddDependency( self, step, depend ):
+		"""
+		Make a step that hasn't been started yet wait for another one to finish.
+
+		:param step: The step that has to wait
+		:type step: object
+
+		:param depend: The step it has to wait for, which mustn't have failed
+		:type depend: object
+		"""
+		assert self._state[step] == BuildGraph.PENDING, "Step {} has already been started".format( step )
+		state = self._state[depend]
+		assert state != BuildGraph.FAILED, "Step {} has already failed".format( depend )
+		if state == BuildGraph.FINISHED:
+			return
+		self._waitingOn[step] += 1
+		self._dependents[depend].append( step )
+
+
+	def PopReady( self ):
+		"""
+		Get every step that's ready and hasn't been returned by a previous call, and mark them as started.
+
+		:return: Ready steps, in the order they were added or became ready
+		:rtype: list[object]
+		"""
+		ready = [
+			step for step in self._ready
+			if self._state[step] == BuildGraph.PENDING and not self._waitingOn[step]
+		]
+		self._ready = []
+		for step in ready:
+			self._state[step] = BuildGraph.STARTED
+		self.running += len( ready )
+		return ready
+
+
+	def Finish( self, step ):
+		"""
+		Mark a started step as finished. Anything that was only waiting on it becomes ready.
+
+		:param step: The step
+		:type step: object
+		"""
+		assert self._state[step] == BuildGraph.STARTED, "Step {} isn't running".format( step )
+		self._state[step] = BuildGraph.FINISHED
+		self.running -= 1
+		for dependent in self._dependents.pop( step ):
+			self._waitingOn[dependent] -= 1
+			if not self._waitingOn[dependent]:
+				self._ready.append( dependent )
+
+
+	def Fail( self, step ):
+		"""
+		Mark a step as failed, along with everything that depends on it, directly or otherwise. The step can be one that
+		hasn't been started, to keep it and its dependents from ever running.
+
+		:param step: The step
+		:type step: object
+
+		:return: Steps that failed because they depended on this one, dependencies first
+		:rtype: list[object]
+		"""
+		if self._state[step] == BuildGraph.STARTED:
+			self.running -= 1
+		self._state[step] = BuildGraph.FAILED
+
+		skipped = []
+		stack = list( reversed( self._dependents.pop( step ) ) )
+		while stack:
+			dependent = stack.pop( )
+			if self._state[dependent] == BuildGraph.FAILED:
+				continue
+			self._state[dependent] = BuildGraph.FAILED
+			skipped.append( dependent )
+			stack.extend( reversed( self._dependents.pop( dependent ) ) )
+		return skipped
+
+
+	def IsFinished( self, step ):
+		"""
+		:return: Whether or not a step has finished
+		:rtype: bool
+		"""
+		return self._state[step] == BuildGraph.FINISHED
+
+
+	def GetPending( self ):
+		"""
+		:return: Steps that haven't been started, and won't be unless whatever they're waiting for finishes
+		:rtype: list[object]
+		"""
+		return [step for step, state in self._state.items( ) if state == BuildGraph.PENDING]
@@ -0,0 +1,545 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+**Build daemon module**
+
+Defines the resident build server started with --daemon, and the client that --client uses to talk to it.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import time
+import traceback
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import terminfo
+from . import _shared_globals
+from . import _utils
+
+#Every message in either direction is a one-byte kind and a length, followed by that many bytes of data.
+_HEADER = struct.Struct( "!cI" )
+
+#Client to daemon
+_BUILD = b"b"
+_STOP = b"s"
+
+#Daemon to client
+_STDOUT = b"o"
+_STDERR = b"e"
+_EXIT = b"x"
+_RESTART = b"r"
+_REJECT = b"j"
+
+
+def IsSupported( ):
+	"""
+	Check whether the build daemon can run on this platform.
+
+	:return: Whether or not Unix sockets and fork() are available
+	:rtype: bool
+	"""
+	return hasattr( os, "fork" ) and hasattr( socket, "AF_UNIX" )
+
+
+def GetSocketPath( directory, makefile ):
+	"""
+	Get the path of the socket the build daemon for a makefile listens on.
+
+	:param directory: Directory containing the makefile
+	:type directory: str
+
+	:param makefile: File name of the makefile
+	:type makefile: str
+
+	:return: Path to the socket
+	:rtype: str
+	"""
+	path = os.path.join( directory, ".csbuild", "{}.sock".format( makefile ) )
+	#Socket paths are limited to a little over 100 bytes on most systems.
+	if len( path ) > 100:
+		digest = hashlib.sha1( path.encode( "utf-8" ) ).hexdigest( )[:16]
+		path = os.path.join( tempfile.gettempdir( ), "csbuild-{}-{}.sock".format( os.getuid( ), digest ) )
+	return path
+
+
+def RunClient( socketPath, argv, stop = False ):
+	"""
+	Ask the build daemon listening on the given socket to run a build, or to stop, copying the build's output to this
+	process's stdout and stderr as it arrives.
+
+	:param socketPath: Path to the daemon's socket
+	:type socketPath: str
+
+	:param argv: Command line arguments for the build, which have to match the ones the daemon was started with
+	:type argv: list[str]
+
+	:param stop: Ask the daemon to stop instead of running a build
+	:type stop: bool
+
+	:return: The build's exit code, or None if there's no daemon running or it can't run this build
+	:rtype: int or None
+	"""
+	if stop:
+		request = ( _STOP, b"" )
+	else:
+		request = ( _BUILD, json.dumps( {
+			"argv" : argv,
+			"color" : _shared_globals.color_supported,
+			"columns" : _shared_globals.columns,
+		} ).encode( "utf-8" ) )
+
+	stdout = getattr( sys.__stdout__, "buffer", sys.__stdout__ )
+	stderr = getattr( sys.__stderr__, "buffer", sys.__stderr__ )
+
+	daemonPid = None
+	while True:
+		sock = _Connect( socketPath )
+		if sock is None:
+			if daemonPid is None:
+				if stop:
+					log.LOG_BUILD( "No build daemon is running." )
+				else:
+					log.LOG_BUILD( "No build daemon is running, building locally." )
+				return None
+			#A daemon that's restarting keeps its process ID, so keep trying for as long as it's alive.
+			if _IsRunning( daemonPid ):
+				time.sleep( 0.05 )
+				continue
+			log.LOG_WARN_NOPUSH( "The build daemon exited while reloading the makefile, building locally." )
+			return None
+
+		try:
+			_SendFrame( sock, *request )
+			while True:
+				kind, data = _RecvFrame( sock )
+				if kind == _STDOUT:
+					stdout.write( data )
+					stdout.flush( )
+				elif kind == _STDERR:
+					stderr.write( data )
+					stderr.flush( )
+				elif kind == _EXIT:
+					return int( data )
+				elif kind == _REJECT:
+					log.LOG_WARN_NOPUSH( data.decode( "utf-8" ) )
+					return None
+				elif kind == _RESTART:
+					log.LOG_BUILD( "The makefile has changed, waiting for the build daemon to reload it..." )
+					daemonPid = int( data )
+					break
+				else:
+					log.LOG_ERROR( "Lost connection to the build daemon." )
+					return 1
+		except socket.error as e:
+			log.LOG_ERROR( "Lost connection to the build daemon: {}".format( e ) )
+			return 1
+		finally:
+			sock.close( )
+
+
+class BuildDaemon( object ):
+	"""
+	Resident build server for one makefile.
+
+	The daemon is started with the same arguments as a normal build, and keeps everything that doesn't depend on the
+	state of the files being built loaded: the makefile and the projects it defines. It then waits for requests on a
+	Unix socket. Each build runs in a forked child, so it starts from that state without being able to disturb it, and
+	its output is streamed back to the client as it's produced.
+
+	When a build finishes, the child hands back what the next build will need: the databases it wrote, which are
+	loaded again while the daemon is idle, and the stat of everything the build's up-to-date checks looked at. If none
+	of that has changed when the next request comes in, the daemon answers that there's nothing to build without
+	running a build at all.
+
+	Builds are run one at a time. If the makefile or any module loaded with it changes, the daemon restarts itself to
+	load them again.
+
+	:ivar socketPath: Path to the socket the daemon listens on
+	:type socketPath: str
+
+	:ivar argv: Command line arguments builds are run with; a client asking for any others is turned away
+	:type argv: list[str]
+	"""
+
+	def __init__( self, socketPath, argv, scripts, restartArgv, color = None ):
+		"""
+		:param socketPath: Path to the socket to listen on
+		:type socketPath: str
+
+		:param argv: Command line arguments builds are run with
+		:type argv: list[str]
+
+		:param scripts: Makefile scripts that have been run, in addition to any modules that have been loaded
+		:type scripts: collections.Iterable[str]
+
+		:param restartArgv: Command line to restart the daemon with
+		:type restartArgv: list[str]
+
+		:param color: Whether or not the daemon's own messages to clients are colored, or None to follow each client's
+			terminal
+		:type color: bool
+		"""
+		self.socketPath = socketPath
+		self.argv = argv
+		self._restartArgv = restartArgv
+		self._color = color
+		self._scripts = _GetScriptStats( scripts )
+		self._snapshot = None
+		self._listener = None
+		self._buildFunc = None
+		self._stateFunc = None
+		self._warmFunc = None
+
+
+	def Serve( self, buildFunc, stateFunc, warmFunc ):
+		"""
+		Handle requests until a client asks the daemon to stop.
+
+		:param buildFunc: Function run in the child to build, taking the client's request and returning an exit code
+		:type buildFunc: function
+
+		:param stateFunc: Function run in the child after building, taking the exit code and returning
+			( snapshot, state ). The snapshot is { path : stat key } of every file the build depends on, or None if
+			the build can't be skipped that way; the state is passed to warmFunc.
+		:type stateFunc: function
+
+		:param warmFunc: Function run in the daemon after each build, taking the state returned by stateFunc, or None if
+			the build didn't get that far
+		:type warmFunc: function
+
+		:return: False if there was already a daemon listening on the socket
+		:rtype: bool
+		"""
+		self._buildFunc = buildFunc
+		self._stateFunc = stateFunc
+		self._warmFunc = warmFunc
+
+		self._listener = self._Listen( )
+		if self._listener is None:
+			return False
+
+		log.LOG_BUILD( "Build daemon listening on {}".format( self.socketPath ) )
+
+		action = None
+		try:
+			while action is None:
+				conn = self._listener.accept( )[0]
+				try:
+					action = self._Handle( conn )
+				except socket.error as e:
+					log.LOG_INFO( "Lost connection to client: {}".format( e ) )
+				finally:
+					conn.close( )
+		finally:
+			self._listener.close( )
+			try:
+				os.remove( self.socketPath )
+			except OSError:
+				pass
+
+		if action == _RESTART:
+			_FlushAll( )
+			os.execv( self._restartArgv[0], self._restartArgv )
+
+		log.LOG_BUILD( "Build daemon stopped." )
+		return True
+
+
+	def _Listen( self ):
+		if os.path.exists( self.socketPath ):
+			probe = _Connect( self.socketPath )
+			if probe is not None:
+				probe.close( )
+				return None
+			#Left behind by a daemon that was killed.
+			os.remove( self.socketPath )
+
+		listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+		#Anyone who can connect can run builds, so only let this user's processes in.
+		oldMask = os.umask( 0o177 )
+		try:
+			listener.bind( self.socketPath )
+		finally:
+			os.umask( oldMask )
+		listener.listen( 8 )
+		return listener
+
+
+	def _Handle( self, conn ):
+		conn.settimeout( 10 )
+		kind, data = _RecvFrame( conn )
+		conn.settimeout( None )
+
+		if kind == _STOP:
+			_SendFrame( conn, _EXIT, b"0" )
+			return _STOP
+		if kind != _BUILD:
+			return None
+
+		request = json.loads( data.decode( "utf-8" ) )
+
+		changed = self._GetChangedScript( )
+		if changed is not None:
+			log.LOG_BUILD( "{} has changed, restarting the build daemon.".format( changed ) )
+			_SendFrame( conn, _RESTART, str( os.getpid( ) ).encode( "ascii" ) )
+			return _RESTART
+
+		if request.get( "argv" ) != self.argv:
+			message = "The build daemon runs builds with the arguments [{}], building locally.".format(
+				" ".join( self.argv ) )
+			_SendFrame( conn, _REJECT, message.encode( "utf-8" ) )
+			return None
+
+		if self._snapshot is not None and self._IsUnchanged( ):
+			message = "Nothing to build. Nothing has changed since the last build."
+			color = self._color
+			if color is None:
+				color = request.get( "color" )
+			if color:
+				message = "\033[{}mBUILD: \033[0m{}\n".format( terminfo.TermColor.MAGENTA, message )
+			else:
+				message = "BUILD: {}\n".format( message )
+			_SendFrame( conn, _STDOUT, message.encode( "utf-8" ) )
+			_SendFrame( conn, _EXIT, b"0" )
+			return None
+
+		self._snapshot = None
+		code, state = self._RunBuild( conn, request )
+		log.LOG_INFO( "Build finished with exit code {}".format( code ) )
+
+		warmState = None
+		if state is not None:
+			snapshot, warmState = state
+			if code == 0:
+				self._snapshot = snapshot
+		try:
+			self._warmFunc( warmState )
+		except Exception:
+			traceback.print_exc( )
+		return None
+
+
+	def _RunBuild( self, conn, request ):
+		stdoutRead, stdoutWrite = os.pipe( )
+		stderrRead, stderrWrite = os.pipe( )
+		stateRead, stateWrite = os.pipe( )
+
+		_FlushAll( )
+		pid = os.fork( )
+		if pid == 0:
+			self._listener.close( )
+			conn.close( )
+			os.close( stdoutRead )
+			os.close( stderrRead )
+			os.close( stateRead )
+			self._RunChild( request, stdoutWrite, stderrWrite, stateWrite )
+
+		os.close( stdoutWrite )
+		os.close( stderrWrite )
+		os.close( stateWrite )
+		try:
+			#Also done by the child; whichever gets there first wins the race with any attempt to cancel the build.
+			os.setpgid( pid, pid )
+		except OSError:
+			pass
+
+		streams = { stdoutRead : _STDOUT, stderrRead : _STDERR, stateRead : None }
+		stateData = []
+		connected = True
+		while streams:
+			waitOn = list( streams )
+			if connected:
+				waitOn.append( conn )
+			for fd in select.select( waitOn, [], [] )[0]:
+				if fd is conn:
+					#The client doesn't send anything after its request, so this means it's gone away.
+					connected = False
+					_Cancel( pid )
+					continue
+
+				data = os.read( fd, 65536 )
+				if not data:
+					os.close( fd )
+					del streams[fd]
+				elif streams[fd] is None:
+					stateData.append( data )
+				elif connected:
+					try:
+						_SendFrame( conn, streams[fd], data )
+					except socket.error:
+						connected = False
+						_Cancel( pid )
+
+		status = os.waitpid( pid, 0 )[1]
+		if os.WIFSIGNALED( status ):
+			code = 128 + os.WTERMSIG( status )
+		else:
+			code = os.WEXITSTATUS( status )
+
+		if connected:
+			_SendFrame( conn, _EXIT, str( code ).encode( "ascii" ) )
+
+		state = None
+		if stateData:
+			try:
+				state = pickle.loads( b"".join( stateData ) )
+			except Exception:
+				pass
+		return code, state
+
+
+	def _RunChild( self, request, stdoutWrite, stderrWrite, stateWrite ):
+		code = 1
+		try:
+			os.setpgid( 0, 0 )
+			devnull = os.open( os.devnull, os.O_RDONLY )
+			os.dup2( devnull, 0 )
+			os.close( devnull )
+			os.dup2( stdoutWrite, 1 )
+			os.dup2( stderrWrite, 2 )
+			os.close( stdoutWrite )
+			os.close( stderrWrite )
+
+			try:
+				code = self._buildFunc( request )
+			except SystemExit as e:
+				code = e.code
+			except Exception:
+				traceback.print_exc( )
+			if code is None:
+				code = 0
+			elif not isinstance( code, int ):
+				code = 1
+
+			state = None
+			try:
+				state = self._stateFunc( code )
+			except Exception:
+				traceback.print_exc( )
+
+			_FlushAll( )
+			with os.fdopen( stateWrite, "wb" ) as f:
+				pickle.dump( state, f, 2 )
+		finally:
+			os._exit( code )
+
+
+	def _IsUnchanged( self ):
+		for path, stat in self._snapshot.items( ):
+			if _utils.GetFileStat( path ) != stat:
+				return False
+		return True
+
+
+	def _GetChangedScript( self ):
+		for path, stat in self._scripts.items( ):
+			if _utils.GetFileStat( path ) != stat:
+				return path
+		return None
+
+
+def _GetScriptStats( scripts ):
+	paths = set( os.path.abspath( script ) for script in scripts )
+	for module in list( sys.modules.values( ) ):
+		path = getattr( module, "__file__", None )
+		if not path:
+			continue
+		if path.endswith( ( ".pyc", ".pyo" ) ) and os.access( path[:-1], os.F_OK ):
+			path = path[:-1]
+		paths.add( os.path.abspath( path ) )
+	return dict( ( path, _utils.GetFileStat( path ) ) for path in paths )
+
+
+def _Connect( socketPath ):
+	sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+	try:
+		sock.connect( socketPath )
+	except socket.error:
+		sock.close( )
+		return None
+	return sock
+
+
+def _IsRunning( pid ):
+	try:
+		os.kill( pid, 0 )
+	except OSError as e:
+		return e.errno == errno.EPERM
+	return True
+
+
+def _Cancel( pid ):
+	#Stops the build along with any compilers it's started.
+	try:
+		os.killpg( pid, signal.SIGTERM )
+	except OSError:
+		try:
+			os.kill( pid, signal.SIGTERM )
+		except OSError:
+			pass
+
+
+def _FlushAll( ):
+	#Anything still buffered when a child is forked would be written twice.
+	sys.stdout.flush( )
+	sys.stderr.flush( )
+	if _shared_globals.logFile is not None:
+		_shared_globals.logFile.flush( )
+
+
+def _SendFrame( sock, kind, data ):
+	sock.sendall( _HEADER.pack( kind, len( data ) ) + data )
+
+
+def _RecvFrame( sock ):
+	header = _RecvExactly( sock, _HEADER.size )
+	if header is None:
+		return None, None
+	kind, size = _HEADER.unpack( header )
+	data = _RecvExactly( sock, size )
+	if data is None:
+		return None, None
+	return kind, data
+
+
+def _RecvExactly( sock, size ):
+	chunks = []
+	while size:
+		data = sock.recv( min( size, 65536 ) )
+		if not data:
+			return None
+		chunks.append( data )
+		size -= len( data )
+	return b"".join( chunks )
@@ -0,0 +1,149 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Directory manifest module**
+
+Defines the on-disk record of directory contents used when searching for source files.
+"""
+
+import os
+import sys
+import time
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import _utils
+
+#Coarsest modification time resolution of the file systems we're likely to see (FAT's is two seconds).
+_RACY_WINDOW = 2000000000
+
+
+def IsSettled( stat ):
+	"""
+	Check whether a directory last changed long enough ago that anything else changing in it would change its stat key.
+	A directory changing twice within the same tick of the file system's clock keeps the same modification time, so
+	what's in a directory that changed more recently than that can't be trusted to stay the same while the key does.
+
+	:param stat: The directory's stat key (see :func:`_utils.GetFileStat`), or None if it doesn't exist
+	:type stat: tuple
+
+	:return: True if a listing of the directory can be reused for as long as the stat key matches
+	:rtype: bool
+	"""
+	return stat is not None and time.time( ) * 1000000000 - stat[1] > _RACY_WINDOW
+
+
+class DirectoryManifest( object ):
+	"""
+	Persistent record of the contents of every directory that's been searched for source files, shared by every
+	project searching the same tree.
+
+	Each entry is keyed by the directory's absolute path and holds the directory's stat key (see
+	:func:`_utils.GetFileStat`) along with the names of the files and subdirectories in it, split as
+	:func:`_utils.ListDirectory` splits them. Creating, deleting, or renaming anything in a directory updates its
+	modification time, so as long as the stat key still matches, the directory is never listed again, even across runs.
+
+	A directory that changes again within the same tick of the file system's clock keeps the same modification time.
+	To keep that from hiding a change, a listing taken within a tick or so of the directory's last change isn't kept,
+	and the directory is listed again the next time it's needed.
+
+	:ivar entries: Cached data, { path : ( statKey, filenames, dirnames ) }
+	:type entries: dict[str, tuple]
+
+	:ivar dirty: Whether or not anything has changed since the manifest was loaded
+	:type dirty: bool
+	"""
+	VERSION = 1
+
+	def __init__( self ):
+		self.entries = {}
+		self.dirty = False
+
+
+	def Load( self, filename ):
+		"""
+		Load the manifest from disk. A missing, outdated, or unreadable manifest is simply discarded.
+
+		:param filename: Manifest file to read from
+		:type filename: str
+		"""
+		if not os.access( filename, os.F_OK ):
+			return
+
+		try:
+			with open( filename, "rb" ) as f:
+				version, entries = pickle.load( f )
+		except Exception as e:
+			log.LOG_WARN( "Discarding unreadable directory manifest {}: {}".format( filename, e ) )
+			return
+
+		if version != DirectoryManifest.VERSION:
+			return
+
+		self.entries = entries
+		self.dirty = False
+
+
+	def Save( self, filename ):
+		"""
+		Write the manifest to disk, if anything has changed since it was loaded.
+
+		:param filename: Manifest file to write to
+		:type filename: str
+		"""
+		if not self.dirty:
+			return
+
+		_utils.WritePickle( filename, ( DirectoryManifest.VERSION, self.entries ) )
+		self.dirty = False
+
+
+	def List( self, directory, stat = None ):
+		"""
+		Get the contents of a directory, listing it only if it has changed.
+
+		:param directory: Absolute path to the directory
+		:type directory: str
+
+		:param stat: The directory's stat key, if the caller already has it
+		:type stat: tuple
+
+		:return: ( names of the files, names of the subdirectories )
+		:rtype: tuple[list[str], list[str]]
+		"""
+		if stat is None:
+			stat = _utils.GetFileStat( directory )
+		entry = self.entries.get( directory )
+		if entry is not None and stat is not None and entry[0] == stat:
+			return entry[1], entry[2]
+
+		filenames, dirnames = _utils.ListDirectory( directory )
+		if IsSettled( stat ):
+			self.entries[directory] = ( stat, filenames, dirnames )
+			self.dirty = True
+		elif entry is not None:
+			del self.entries[directory]
+			self.dirty = True
+		return filenames, dirnames
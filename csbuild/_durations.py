@@ -0,0 +1,217 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Durations module**
+
+Defines the record of how long each compile and link took in previous builds, used to decide what to start first.
+"""
+
+import os
+import sys
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import _utils
+
+#How much of each new measurement goes into the recorded duration, to keep one slow run from skewing it.
+_WEIGHT = 0.5
+
+
+class DurationHistory( object ):
+	"""
+	Persistent record of compile and link durations, smoothed over the builds they were measured in.
+
+	A compile is identified by the object file it produces, which is distinct for every unit of every target,
+	architecture, and toolchain. A link is identified by its project's key.
+
+	:ivar compiles: Seconds each compile has taken, { object path : seconds }
+	:type compiles: dict[str, float]
+
+	:ivar links: Seconds each project's link has taken, { project key : seconds }
+	:type links: dict[str, float]
+
+	:ivar dirty: Whether or not anything has changed since the history was loaded
+	:type dirty: bool
+	"""
+	VERSION = 1
+
+	def __init__( self ):
+		self.compiles = {}
+		self.links = {}
+		self.dirty = False
+
+
+	def Load( self, filename ):
+		"""
+		Load the history from disk. A missing, outdated, or unreadable file is simply discarded.
+
+		:param filename: File to read from
+		:type filename: str
+		"""
+		if not os.access( filename, os.F_OK ):
+			return
+
+		try:
+			with open( filename, "rb" ) as f:
+				version, compiles, links = pickle.load( f )
+		except Exception as e:
+			log.LOG_WARN( "Discarding unreadable build durations {}: {}".format( filename, e ) )
+			return
+
+		if version != DurationHistory.VERSION:
+			return
+
+		self.compiles = compiles
+		self.links = links
+		self.dirty = False
+
+
+	def Save( self, filename ):
+		"""
+		Write the history to disk, if anything has changed since it was loaded.
+
+		:param filename: File to write to
+		:type filename: str
+		"""
+		if not self.dirty:
+			return
+
+		_utils.WritePickle( filename, ( DurationHistory.VERSION, self.compiles, self.links ) )
+		self.dirty = False
+
+
+	def RecordCompile( self, obj, seconds ):
+		"""
+		Record how long a compile took.
+
+		:param obj: Object file the compile produced
+		:type obj: str
+
+		:param seconds: How long it took
+		:type seconds: float
+		"""
+		DurationHistory._Record( self.compiles, obj, seconds )
+		self.dirty = True
+
+
+	def RecordLink( self, key, seconds ):
+		"""
+		Record how long a project's link took.
+
+		:param key: The project's key
+		:type key: str
+
+		:param seconds: How long it took
+		:type seconds: float
+		"""
+		DurationHistory._Record( self.links, key, seconds )
+		self.dirty = True
+
+
+	def EstimateCompiles( self, objs ):
+		"""
+		Estimate how long each of a set of compiles will take. Compiles that haven't been timed before are assumed to
+		take as long as the others in the set do on average, or as long as any compile does if none of them have been.
+
+		:param objs: Object files the compiles produce
+		:type objs: list[str]
+
+		:return: { object path : seconds }
+		:rtype: dict[str, float]
+		"""
+		compiles = self.compiles
+		known = [compiles[obj] for obj in objs if obj in compiles]
+		if known:
+			default = sum( known ) / len( known )
+		elif compiles:
+			default = sum( compiles.values( ) ) / len( compiles )
+		else:
+			default = 1.0
+		return dict( ( obj, compiles.get( obj, default ) ) for obj in objs )
+
+
+	def GetLinkPaths( self, projects, compileTimes = None ):
+		"""
+		Find how long the build will take from the moment each project starts linking, if nothing else holds it up:
+		its own link, followed by the longest chain of what has to wait for it. Projects that link against it wait for
+		its link; projects with a source dependency on it can't start compiling until then either, so their compiles
+		are part of the chain as well.
+
+		:param projects: Projects being built
+		:type projects: list[csbuild.projectSettings.projectSettings]
+
+		:param compileTimes: { project key : seconds its compiles take }, counted for projects with source dependencies
+		:type compileTimes: dict[str, float]
+
+		:return: { project key : seconds }
+		:rtype: dict[str, float]
+		"""
+		links = self.links
+		if links:
+			default = sum( links.values( ) ) / len( links )
+		else:
+			default = 0.0
+
+		compileTimes = compileTimes or {}
+
+		#Each dependent along with how long it takes to get from the end of this link to the start of its own.
+		dependents = dict( ( project.key, [] ) for project in projects )
+		for project in projects:
+			for depend in project.reconciledLinkDepends:
+				if depend in dependents:
+					dependents[depend].append( ( project.key, 0.0 ) )
+			for depend in project.srcDepends:
+				if depend in dependents:
+					dependents[depend].append( ( project.key, compileTimes.get( project.key, 0.0 ) ) )
+
+		#Visited depth first, so each project's dependents have their paths by the time it's finished. Anything still
+		#being visited when it's reached again is part of a cycle, which can't be built anyway; it's just not followed.
+		paths = {}
+		visiting = set( )
+		for project in projects:
+			stack = [( project.key, False )]
+			while stack:
+				key, expanded = stack.pop( )
+				if key in paths:
+					continue
+				if not expanded:
+					if key in visiting:
+						continue
+					visiting.add( key )
+					stack.append( ( key, True ) )
+					stack.extend( ( dependent, False ) for dependent, _ in dependents[key] if dependent not in paths )
+					continue
+				longest = max( [before + paths.get( dependent, 0.0 ) for dependent, before in dependents[key]] or [0.0] )
+				paths[key] = links.get( key, default ) + longest
+		return paths
+
+
+	@staticmethod
+	def _Record( durations, key, seconds ):
+		previous = durations.get( key )
+		if previous is None:
+			durations[key] = seconds
+		else:
+			durations[key] = previous + ( seconds - previous ) * _WEIGHT
@@ -0,0 +1,262 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**File watcher module**
+
+Defines the watcher --watch uses to find out which files have changed between builds.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import platform
+import select
+import struct
+import sys
+import time
+
+from . import log
+from . import _utils
+
+#From <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE \
+	| _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+
+_EVENT = struct.Struct( "iIII" )
+
+
+class FileWatcher( object ):
+	"""
+	Watches directory trees and reports the files in them that change.
+
+	Uses inotify where it's available, and otherwise falls back on comparing the stat of every file in the trees at a
+	regular interval. Editors tend to write a file in several steps, so once something changes, the watcher waits for
+	things to settle before reporting it.
+
+	:ivar method: Name of the mechanism being used to watch for changes, for display
+	:type method: str
+	"""
+
+	def __init__( self, directories, ignoreDirs, pollInterval = 0.5, settleTime = 0.1 ):
+		"""
+		:param directories: Directories to watch, along with everything under them
+		:type directories: collections.Iterable[str]
+
+		:param ignoreDirs: Directories whose contents are never reported, such as the ones the build writes to.
+			Directories named .csbuild are always ignored.
+		:type ignoreDirs: collections.Iterable[str]
+
+		:param pollInterval: Seconds between checks when polling
+		:type pollInterval: float
+
+		:param settleTime: Seconds without any further changes before the changes seen so far are reported
+		:type settleTime: float
+		"""
+		roots = sorted( set( os.path.abspath( directory ) for directory in directories if os.path.isdir( directory ) ) )
+		#Nested directories are already covered by the ones they're in.
+		self._roots = []
+		for root in roots:
+			if not any( root.startswith( other + os.sep ) for other in self._roots ):
+				self._roots.append( root )
+		self._ignoreDirs = set( os.path.abspath( directory ) for directory in ignoreDirs )
+		self._pollInterval = pollInterval
+		self._settleTime = settleTime
+
+		self._fd = -1
+		self._libc = None
+		self._watches = {}
+		self._snapshot = None
+
+		if platform.system( ) == "Linux":
+			try:
+				self._StartInotify( )
+			except (OSError, AttributeError) as e:
+				log.LOG_WARN_NOPUSH( "Could not watch for changes with inotify ({}), polling instead.".format( e ) )
+				self.Close( )
+
+		if self._fd >= 0:
+			self.method = "inotify"
+		else:
+			self.method = "polling"
+			self._snapshot = self._Scan( )
+
+
+	def Wait( self ):
+		"""
+		Block until files in the watched directories change.
+
+		:return: Absolute paths of every file that was modified, created, or deleted, or None if the watcher lost
+			track of what changed and everything has to be checked
+		:rtype: set[str] or None
+		"""
+		if self._fd >= 0:
+			return self._WaitInotify( )
+		return self._WaitPoll( )
+
+
+	def Close( self ):
+		"""
+		Stop watching.
+		"""
+		if self._fd >= 0:
+			os.close( self._fd )
+			self._fd = -1
+		self._watches = {}
+
+
+	def _IsIgnored( self, directory ):
+		if os.path.basename( directory ) == ".csbuild":
+			return True
+		for ignoreDir in self._ignoreDirs:
+			if directory == ignoreDir or directory.startswith( ignoreDir + os.sep ):
+				return True
+		return False
+
+
+	def _Walk( self, root ):
+		for dirpath, dirnames, filenames in os.walk( root ):
+			dirnames[:] = [dirname for dirname in dirnames if not self._IsIgnored( os.path.join( dirpath, dirname ) )]
+			yield dirpath, filenames
+
+
+	def _Scan( self ):
+		snapshot = {}
+		for root in self._roots:
+			for dirpath, filenames in self._Walk( root ):
+				for filename in filenames:
+					path = os.path.join( dirpath, filename )
+					snapshot[path] = _utils.GetFileStat( path )
+		return snapshot
+
+
+	def _WaitPoll( self ):
+		changed = set( )
+		while True:
+			time.sleep( self._settleTime if changed else self._pollInterval )
+			snapshot = self._Scan( )
+			oldSnapshot = self._snapshot
+			self._snapshot = snapshot
+			found = False
+			for path, stat in snapshot.items( ):
+				if oldSnapshot.get( path ) != stat:
+					changed.add( path )
+					found = True
+			for path in oldSnapshot:
+				if path not in snapshot:
+					changed.add( path )
+					found = True
+			if changed and not found:
+				return changed
+
+
+	def _StartInotify( self ):
+		libc = ctypes.CDLL( ctypes.util.find_library( "c" ) or "libc.so.6", use_errno = True )
+		fd = libc.inotify_init1( _IN_CLOEXEC )
+		if fd < 0:
+			error = ctypes.get_errno( )
+			raise OSError( error, os.strerror( error ) )
+		self._libc = libc
+		self._fd = fd
+		for root in self._roots:
+			self._AddTree( root, None )
+
+
+	def _AddTree( self, root, changed ):
+		#Files created in a new directory before it was being watched never produce events of their own, so every file
+		#found while adding it counts as changed.
+		for dirpath, filenames in self._Walk( root ):
+			path = dirpath
+			if not isinstance( path, bytes ):
+				path = path.encode( sys.getfilesystemencoding( ) )
+			wd = self._libc.inotify_add_watch( self._fd, path, _WATCH_MASK )
+			if wd < 0:
+				error = ctypes.get_errno( )
+				if error in ( errno.ENOENT, errno.ENOTDIR ):
+					continue
+				raise OSError( error, os.strerror( error ), dirpath )
+			self._watches[wd] = dirpath
+			if changed is not None:
+				changed.update( os.path.join( dirpath, filename ) for filename in filenames )
+
+
+	def _WaitInotify( self ):
+		changed = set( )
+		lost = False
+		while True:
+			readable = select.select( [self._fd], [], [], self._settleTime if changed or lost else None )[0]
+			if not readable:
+				return None if lost else changed
+
+			data = os.read( self._fd, 65536 )
+			offset = 0
+			while offset < len( data ):
+				wd, mask, _, length = _EVENT.unpack_from( data, offset )
+				offset += _EVENT.size
+				name = data[offset:offset + length].rstrip( b"\0" )
+				offset += length
+
+				if mask & _IN_Q_OVERFLOW:
+					lost = True
+					continue
+
+				directory = self._watches.get( wd )
+				if mask & _IN_IGNORED:
+					self._watches.pop( wd, None )
+					continue
+				if directory is None:
+					continue
+
+				if not isinstance( name, str ):
+					name = name.decode( sys.getfilesystemencoding( ) )
+				path = os.path.join( directory, name ) if name else directory
+
+				if mask & ( _IN_DELETE_SELF | _IN_MOVE_SELF ):
+					#Subdirectories going away are reported by the directory they were in.
+					if directory in self._roots:
+						lost = True
+				elif mask & _IN_ISDIR:
+					if mask & ( _IN_CREATE | _IN_MOVED_TO ):
+						if not self._IsIgnored( path ):
+							try:
+								self._AddTree( path, changed )
+							except OSError as e:
+								log.LOG_WARN_NOPUSH( "Could not watch {}: {}".format( path, e ) )
+					elif mask & _IN_MOVED_FROM:
+						#Nothing says which files went with it.
+						lost = True
+				elif name:
+					changed.add( path )
@@ -0,0 +1,378 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+**Hash database module**
+
+Defines the per-project store of file stats, content digests, and header dependencies recorded at the end of a build.
+"""
+
+import os
+import sys
+import threading
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import _utils
+
+
+class HashDatabase( object ):
+	"""
+	Record of every input file's stat and digest, and every source's header dependencies, as of the end of the last
+	build.
+
+	The file on disk is an append-only log: a snapshot of the whole database followed by individual record updates.
+	It's loaded once, and only the records that changed are appended, both as each source finishes compiling and at
+	the end of the build. Every write is synced to the disk, so the log doubles as a journal of the build that survives
+	it being interrupted. Once superseded records outnumber the live ones, the log is compacted back down to a single
+	snapshot.
+
+	On load, every recorded file is stat'ed once. Any source that has changed, or that includes a header that has,
+	is marked dirty; every other recorded source is known to be up to date without being read or having its includes
+	followed.
+
+	:ivar filename: Path to the database file
+	:type filename: str
+
+	:ivar hasherName: Name of the hash function and normalization the recorded digests were made with, as returned by
+		:func:`csbuild._utils.GetDigestName`; if it changes, the digests are dropped
+	:type hasherName: str
+
+	:ivar settingsKey: Settings the recorded dependencies were computed under; if they change, the dependencies are
+		dropped, but the file digests are kept
+	:type settingsKey: tuple
+
+	:ivar files: Recorded files, { path : ( statKey, digest ) }
+	:type files: dict[str, tuple]
+
+	:ivar units: Header dependencies of each recorded source, { path : headerPaths }
+	:type units: dict[str, tuple[str]]
+
+	:ivar commands: How each recorded file was last successfully compiled,
+		{ path : ( command fingerprint, macros, include directories ) }, where macros are the defines and undefines on
+		the command line as returned by :func:`csbuild.projectSettings.projectSettings.get_macros`, and the include
+		directories are absolute. Both are None if they're part of the fingerprint.
+	:type commands: dict[str, tuple[bytes, dict[str, str], tuple[str]]]
+
+	:ivar changedFiles: Recorded files whose stat no longer matches the record
+	:type changedFiles: set[str]
+
+	:ivar dirtyUnits: Recorded sources that have changed or include a header that has
+	:type dirtyUnits: set[str]
+	"""
+	VERSION = 5
+
+	_FILE = 0
+	_UNIT = 1
+	_SETTINGS = 2
+	_COMMAND = 3
+
+	def __init__( self, filename ):
+		self.filename = filename
+		self.hasherName = None
+		self.settingsKey = None
+		self.files = {}
+		self.units = {}
+		self.commands = {}
+		self.changedFiles = set()
+		self.dirtyUnits = set()
+		self._pending = []
+		self._recordCount = 0
+		self._rewrite = True
+		#Guards the tables and the pending records, which can be changed by any compile thread.
+		self._lock = threading.Lock( )
+		#Held while writing to the file. Changes made in the meantime pile up to be written together by the next writer.
+		self._writeLock = threading.Lock( )
+		self._appendCount = 0
+		self._writtenCount = 0
+
+
+	def Load( self, settingsKey, hasherName ):
+		"""
+		Load the database from disk and find what's changed since it was saved. A missing, outdated, or unreadable
+		database is simply discarded; a log with a damaged tail keeps every record before the damage.
+
+		:param settingsKey: Settings the project's dependencies are computed under now
+		:type settingsKey: tuple
+
+		:param hasherName: Name of the hash function and normalization digests are made with now
+		:type hasherName: str
+		"""
+		if os.access( self.filename, os.F_OK ):
+			try:
+				self._Read( )
+			except Exception as e:
+				log.LOG_WARN( "Discarding unreadable hash database {}: {}".format( self.filename, e ) )
+				self.hasherName = None
+				self.settingsKey = None
+				self.files = {}
+				self.units = {}
+				self.commands = {}
+				self._rewrite = True
+
+		if self.hasherName != hasherName:
+			#Nothing can be compared against digests made by a different hash function. The dependencies would still
+			#be accurate, but without the file records they can't be trusted to be up to date, so start over.
+			self.hasherName = hasherName
+			self.files = {}
+			self.units = {}
+			self.commands = {}
+			self._rewrite = True
+
+		if self.settingsKey != settingsKey:
+			self.settingsKey = settingsKey
+			self.units = {}
+			with self._lock:
+				self._Append( ( HashDatabase._SETTINGS, None, settingsKey ) )
+
+		self.Refresh( )
+
+
+	def Refresh( self ):
+		"""
+		Find the recorded files that have changed on disk, and the sources that depend on them. This is done by
+		:func:`Load`; it only needs to be called again if the database is kept in memory across builds.
+		"""
+		changedFiles = set()
+		for path, record in self.files.items( ):
+			if _utils.GetFileStat( path ) != record[0]:
+				changedFiles.add( path )
+		self.MarkChanged( changedFiles )
+
+
+	def MarkChanged( self, changedFiles ):
+		"""
+		Set which of the recorded files have changed, without checking them on disk the way :func:`Refresh` does.
+		Used when something else is already keeping track of what changes, such as --watch.
+
+		:param changedFiles: The files that have changed; any that aren't recorded are ignored
+		:type changedFiles: collections.Iterable[str]
+		"""
+		files = self.files
+		changedFiles = set( path for path in changedFiles if path in files )
+		self.changedFiles = changedFiles
+
+		dirtyUnits = set()
+		if changedFiles:
+			for source, headers in self.units.items( ):
+				if source in changedFiles or not changedFiles.isdisjoint( headers ):
+					dirtyUnits.add( source )
+		self.dirtyUnits = dirtyUnits
+
+
+	def _Read( self ):
+		with open( self.filename, "rb" ) as f:
+			snapshot = pickle.load( f )
+			if snapshot[0] != HashDatabase.VERSION:
+				return
+			_, hasherName, settingsKey, files, units, commands = snapshot
+
+			recordCount = 0
+			rewrite = False
+			end = os.fstat( f.fileno( ) ).st_size
+			while f.tell( ) < end:
+				try:
+					kind, key, value = pickle.load( f )
+				except Exception:
+					#A build that was killed partway through an append leaves a partial record at the end, which can fail
+					#to load with any error, EOFError included. Everything before it is still good, but the file has to
+					#be rewritten before anything else can be appended.
+					rewrite = True
+					break
+
+				recordCount += 1
+				if kind == HashDatabase._FILE:
+					table = files
+				elif kind == HashDatabase._UNIT:
+					table = units
+				elif kind == HashDatabase._COMMAND:
+					table = commands
+				else:
+					settingsKey = value
+					units = {}
+					continue
+
+				if value is None:
+					table.pop( key, None )
+				else:
+					table[key] = value
+
+		self.hasherName = hasherName
+		self.settingsKey = settingsKey
+		self.files = files
+		self.units = units
+		self.commands = commands
+		self._recordCount = recordCount
+		self._rewrite = rewrite
+
+
+	def IsUpToDate( self, source ):
+		"""
+		Check whether a source and every header it depended on are unchanged since the database was saved.
+
+		:param source: Path to the source
+		:type source: str
+
+		:return: True if the source was recorded and nothing it depends on has changed
+		:rtype: bool
+		"""
+		return source in self.units and source in self.files and source not in self.dirtyUnits
+
+
+	def SetFile( self, path, stat, digest ):
+		"""
+		Record the current state of a file.
+
+		:param path: Path to the file
+		:type path: str
+
+		:param stat: The file's stat key, from :func:`_utils.GetFileStat`
+		:type stat: tuple
+
+		:param digest: Digest of the file's contents
+		:type digest: bytes
+		"""
+		record = ( stat, digest )
+		with self._lock:
+			if self.files.get( path ) != record:
+				self.files[path] = record
+				self._Append( ( HashDatabase._FILE, path, record ) )
+
+
+	def RemoveFile( self, path ):
+		"""
+		Forget a file.
+
+		:param path: Path to the file
+		:type path: str
+		"""
+		with self._lock:
+			if self.files.pop( path, None ) is not None:
+				self._Append( ( HashDatabase._FILE, path, None ) )
+
+
+	def SetUnit( self, source, headers ):
+		"""
+		Record the headers a source depends on.
+
+		:param source: Path to the source
+		:type source: str
+
+		:param headers: Paths to every header the source depends on
+		:type headers: tuple[str]
+		"""
+		with self._lock:
+			if self.units.get( source ) != headers:
+				self.units[source] = headers
+				self._Append( ( HashDatabase._UNIT, source, headers ) )
+
+
+	def RemoveUnit( self, source ):
+		"""
+		Forget a source's header dependencies, so it will be checked in full next time.
+
+		:param source: Path to the source
+		:type source: str
+		"""
+		with self._lock:
+			if self.units.pop( source, None ) is not None:
+				self._Append( ( HashDatabase._UNIT, source, None ) )
+
+
+	def SetCommand( self, path, fingerprint, macros = None, includeDirs = None ):
+		"""
+		Record the command a file was compiled with.
+
+		:param path: Path to the file
+		:type path: str
+
+		:param fingerprint: Fingerprint of the command
+		:type fingerprint: bytes
+
+		:param macros: The macros defined on the command line, if they aren't part of the fingerprint
+		:type macros: dict[str, str]
+
+		:param includeDirs: The absolute include directories, if they aren't part of the fingerprint
+		:type includeDirs: tuple[str]
+		"""
+		record = ( fingerprint, macros, includeDirs )
+		with self._lock:
+			if self.commands.get( path ) != record:
+				self.commands[path] = record
+				self._Append( ( HashDatabase._COMMAND, path, record ) )
+
+
+	def RemoveCommand( self, path ):
+		"""
+		Forget the command a file was compiled with, so it will be compiled again next time.
+
+		:param path: Path to the file
+		:type path: str
+		"""
+		with self._lock:
+			if self.commands.pop( path, None ) is not None:
+				self._Append( ( HashDatabase._COMMAND, path, None ) )
+
+
+	def Flush( self ):
+		"""
+		Write every change made so far to disk, compacting the log if it has grown too large, and wait for it to reach
+		the disk itself. This is safe to call from any thread, as often as needed: while one flush is being written,
+		changes from other threads pile up and go out together with the next, so threads flushing at the same time
+		share a single sync.
+		"""
+		with self._lock:
+			target = self._appendCount
+
+		with self._writeLock:
+			with self._lock:
+				#Whoever had the lock before may have written these changes already.
+				if self._writtenCount >= target and not self._rewrite:
+					return
+				pending = self._pending
+				self._pending = []
+				self._writtenCount = self._appendCount
+
+				liveCount = len( self.files ) + len( self.units ) + len( self.commands )
+				if self._rewrite or self._recordCount + len( pending ) > liveCount:
+					#The snapshot has to be taken while nothing else can change the tables.
+					_utils.WritePickle( self.filename, ( HashDatabase.VERSION, self.hasherName, self.settingsKey,
+						self.files, self.units, self.commands ), True )
+					self._recordCount = 0
+					self._rewrite = False
+					return
+
+			with open( self.filename, "ab" ) as f:
+				for record in pending:
+					pickle.dump( record, f, 2 )
+				f.flush( )
+				os.fsync( f.fileno( ) )
+			self._recordCount += len( pending )
+
+
+	def _Append( self, record ):
+		#Called holding _lock.
+		self._pending.append( record )
+		self._appendCount += 1
@@ -0,0 +1,132 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Include cache module**
+
+Defines the on-disk cache of #include directives used when following headers.
+"""
+
+import os
+import sys
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import _utils
+
+
+class IncludeCache( object ):
+	"""
+	Persistent cache of the direct includes of every file that has been scanned for headers.
+
+	Each entry is keyed by the file's absolute path and holds the file's stat key (see :func:`_utils.GetFileStat`)
+	along with the include names found in it. As long as the stat key still matches, the file is never opened again,
+	even across runs.
+
+	:ivar entries: Cached data, { path : ( statKey, includes ) }
+	:type entries: dict[str, tuple]
+
+	:ivar dirty: Whether or not anything has changed since the cache was loaded
+	:type dirty: bool
+	"""
+	VERSION = 2
+
+	def __init__( self ):
+		self.entries = {}
+		self.dirty = False
+
+
+	def Load( self, filename ):
+		"""
+		Load cache data from disk. A missing, outdated, or unreadable cache is simply discarded.
+
+		:param filename: Cache file to read from
+		:type filename: str
+		"""
+		if not os.access( filename, os.F_OK ):
+			return
+
+		try:
+			with open( filename, "rb" ) as f:
+				version, entries = pickle.load( f )
+		except Exception as e:
+			log.LOG_WARN( "Discarding unreadable include cache {}: {}".format( filename, e ) )
+			return
+
+		if version != IncludeCache.VERSION:
+			return
+
+		self.entries = entries
+		self.dirty = False
+
+
+	def Save( self, filename ):
+		"""
+		Write the cache data to disk, if anything has changed since it was loaded.
+
+		:param filename: Cache file to write to
+		:type filename: str
+		"""
+		if not self.dirty:
+			return
+
+		_utils.WritePickle( filename, ( IncludeCache.VERSION, self.entries ) )
+		self.dirty = False
+
+
+	def Forget( self, paths ):
+		"""
+		Drop the entries for some files, so they're scanned again the next time they're looked at.
+
+		:param paths: The files that have changed
+		:type paths: collections.Iterable[str]
+		"""
+		for path in paths:
+			if self.entries.pop( path, None ) is not None:
+				self.dirty = True
+
+
+	def GetIncludes( self, path, scanFunc ):
+		"""
+		Get the names of the files directly included by the given file, rescanning it only if it has changed.
+
+		:param path: Absolute path to the file
+		:type path: str
+
+		:param scanFunc: Function that reads a file and returns the list of names it includes
+		:type scanFunc: function
+
+		:return: List of included file names, exactly as they were written in the #include directives
+		:rtype: list[str]
+		"""
+		stat = _utils.GetFileStat( path )
+		entry = self.entries.get( path )
+		if entry is not None and stat is not None and entry[0] == stat:
+			return entry[1]
+
+		includes = scanFunc( path )
+		if stat is not None:
+			self.entries[path] = ( stat, includes )
+			self.dirty = True
+		return includes
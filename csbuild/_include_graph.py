@@ -0,0 +1,295 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+**Include graph module**
+
+Defines the in-memory graph of #include relationships used to find the headers each source depends on.
+"""
+
+import array
+import threading
+
+
+class IncludeGraph( object ):
+	"""
+	Graph of the files reached by following #include directives.
+
+	Every path is interned to an integer ID the first time it's seen, and each file's direct includes are stored as an
+	array of IDs. Sets of files are int bitmasks indexed by ID. The set of files reachable from each file is computed
+	once per strongly connected component of the graph and shared by every file in that component, so following the
+	headers of a source that's been seen before is a single list lookup.
+
+	The same #include can name different files under different include directories, so edges and closures are kept
+	separately for each way of resolving includes, identified by a key chosen by the caller. IDs are shared by all of
+	them, so masks from different keys can be mixed freely, and projects (or variants of the same project) that resolve
+	includes the same way share everything.
+
+	Whether each file has changed since the last build is tracked the same way, filled in lazily the first time the
+	file turns up as a dependency; once a source's dependencies have all been seen, checking them is a single AND.
+	"""
+
+	def __init__( self ):
+		self._ids = {}
+		self._paths = []
+		#{ key : ( { id : array of included ids }, { id : closure mask } ) }
+		self._layers = {}
+		self._checkedMask = 0
+		self._changedMask = 0
+		#Guards interning and the computed masks. Files are scanned outside of it so dependency checks can run in
+		#parallel; a file scanned twice by two threads at once just produces the same edges twice.
+		self._lock = threading.Lock( )
+
+
+	def GetId( self, path ):
+		"""
+		Get the ID for a path, assigning a new one if it hasn't been seen before.
+
+		:param path: Absolute path to the file
+		:type path: str
+
+		:return: The file's ID, which is also its bit in any mask
+		:rtype: int
+		"""
+		nodeId = self._ids.get( path )
+		if nodeId is not None:
+			return nodeId
+
+		with self._lock:
+			nodeId = self._ids.get( path )
+			if nodeId is None:
+				nodeId = len( self._paths )
+				self._paths.append( path )
+				#Published last so lock-free readers never see an ID without its entries.
+				self._ids[path] = nodeId
+			return nodeId
+
+
+	def GetMask( self, paths ):
+		"""
+		Convert a collection of paths into a mask.
+
+		:param paths: Absolute paths
+		:type paths: collections.Iterable[str]
+
+		:return: Mask with the bit for each path set
+		:rtype: int
+		"""
+		mask = 0
+		for path in paths:
+			mask |= 1 << self.GetId( path )
+		return mask
+
+
+	def GetPaths( self, mask ):
+		"""
+		Convert a mask back into the paths it contains.
+
+		:param mask: Mask of file IDs
+		:type mask: int
+
+		:return: Paths, in ID order
+		:rtype: list[str]
+		"""
+		return [self._paths[nodeId] for nodeId in IncludeGraph._IterIds( mask )]
+
+
+	def GetDependencies( self, path, resolveFunc, maxDepth = 0, filterFunc = None, key = None ):
+		"""
+		Get every file reached by following the includes of the given file, not counting the file itself.
+
+		:param path: Absolute path to the file
+		:type path: str
+
+		:param resolveFunc: Function taking the absolute path of a file and returning the absolute paths of the files
+			it directly includes. Each file is only resolved once.
+		:type resolveFunc: function
+
+		:param maxDepth: Number of levels of includes to follow, or 0 to follow them all
+		:type maxDepth: int
+
+		:param filterFunc: Optional function taking a path and returning False if that file should be neither included
+			in the result nor followed
+		:type filterFunc: function
+
+		:param key: Identifies how resolveFunc resolves includes. Every call made with the same key must resolve them the
+			same way.
+		:type key: hashable
+
+		:return: Mask of the dependencies
+		:rtype: int
+		"""
+		rootId = self.GetId( path )
+		rootBit = 1 << rootId
+		edges, reach = self._GetLayer( key )
+
+		if maxDepth or filterFunc is not None:
+			#Restricted searches aren't the closure of anything, so they can't share the cached masks.
+			mask = 0
+			frontier = [rootId]
+			depth = 0
+			while frontier and ( not maxDepth or depth < maxDepth ):
+				depth += 1
+				nextFrontier = []
+				for nodeId in frontier:
+					for child in self._GetEdges( nodeId, resolveFunc, edges ):
+						bit = 1 << child
+						if mask & bit:
+							continue
+						if filterFunc is not None and not filterFunc( self._paths[child] ):
+							continue
+						mask |= bit
+						nextFrontier.append( child )
+				frontier = nextFrontier
+			return mask & ~rootBit
+
+		mask = reach.get( rootId )
+		if mask is None:
+			self._LoadEdges( rootId, resolveFunc, edges, reach )
+			with self._lock:
+				IncludeGraph._ComputeReach( rootId, edges, reach )
+			mask = reach[rootId]
+		return mask & ~rootBit
+
+
+	def GetChangedMask( self, mask, checkFunc ):
+		"""
+		Get the files in a mask that have changed since the last build.
+
+		:param mask: Mask of the files to check
+		:type mask: int
+
+		:param checkFunc: Function taking a path and returning whether or not that file has changed. Only called for files
+			that haven't been checked yet; the result is remembered for the rest of the build.
+		:type checkFunc: function
+
+		:return: Mask of the changed files
+		:rtype: int
+		"""
+		unchecked = mask & ~self._checkedMask
+		if unchecked:
+			changed = 0
+			for nodeId in IncludeGraph._IterIds( unchecked ):
+				if checkFunc( self._paths[nodeId] ):
+					changed |= 1 << nodeId
+			with self._lock:
+				self._checkedMask |= unchecked
+				self._changedMask |= changed
+		return mask & self._changedMask
+
+
+	def _GetLayer( self, key ):
+		layer = self._layers.get( key )
+		if layer is None:
+			with self._lock:
+				layer = self._layers.setdefault( key, ( {}, {} ) )
+		return layer
+
+
+	def _GetEdges( self, nodeId, resolveFunc, edges ):
+		nodeEdges = edges.get( nodeId )
+		if nodeEdges is None:
+			nodeEdges = array.array( "i", [self.GetId( path ) for path in resolveFunc( self._paths[nodeId] )] )
+			edges[nodeId] = nodeEdges
+		return nodeEdges
+
+
+	def _LoadEdges( self, rootId, resolveFunc, edges, reach ):
+		#Make sure everything reachable from the root has been scanned, so the closure can be computed without
+		#touching the filesystem while holding the lock. Anything that already has a closure has been fully loaded.
+		visited = { rootId }
+		stack = [rootId]
+		while stack:
+			nodeId = stack.pop( )
+			for child in self._GetEdges( nodeId, resolveFunc, edges ):
+				if child not in visited and child not in reach:
+					visited.add( child )
+					stack.append( child )
+
+
+	@staticmethod
+	def _ComputeReach( rootId, edges, reach ):
+		#Iterative Tarjan's algorithm over the part of the graph that doesn't have a closure yet. Components are
+		#completed in reverse topological order, so every component a finished component includes already has its
+		#closure and can just be OR'd in.
+		if rootId in reach:
+			return
+
+		index = { rootId: 0 }
+		lowLink = { rootId: 0 }
+		componentStack = [rootId]
+		onStack = { rootId }
+		callStack = [( rootId, 0 )]
+
+		while callStack:
+			nodeId, edgeIndex = callStack[-1]
+			nodeEdges = edges[nodeId]
+			if edgeIndex < len( nodeEdges ):
+				callStack[-1] = ( nodeId, edgeIndex + 1 )
+				child = nodeEdges[edgeIndex]
+				if child in reach:
+					continue
+				if child not in index:
+					index[child] = lowLink[child] = len( index )
+					componentStack.append( child )
+					onStack.add( child )
+					callStack.append( ( child, 0 ) )
+				elif child in onStack and index[child] < lowLink[nodeId]:
+					lowLink[nodeId] = index[child]
+				continue
+
+			callStack.pop( )
+			if callStack:
+				parent = callStack[-1][0]
+				if lowLink[nodeId] < lowLink[parent]:
+					lowLink[parent] = lowLink[nodeId]
+
+			if lowLink[nodeId] != index[nodeId]:
+				continue
+
+			members = []
+			while True:
+				member = componentStack.pop( )
+				onStack.discard( member )
+				members.append( member )
+				if member == nodeId:
+					break
+
+			mask = 0
+			for member in members:
+				mask |= 1 << member
+			for member in members:
+				for child in edges[member]:
+					childReach = reach.get( child )
+					if childReach is not None:
+						mask |= childReach
+			for member in members:
+				reach[member] = mask
+
+
+	@staticmethod
+	def _IterIds( mask ):
+		#Walking the binary string is linear in the size of the mask; peeling off bits with integer math is quadratic.
+		bits = bin( mask )[:1:-1]
+		pos = bits.find( "1" )
+		while pos != -1:
+			yield pos
+			pos = bits.find( "1", pos + 1 )
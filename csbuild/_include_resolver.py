@@ -0,0 +1,160 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+**Include resolver module**
+
+Defines the lookup used to find the file an #include directive refers to.
+"""
+
+import os
+import platform
+
+try:
+	from os import scandir as _scandir
+except ImportError:
+	_scandir = None
+
+_caseInsensitive = platform.system( ) in ( "Windows", "Darwin" )
+
+
+def _normalizeName( name ):
+	if _caseInsensitive:
+		return name.lower( )
+	return name
+
+
+class IncludeResolver( object ):
+	"""
+	Resolves #include names against a chain of search directories without probing the filesystem for each candidate.
+
+	Every directory consulted is listed once, and existence checks become set lookups against that listing. For each
+	distinct chain of include directories, a table maps every file name found directly in any of them to the first
+	directory containing it, so resolving a plain file name is a single lookup regardless of how many include
+	directories there are. Results are memoized on the full search chain and the name being resolved.
+
+	Listings are never refreshed on their own; call :func:`Clear` if files may have been added or removed since.
+	"""
+
+	def __init__( self ):
+		#All of these are only ever added to, and entries for the same key always hold the same value, so concurrent
+		#lookups from multiple threads are safe without a lock.
+		self._listings = {}
+		self._tables = {}
+		self._resolved = {}
+
+
+	def Clear( self ):
+		"""
+		Forget all directory listings and resolved names.
+		"""
+		self._listings = {}
+		self._tables = {}
+		self._resolved = {}
+
+
+	def Exists( self, path ):
+		"""
+		Check whether a file exists, using the listing of its directory.
+
+		:param path: Path to the file
+		:type path: str
+
+		:return: Whether or not the file exists
+		:rtype: bool
+		"""
+		directory, name = os.path.split( path )
+		return _normalizeName( name ) in self._GetListing( directory )
+
+
+	def Resolve( self, name, localDirs, includeDirs ):
+		"""
+		Find the file an #include directive refers to.
+
+		:param name: File name exactly as written in the directive
+		:type name: str
+
+		:param localDirs: Directories to search before the include directories, in order. None entries are skipped.
+		:type localDirs: tuple[str]
+
+		:param includeDirs: Absolute include directories, in order
+		:type includeDirs: tuple[str]
+
+		:return: Path to the file, or an empty string if it wasn't found
+		:rtype: str
+		"""
+		key = ( includeDirs, localDirs, name )
+		path = self._resolved.get( key )
+		if path is None:
+			path = self._Find( name, localDirs, includeDirs )
+			self._resolved[key] = path
+		return path
+
+
+	def _Find( self, name, localDirs, includeDirs ):
+		for directory in localDirs:
+			if directory is None:
+				continue
+			path = os.path.join( directory, name )
+			if self.Exists( path ):
+				return path
+
+		if not includeDirs:
+			return ""
+
+		if os.sep in name or ( os.altsep and os.altsep in name ):
+			for directory in includeDirs:
+				path = os.path.join( directory, name )
+				if self.Exists( path ):
+					return path
+			return ""
+
+		directory = self._GetTable( includeDirs ).get( _normalizeName( name ) )
+		if directory is None:
+			return ""
+		return os.path.join( directory, name )
+
+
+	def _GetTable( self, includeDirs ):
+		table = self._tables.get( includeDirs )
+		if table is None:
+			table = {}
+			#Earlier directories take priority, so let them overwrite later ones.
+			for directory in reversed( includeDirs ):
+				for name in self._GetListing( directory ):
+					table[name] = directory
+			self._tables[includeDirs] = table
+		return table
+
+
+	def _GetListing( self, directory ):
+		listing = self._listings.get( directory )
+		if listing is None:
+			try:
+				if _scandir is not None:
+					names = [entry.name for entry in _scandir( directory or "." )]
+				else:
+					names = os.listdir( directory or "." )
+			except OSError:
+				names = []
+			listing = frozenset( _normalizeName( name ) for name in names )
+			self._listings[directory] = listing
+		return listing
@@ -0,0 +1,799 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+**Jobs module**
+
+Defines the compile jobs a build is made of and the pool of worker threads that runs them.
+
+A job's work is written as a generator, its Steps( ), which yields each process the job needs run as a
+:class:`Process` and is sent back that process's return code and output. Run( ) runs every step on the calling thread,
+starting each process and waiting for it in turn; other engines can drive the steps however suits them.
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import platform
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import csbuild
+from . import log
+from . import _shared_globals
+from . import _utils
+
+_ansiEscape = re.compile( r'\x1b[^m]*m' )
+
+
+class Process( object ):
+	"""
+	A process a job needs run.
+
+	:ivar command: The command, split into its arguments everywhere but Windows, where it's passed on as it is
+	:type command: list[str] or str
+
+	:ivar cwd: Directory to run the command in
+	:type cwd: str
+	"""
+	def __init__( self, command, cwd ):
+		if platform.system() != "Windows":
+			command = shlex.split( command )
+		self.command = command
+		self.cwd = cwd
+
+
+	def Run( self ):
+		"""
+		Run the process to completion on the calling thread.
+
+		:return: The return code, and everything the process wrote to stdout and stderr
+		:rtype: tuple[int, str, str]
+		"""
+		fd = subprocess.Popen( self.command, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = self.cwd )
+		output, errors = fd.communicate( )
+		if sys.version_info >= (3, 0):
+			#Compilers print source lines back in their diagnostics, in whatever encoding the source was in.
+			output = output.decode("utf-8", "replace")
+			errors = errors.decode("utf-8", "replace")
+		return fd.returncode, output, errors
+
+
+def RunSteps( steps ):
+	"""
+	Run a job's steps on the calling thread, running each process it needs to completion before carrying on.
+
+	:param steps: The job's steps
+	:type steps: generator
+	"""
+	result = None
+	error = None
+	while True:
+		try:
+			if error is not None:
+				process = steps.throw( error )
+			else:
+				process = steps.send( result )
+		except StopIteration:
+			return
+		#A process that can't be run or read is the job's to handle, like any other error.
+		try:
+			result = process.Run( )
+			error = None
+		except Exception as e:
+			result = None
+			error = e
+
+
+class CompileJob( object ):
+	"""
+	A single invocation of the compiler: one source, chunk, or precompiled header, and everything that came of
+	compiling it.
+
+	The job is the only thing written to while it runs. The project's per-file dictionaries, which the GUI and the
+	build report read, are filled in from it under the project's mutex once when it starts and once when it ends.
+
+	:ivar project: Project the file belongs to
+	:type project: csbuild.projectSettings.projectSettings
+
+	:ivar chunk: The file or chunk as the project lists it
+	:type chunk: str
+
+	:ivar file: Normalized path of the file, also its key in the project's per-file dictionaries
+	:type file: str
+
+	:ivar obj: Absolute path of the object file to produce
+	:type obj: str
+
+	:ivar forPrecompiledHeader: Whether this is a precompiled header rather than a source or chunk
+	:type forPrecompiledHeader: bool
+
+	:ivar description: Extra text shown after the object's name when the job starts, such as the files in a chunk
+	:type description: str
+
+	:ivar priority: Jobs with a higher priority are started first
+	:type priority: float
+
+	:ivar state: PENDING, BUILDING, FINISHED, FAILED, or ABORTED, from :class:`_shared_globals.ProjectState`
+	:type state: int
+
+	:ivar queueTime: When the job was queued
+	:type queueTime: float
+
+	:ivar startTime: When a worker started the job, or 0 if it hasn't started
+	:type startTime: float
+
+	:ivar endTime: When the job finished, or 0 if it hasn't
+	:type endTime: float
+
+	:ivar command: The compile command that was run
+	:type command: str
+
+	:ivar returnCode: The compiler's return code, or -1 if it couldn't be run
+	:type returnCode: int
+
+	:ivar output: What the compiler wrote to stdout
+	:type output: str
+
+	:ivar errors: What the compiler wrote to stderr, without color codes
+	:type errors: str
+
+	:ivar parsedErrors: Errors and warnings parsed out of the compiler's output, or None if there weren't any
+	:type parsedErrors: list[csbuild._shared_globals.OutputLine]
+
+	:ivar errorCount: Number of errors in parsedErrors
+	:type errorCount: int
+
+	:ivar warningCount: Number of warnings in parsedErrors
+	:type warningCount: int
+
+	:ivar fromCache: Whether the object was fetched from the object cache rather than compiled
+	:type fromCache: bool
+	"""
+
+	def __init__( self, infile, inobj, proj, forPrecompiledHeader = False, description = "", priority = 0 ):
+		self.project = proj
+		self.chunk = infile
+		self.file = os.path.normcase( infile )
+		self.obj = os.path.abspath( inobj )
+		self.forPrecompiledHeader = forPrecompiledHeader
+		self.description = description
+		self.priority = priority
+
+		self.state = _shared_globals.ProjectState.PENDING
+		self.queueTime = time.time( )
+		self.startTime = 0
+		self.endTime = 0
+
+		self.command = ""
+		self.returnCode = 0
+		self.output = ""
+		self.errors = ""
+		self.parsedErrors = None
+		self.errorCount = 0
+		self.warningCount = 0
+		self.fromCache = False
+
+		self._times = {}
+		self._summedTimes = {}
+		self._cacheKey = None
+		self._depFile = ""
+		self._done = threading.Event( )
+
+
+	def Wait( self ):
+		"""
+		Block until the job has finished or been aborted.
+		"""
+		self._done.wait( )
+
+
+	def Abort( self ):
+		"""
+		Mark a job that never started as aborted.
+		"""
+		self.state = _shared_globals.ProjectState.ABORTED
+		with self.project.mutex:
+			self.project.fileStatus[self.file] = _shared_globals.ProjectState.ABORTED
+			self.project.updated = True
+		self._done.set( )
+
+
+	def Run( self ):
+		"""
+		Compile the file on the calling thread, then record the result with the project.
+		"""
+		RunSteps( self.Steps( ) )
+
+
+	def Steps( self ):
+		"""
+		Compile the file, then record the result with the project. Never raises; a job that can't be run is failed.
+
+		Yields the compiler's :class:`Process`, unless the object comes from the cache or is being profiled, and
+		expects to be sent back its return code, stdout, and stderr.
+		"""
+		self.state = _shared_globals.ProjectState.BUILDING
+		self.startTime = time.time( )
+		with self.project.mutex:
+			self.project.fileStatus[self.file] = _shared_globals.ProjectState.BUILDING
+			self.project.fileStart[self.file] = self.startTime
+			self.project.updated = True
+
+		self._LogStart( )
+
+		try:
+			process = self._PrepareCompile( )
+			if process is not None:
+				ret, outputText, errorText = yield process
+				self._FinishCompile( ret, self._StripEcho( outputText ), self._StripEcho( errorText ) )
+		except Exception:
+			self.state = _shared_globals.ProjectState.FAILED
+			self.returnCode = -1
+			_shared_globals.build_success = False
+			traceback.print_exc( )
+
+		#Record it now rather than waiting for the end of the build, so it won't be compiled again if the build doesn't
+		#get that far. This has to happen before the job is marked done; once it is, the build takes it as finished.
+		if self.state == _shared_globals.ProjectState.FINISHED and not self.forPrecompiledHeader:
+			try:
+				self.project.journal_unit( self.chunk )
+			except Exception as e:
+				log.LOG_WARN( "Could not record the build of {}: {}".format( self.file, e ) )
+
+		self.endTime = time.time( )
+		self._Publish( )
+		self._done.set( )
+
+
+	def _LogStart( self ):
+		with _shared_globals.sgmutex:
+			current = _shared_globals.current_compile
+			_shared_globals.current_compile += 1
+
+		if self.forPrecompiledHeader:
+			log.LOG_BUILD( "Precompiling {0} ({1}/{2})...".format( self.chunk, current, _shared_globals.total_compiles ) )
+			return
+
+		totaltime = time.time( ) - _shared_globals.starttime
+		minutes = math.floor( totaltime / 60 )
+		seconds = math.floor( totaltime % 60 )
+		if _shared_globals.times:
+			_shared_globals.lastupdate = totaltime
+			avgtime = sum( _shared_globals.times ) / len( _shared_globals.times )
+			esttime = totaltime + ( avgtime * ( _shared_globals.total_compiles - len( _shared_globals.times ) ) ) \
+				/ _shared_globals.max_threads
+			if esttime < totaltime:
+				esttime = totaltime
+				_shared_globals.esttime = esttime
+			estmin = math.floor( esttime / 60 )
+			estsec = math.floor( esttime % 60 )
+			log.LOG_BUILD( "Compiling {0}{7}... ({1}/{2}) - {3}:{4:02}/{5}:{6:02}".format( os.path.basename( self.obj ),
+				current, _shared_globals.total_compiles, int( minutes ), int( seconds ), int( estmin ), int( estsec ),
+				self.description ) )
+		else:
+			log.LOG_BUILD( "Compiling {0}{5}... ({1}/{2}) - {3}:{4:02}".format( os.path.basename( self.obj ), current,
+				_shared_globals.total_compiles, int( minutes ), int( seconds ), self.description ) )
+
+
+	def _Publish( self ):
+		#The one place a finished job's results are handed to the project.
+		project = self.project
+		with project.mutex:
+			if self.command:
+				project.compileCommands[self.file] = self.command
+			project.compileOutput[self.file] = self.output
+			project.compileErrors[self.file] = self.errors
+			if self.parsedErrors:
+				project.errors += self.errorCount
+				project.warnings += self.warningCount
+				project.errorsByFile[self.file] = self.errorCount
+				project.warningsByFile[self.file] = self.warningCount
+				project.parsedErrors[self.file] = self.parsedErrors
+			project.times[self.file] = self._times
+			for filename, summed in self._summedTimes.items( ):
+				project.summedTimes[filename] = project.summedTimes.get( filename, 0 ) + summed
+			if self.returnCode:
+				project.compilationFailed = True
+			project.fileStatus[self.file] = self.state
+			project.fileEnd[self.file] = self.endTime
+			project.compilationCompleted += 1
+			project.updated = True
+
+		with _shared_globals.sgmutex:
+			_shared_globals.warningcount += self.warningCount
+			_shared_globals.errorcount += self.errorCount
+
+
+	def _PrepareCompile( self ):
+		"""Build the compiler's command. If there's no need to run it, because the object can be fetched from the cache,
+		or because it's being profiled and has to be run here to time it as it goes, the compile is finished on the
+		spot. Otherwise returns the compiler process to run, for _FinishCompile to take the results of."""
+		project = self.project
+		compiler = project.activeToolchain.Compiler( )
+		infile = self.file
+
+		headerfile = ""
+		baseCommand, isC = project.get_base_command( self.file, self.forPrecompiledHeader )
+		if not self.forPrecompiledHeader and project.uses_precompiled_header( isC ):
+			if isC:
+				headerfile = project.cHeaderFile
+			else:
+				headerfile = project.cppHeaderFile
+
+		reverseIndexes = {}
+
+		if self.file in project.fileOverrideSettings:
+			settings = project.fileOverrideSettings[self.file]
+		else:
+			settings = project
+
+		if _shared_globals.profile:
+			infile = self._Preprocess( baseCommand, settings, reverseIndexes )
+
+		if self.forPrecompiledHeader:
+			cmd = compiler.GetExtendedPrecompileCommand( baseCommand, settings, headerfile, self.obj,
+				os.path.abspath( infile ) )
+		else:
+			cmd = compiler.GetExtendedCommand( baseCommand, settings, headerfile, self.obj, os.path.abspath( infile ) )
+
+		if _shared_globals.profile:
+			cmd += compiler.GetExtraPostPreprocessorFlags()
+
+		depFile = ""
+		if project.dependencyMode == csbuild.DependencyMode.CompilerOutput and not self.forPrecompiledHeader \
+				and not _shared_globals.profile:
+			depArgs = compiler.GetDependencyFileArgs( _utils.GetDepFilePath( self.obj ) )
+			if depArgs:
+				depFile = _utils.GetDepFilePath( self.obj )
+				cmd += depArgs
+
+		self.command = cmd
+		if _shared_globals.show_commands:
+			print(cmd)
+		if os.access(self.obj , os.F_OK):
+			os.remove( self.obj )
+		if depFile and os.access(depFile , os.F_OK):
+			os.remove( depFile )
+
+		objectCache = _shared_globals.objectCache
+		cacheKey = None
+		if objectCache is not None and not self.forPrecompiledHeader and not _shared_globals.profile \
+				and compiler.SupportsObjectCache( ):
+			cacheKey = objectCache.GetKey( cmd, [depFile, self.obj], self._GetCacheInputs( settings, headerfile ) )
+
+		self._cacheKey = cacheKey
+		self._depFile = depFile
+
+		cached = None
+		if cacheKey is not None:
+			cached = objectCache.Fetch( cacheKey, self.obj, depFile )
+
+		if cached is not None:
+			log.LOG_INFO( "Fetched {} from the object cache".format( self.obj ) )
+			self.fromCache = True
+			outputText, errorText = cached
+			self._FinishCompile( 0, outputText, errorText )
+		elif _shared_globals.profile:
+			self._FinishCompile( *self._RunProfiledCompiler( cmd, infile, reverseIndexes ) )
+		else:
+			return Process( cmd, project.workingDirectory )
+		return None
+
+
+	def _FinishCompile( self, ret, outputText, errorText ):
+		"""Take the results of the compile: show and parse the output, and check that everything it was meant to write
+		was written."""
+		compiler = self.project.activeToolchain.Compiler( )
+		cacheKey = self._cacheKey
+		depFile = self._depFile
+		objectCache = _shared_globals.objectCache
+
+		sys.stdout.write( outputText )
+		sys.stderr.write( errorText )
+
+		self.returnCode = ret
+		self.output = outputText
+		self.errors = re.sub( _ansiEscape, '', errorText )
+		errorlist = compiler._parseOutput( outputText )
+		errorlist2 = compiler._parseOutput( self.errors )
+		if errorlist is None:
+			errorlist = errorlist2
+		elif errorlist2 is not None:
+			errorlist += errorlist2
+
+		if errorlist:
+			for error in errorlist:
+				if error.level == _shared_globals.OutputLevel.ERROR:
+					self.errorCount += 1
+				if error.level == _shared_globals.OutputLevel.WARNING:
+					self.warningCount += 1
+			self.parsedErrors = errorlist
+
+		if self.errorCount > 0:
+			self.state = _shared_globals.ProjectState.FAILED
+		else:
+			self.state = _shared_globals.ProjectState.FINISHED
+
+		if ret:
+			if str( ret ) == str( compiler.InterruptExitCode( ) ):
+				with _shared_globals.lock:
+					if not _shared_globals.interrupted:
+						log.LOG_ERROR( "Keyboard interrupt received. Aborting build." )
+					_shared_globals.interrupted = True
+			if not _shared_globals.interrupted:
+				log.LOG_ERROR( "Compile of {} failed!  (Return code: {})".format( self.file, ret ) )
+			_shared_globals.build_success = False
+			self.state = _shared_globals.ProjectState.FAILED
+		elif depFile:
+			#Make sure what the compiler wrote is usable. If it isn't, get rid of it so the next build falls back
+			#on scanning for headers instead of trusting a bad dependency list.
+			try:
+				if not _utils.ParseDepFile( depFile ):
+					raise IOError( "no dependencies listed" )
+			except IOError as e:
+				log.LOG_WARN( "Could not read dependency file {}: {}".format( depFile, e ) )
+				if os.access(depFile , os.F_OK):
+					os.remove( depFile )
+
+		if cacheKey is not None and not self.fromCache and not ret and not self.errorCount \
+				and os.access( self.obj, os.F_OK ) and ( not depFile or os.access( depFile, os.F_OK ) ):
+			objectCache.Store( cacheKey, self.obj, depFile, outputText, errorText )
+
+
+	def _Preprocess( self, baseCommand, settings, reverseIndexes ):
+		"""Preprocess the file for profiling, marking each line with a pragma the compiler will echo as it gets to it.
+		Returns the path of the preprocessed file, which is what gets compiled."""
+		project = self.project
+		compiler = project.activeToolchain.Compiler( )
+		profileIn = os.path.join( project.csbuildDir, "profileIn")
+		if not os.access(profileIn, os.F_OK):
+			os.makedirs(profileIn)
+		infile = os.path.join( profileIn, "{}.{}".format(hashlib.md5(self.file).hexdigest(), self.file.rsplit(".", 1)[1]) )
+
+		preprocessCmd = compiler.GetPreprocessCommand( baseCommand, settings, os.path.abspath( self.file ))
+		if _shared_globals.show_commands:
+			print(preprocessCmd)
+
+		if platform.system() != "Windows":
+			preprocessCmd = shlex.split(preprocessCmd)
+		fd = subprocess.Popen(preprocessCmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+
+		data = _utils.StringIO()
+		lastLine = 0
+		lastFile = 0
+		indexes = {}
+		highIndex = 0
+
+		op, er = fd.communicate()
+		if sys.version_info >= (3, 0):
+			op = op.decode("utf-8")
+			er = er.decode("utf-8")
+
+		if fd.returncode == 0:
+			text = op.split("\n")
+
+			for line in text:
+				stripped = line.rstrip()
+
+				data.write(stripped)
+				data.write("\n")
+
+				if not stripped:
+					lastLine += 1
+					continue
+
+				if stripped.startswith("#line") or stripped.startswith("# "):
+					split = stripped.split(" ",2)
+					filename = split[2].split('"')[1]
+					lastLine = int(split[1])
+					if filename in indexes:
+						lastFile = indexes[filename]
+					else:
+						highIndex += 1
+						indexes[filename] = highIndex
+						lastFile = highIndex
+						filename = os.path.normcase(os.path.abspath(filename))
+						filename = filename.replace("\\\\", "\\")
+						reverseIndexes[highIndex] = filename
+
+					data.write(compiler.PragmaMessage("CSBPF[{}][{}]".format(lastFile, lastLine)))
+					data.write("\n")
+				else:
+					data.write(compiler.PragmaMessage("CSBPL[{}][{}]".format(lastFile, lastLine)))
+					data.write("\n")
+					lastLine += 1
+			if platform.system() == "Windows":
+				file_mode = 438 # Octal 0666
+				fd = os.open(infile, os.O_WRONLY | os.O_CREAT | os.O_NOINHERIT | os.O_TRUNC, file_mode)
+				os.write(fd, data.getvalue())
+				os.fsync(fd)
+				os.close(fd)
+			else:
+				with open(infile, "w") as f:
+					f.write(data.getvalue())
+		else:
+			print(er)
+		return infile
+
+
+	def _GetCacheInputs( self, settings, headerfile ):
+		"""Get every file read to compile this source, for its object cache key. The includes are followed all the way
+		down regardless of the project's header recursion settings, since any of them can change the object."""
+		graph = _shared_globals.includeGraph
+		inputs = []
+		for root in ( self.file, headerfile ):
+			if not root:
+				continue
+			path = os.path.abspath( root )
+			inputs.append( path )
+			inputs += sorted( graph.GetPaths( graph.GetDependencies( path, settings.resolve_includes,
+				key = settings.get_include_graph_key( ) ) ) )
+		return inputs
+
+
+	@staticmethod
+	def _IsEcho( line, baseFile ):
+		#Some compilers print the name of the file they're compiling, which isn't worth showing.
+		stripped = line.strip()
+		if stripped == baseFile:
+			return True
+		if not " " in stripped:
+			if stripped.rsplit(".",1)[0] == baseFile.rsplit(".", 1)[0]:
+				return True
+		return False
+
+
+	def _StripEcho( self, text ):
+		baseFile = os.path.basename( self.file )
+		return "".join( line for line in text.splitlines( True ) if not CompileJob._IsEcho( line, baseFile ) )
+
+
+	def _RunProfiledCompiler( self, cmd, infile, reverseIndexes ):
+		"""Run the compiler, collecting its output and its timing pragmas as it prints them.
+		Returns the compiler's return code, stdout, and stderr."""
+		if platform.system() != "Windows":
+			cmd = shlex.split(cmd)
+
+		fd = subprocess.Popen( cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = self.project.workingDirectory )
+		baseFile = os.path.basename( infile )
+
+		class StringRef(object):
+			def __init__(self):
+				self.str = ""
+
+		errors = StringRef()
+		output = StringRef()
+		running = True
+
+		times = self._times
+		lastTimes = {}
+
+		if platform.system() == "Windows":
+			timeFunc = time.clock
+		else:
+			timeFunc = time.time
+
+		sanitation_lines = self.project.activeToolchain.Compiler().GetPostPreprocessorSanitationLines()
+
+		summedTimes = self._summedTimes
+
+		#Each pragma is timed as it's printed, so the pipes have to be read as the compiler writes to them.
+		def GatherData(pipe, buffer):
+			while running:
+				try:
+					line = pipe.readline()
+				except IOError as e:
+					continue
+				if not line:
+					break
+
+				if sys.version_info >= (3, 0):
+					line = line.decode("utf-8", "replace");
+
+				if CompileJob._IsEcho( line, baseFile ):
+					continue
+
+				stripped = line.strip()
+				sanitized = False
+				for sanitationLine in sanitation_lines:
+					if stripped == sanitationLine:
+						sanitized = True
+						break
+				if sanitized:
+					continue
+
+				if "CSBPF" in line:
+					sub = re.sub(_ansiEscape, '', line)
+					split = sub.split("[")
+					file = reverseIndexes[int(split[1].split("]")[0])]
+					lineNo = int(split[2].split("]")[0]) - 1
+					now = timeFunc()
+					if file in lastTimes:
+						if file not in times:
+							times[file] = {}
+						if lineNo not in times[file]:
+							times[file][lineNo] = 0
+						times[file][lineNo] += now - lastTimes[file]
+					else:
+						summedTimes[file] = 0
+					lastTimes[file] = now
+					continue
+
+				if "CSBPL" in line:
+					sub = re.sub(_ansiEscape, '', line)
+					split = sub.split("[")
+					file = reverseIndexes[int(split[1].split("]")[0])]
+					lineNo = int(split[2].split("]")[0])
+					if file not in times:
+						times[file] = {}
+					if lineNo not in times[file]:
+						times[file][lineNo] = 0
+					now = timeFunc()
+					times[file][lineNo] += now - lastTimes[file]
+					summedTimes[file] += now - lastTimes[file]
+					lastTimes[file] = now
+					continue
+
+				buffer.str += line
+
+		outputThread = threading.Thread(target=GatherData, args=(fd.stdout, output))
+		errorThread = threading.Thread(target=GatherData, args=(fd.stderr, errors))
+
+		outputThread.start()
+		errorThread.start()
+
+		fd.wait()
+		running = False
+
+		outputThread.join()
+		errorThread.join()
+
+		return fd.returncode, output.str, errors.str
+
+
+class WorkerPool( object ):
+	"""
+	A fixed set of worker threads running jobs from a shared priority queue.
+
+	Jobs are any object with a Run( ) method and a numeric priority; those with a higher priority are started first,
+	and jobs with the same priority are started in the order they were submitted. The workers live as long as the
+	pool does, so the number of threads never grows past the number of workers, however many jobs are queued.
+
+	:ivar numWorkers: Number of worker threads
+	:type numWorkers: int
+	"""
+
+	def __init__( self, numWorkers ):
+		self.numWorkers = numWorkers
+		self._queue = []
+		self._sequence = itertools.count( )
+		self._running = 0
+		self._finished = []
+		self._closed = False
+
+		self._lock = threading.Lock( )
+		self._workAvailable = threading.Condition( self._lock )
+		self._jobFinished = threading.Condition( self._lock )
+
+		#Prevent certain versions of python from choking on dummy threads.
+		if not hasattr( threading.Thread, "_Thread__block" ):
+			threading.Thread._Thread__block = _shared_globals.dummy_block( )
+
+		self._workers = []
+		for i in range( numWorkers ):
+			worker = threading.Thread( target = self._WorkerLoop, name = "csbuild worker {}".format( i ) )
+			worker.daemon = True
+			worker.start( )
+			self._workers.append( worker )
+
+
+	def Submit( self, job ):
+		"""
+		Queue a job to be run by the next free worker.
+
+		:param job: The job
+		:type job: CompileJob
+		"""
+		with self._lock:
+			heapq.heappush( self._queue, ( -job.priority, next( self._sequence ), job ) )
+			self._workAvailable.notify( )
+
+
+	def GetOutstanding( self ):
+		"""
+		:return: Number of jobs that are either queued or running
+		:rtype: int
+		"""
+		with self._lock:
+			return len( self._queue ) + self._running
+
+
+	def Wait( self, timeout = None ):
+		"""
+		Block until a job finishes, unless one has already finished since the last call or nothing is outstanding.
+
+		:param timeout: Longest to wait, in seconds, or None to wait as long as it takes
+		:type timeout: float
+
+		:return: Every job that finished or was cancelled since the last call, in the order they finished
+		:rtype: list[CompileJob]
+		"""
+		with self._lock:
+			if not self._finished and ( self._queue or self._running ):
+				self._jobFinished.wait( timeout )
+			finished = self._finished
+			self._finished = []
+			return finished
+
+
+	def Cancel( self ):
+		"""
+		Abort every job that hasn't started yet. Jobs that are running are left to finish.
+		"""
+		with self._lock:
+			queued = [entry[2] for entry in sorted( self._queue )]
+			self._queue = []
+		for job in queued:
+			job.Abort( )
+		with self._lock:
+			self._finished += queued
+			self._jobFinished.notify_all( )
+
+
+	def Close( self ):
+		"""
+		Stop the workers once the queue is empty and wait for them to exit.
+		"""
+		with self._lock:
+			self._closed = True
+			self._workAvailable.notify_all( )
+		for worker in self._workers:
+			worker.join( )
+
+
+	def _WorkerLoop( self ):
+		while True:
+			with self._lock:
+				while not self._queue and not self._closed:
+					self._workAvailable.wait( )
+				if not self._queue:
+					return
+				job = heapq.heappop( self._queue )[2]
+				self._running += 1
+
+			try:
+				job.Run( )
+			except Exception:
+				#Jobs are meant to catch their own errors. If one gets through anyway, the worker still has to report
+				#the job finished and carry on, or the build would wait on it forever.
+				traceback.print_exc( )
+			finally:
+				with self._lock:
+					self._running -= 1
+					self._finished.append( job )
+					self._jobFinished.notify_all( )
@@ -0,0 +1,408 @@
+# Copyright (C) 2013 Jaedyn K. Draper
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+**Object cache module**
+
+Defines the content-addressed cache of compiled objects that lets csbuild skip running the compiler on inputs it has
+compiled before.
+"""
+
+import hashlib
+import os
+import platform
+import shlex
+import shutil
+import sys
+import threading
+
+if sys.version_info < (3,0):
+	import cPickle as pickle
+else:
+	import pickle
+
+from . import log
+from . import _utils
+
+
+if hasattr( hashlib, "blake2b" ):
+	def _newHasher( ):
+		return hashlib.blake2b( digest_size = 20 )
+else:
+	_newHasher = hashlib.sha1
+
+
+class ObjectCache( object ):
+	"""
+	Cache of compiled objects, keyed on everything that goes into compiling them: the compile command (minus the
+	paths it writes to), the identity of the compiler executable, and the exact contents of the source and every file
+	it includes. When a source is compiled under a key that's been seen before, such as after switching back to a
+	branch that's already been built, the cached object and the compiler's output are copied into place instead of
+	running the compiler.
+
+	Each entry is stored as up to three files named after its key: the object, the dependency file if the compiler
+	wrote one, and the compiler's output. The output file is written last, so an entry without one is incomplete and
+	is ignored. Its modification time is refreshed every time the entry is used, and once the cache grows past its
+	size limit, entries are evicted least recently used first.
+
+	:ivar directory: Directory the cache is stored in
+	:type directory: str
+
+	:ivar maxSize: Size in bytes the cache is trimmed to stay under at the end of each build
+	:type maxSize: int
+
+	:ivar hits: Number of objects fetched from the cache during the current build
+	:type hits: int
+
+	:ivar misses: Number of objects looked up and not found during the current build
+	:type misses: int
+
+	:ivar stores: Number of objects added to the cache during the current build
+	:type stores: int
+	"""
+	_OBJECT_EXT = ".obj"
+	_DEPFILE_EXT = ".d"
+	_OUTPUT_EXT = ".out"
+
+	#Once the cache is over its limit, it's trimmed to this fraction of it, so it isn't trimmed again on every build.
+	_TRIM_RATIO = 0.9
+
+	def __init__( self, directory, maxSize ):
+		self.directory = directory
+		self.maxSize = maxSize
+		self.hits = 0
+		self.misses = 0
+		self.stores = 0
+		self._statsFile = os.path.join( directory, "stats" )
+		self._compilers = {}
+		self._digests = {}
+		self._lock = threading.Lock( )
+
+
+	def GetKey( self, cmd, outputs, inputs ):
+		"""
+		Get the key an object is cached under.
+
+		:param cmd: The full command that compiles the object
+		:type cmd: str
+
+		:param outputs: Paths in the command that the compiler writes to; these are left out of the key, so the same
+			object built to another location can be reused
+		:type outputs: list[str]
+
+		:param inputs: Every file read to compile the object
+		:type inputs: list[str]
+
+		:return: The key, or None if the compiler or one of the inputs couldn't be read
+		:rtype: str or None
+		"""
+		for i, path in enumerate( outputs ):
+			if path:
+				cmd = cmd.replace( path, "<output{}>".format( i ) )
+
+		compiler = self._GetCompilerIdentity( cmd )
+		if compiler is None:
+			return None
+
+		hasher = _newHasher( )
+		hasher.update( cmd.encode( "utf-8" ) )
+		hasher.update( b"\0" )
+		hasher.update( compiler.encode( "utf-8" ) )
+		for path in inputs:
+			digest = self._GetDigest( path )
+			if digest is None:
+				return None
+			hasher.update( b"\0" )
+			hasher.update( path.encode( "utf-8" ) )
+			hasher.update( digest )
+		return hasher.hexdigest( )
+
+
+	def Fetch( self, key, obj, depFile ):
+		"""
+		Copy a cached object into place.
+
+		:param key: The object's key
+		:type key: str
+
+		:param obj: Where to put the object
+		:type obj: str
+
+		:param depFile: Where to put the dependency file, or an empty string if the compiler isn't writing one
+		:type depFile: str
+
+		:return: ( output, errors ) recorded from the compiler when the object was cached, or None on a miss
+		:rtype: tuple[str, str] or None
+		"""
+		entry = self._GetEntryPath( key )
+		try:
+			with open( entry + ObjectCache._OUTPUT_EXT, "rb" ) as f:
+				output, errors, hasDepFile = pickle.load( f )
+			if depFile and not hasDepFile:
+				raise IOError( "entry has no dependency file" )
+			shutil.copyfile( entry + ObjectCache._OBJECT_EXT, obj )
+			if depFile:
+				shutil.copyfile( entry + ObjectCache._DEPFILE_EXT, depFile )
+			os.utime( entry + ObjectCache._OUTPUT_EXT, None )
+		except Exception:
+			for path in ( obj, depFile ):
+				if path and os.access( path, os.F_OK ):
+					os.remove( path )
+			with self._lock:
+				self.misses += 1
+			return None
+
+		with self._lock:
+			self.hits += 1
+		return output, errors
+
+
+	def Store( self, key, obj, depFile, output, errors ):
+		"""
+		Add a freshly compiled object to the cache. Failing to store it isn't an error; the object just won't be
+		cached.
+
+		:param key: The object's key
+		:type key: str
+
+		:param obj: The object
+		:type obj: str
+
+		:param depFile: The dependency file the compiler wrote, or an empty string if it didn't write one
+		:type depFile: str
+
+		:param output: What the compiler wrote to stdout
+		:type output: str
+
+		:param errors: What the compiler wrote to stderr
+		:type errors: str
+		"""
+		entry = self._GetEntryPath( key )
+		suffix = ".{}.{}.tmp".format( os.getpid( ), threading.current_thread( ).ident )
+		try:
+			entryDir = os.path.dirname( entry )
+			if not os.access( entryDir, os.F_OK ):
+				try:
+					os.makedirs( entryDir )
+				except OSError:
+					#Another thread or another build may have just created it.
+					if not os.path.isdir( entryDir ):
+						raise
+
+			files = [( obj, ObjectCache._OBJECT_EXT )]
+			if depFile:
+				files.append( ( depFile, ObjectCache._DEPFILE_EXT ) )
+			for src, ext in files:
+				shutil.copyfile( src, entry + ext + suffix )
+				self._Replace( entry + ext + suffix, entry + ext )
+
+			with open( entry + ObjectCache._OUTPUT_EXT + suffix, "wb" ) as f:
+				pickle.dump( ( output, errors, bool( depFile ) ), f, 2 )
+			self._Replace( entry + ObjectCache._OUTPUT_EXT + suffix, entry + ObjectCache._OUTPUT_EXT )
+		except Exception as e:
+			log.LOG_WARN( "Could not add {} to the object cache: {}".format( obj, e ) )
+			for ext in ( ObjectCache._OBJECT_EXT, ObjectCache._DEPFILE_EXT, ObjectCache._OUTPUT_EXT ):
+				if os.access( entry + ext + suffix, os.F_OK ):
+					os.remove( entry + ext + suffix )
+			return
+
+		with self._lock:
+			self.stores += 1
+
+
+	def Forget( self, paths ):
+		"""
+		Drop the digests saved for some files, so they're read again the next time they're an input. Used when
+		something else is already keeping track of what changes, such as --watch.
+
+		:param paths: The files that have changed
+		:type paths: collections.Iterable[str]
+		"""
+		for path in paths:
+			self._digests.pop( path, None )
+
+
+	def Finish( self ):
+		"""
+		End the current build: add its counts to the persistent statistics, evict entries if anything was added, and
+		reset the counts.
+		"""
+		if not self.hits and not self.misses and not self.stores:
+			return
+
+		stats = self.GetStats( )
+		stats["hits"] += self.hits
+		stats["misses"] += self.misses
+		stats["stores"] += self.stores
+
+		if self.stores:
+			stats["evictions"] += self._Trim( )
+
+		try:
+			#A build that only missed hasn't stored anything, so the cache may not have a directory yet.
+			if not os.path.isdir( self.directory ):
+				os.makedirs( self.directory )
+			_utils.WritePickle( self._statsFile, stats )
+		except Exception as e:
+			log.LOG_WARN( "Could not save object cache statistics: {}".format( e ) )
+
+		self.hits = 0
+		self.misses = 0
+		self.stores = 0
+
+
+	def GetStats( self ):
+		"""
+		Get the statistics accumulated over every finished build that has used the cache.
+
+		:return: { "hits", "misses", "stores", "evictions" : count }
+		:rtype: dict[str, int]
+		"""
+		stats = { "hits" : 0, "misses" : 0, "stores" : 0, "evictions" : 0 }
+		if os.access( self._statsFile, os.F_OK ):
+			try:
+				with open( self._statsFile, "rb" ) as f:
+					stats.update( pickle.load( f ) )
+			except Exception as e:
+				log.LOG_WARN( "Discarding unreadable object cache statistics: {}".format( e ) )
+		return stats
+
+
+	def GetContents( self ):
+		"""
+		Get every complete entry in the cache.
+
+		:return: [ ( last used time, total size in bytes, entry path ) ]
+		:rtype: list[tuple[float, int, str]]
+		"""
+		entries = []
+		if not os.access( self.directory, os.F_OK ):
+			return entries
+
+		for subdir in os.listdir( self.directory ):
+			subdirPath = os.path.join( self.directory, subdir )
+			if not os.path.isdir( subdirPath ):
+				continue
+
+			sizes = {}
+			lastUsed = {}
+			for filename in os.listdir( subdirPath ):
+				entry, ext = os.path.splitext( os.path.join( subdirPath, filename ) )
+				try:
+					st = os.stat( entry + ext )
+				except OSError:
+					continue
+				sizes[entry] = sizes.get( entry, 0 ) + st.st_size
+				if ext == ObjectCache._OUTPUT_EXT:
+					lastUsed[entry] = st.st_mtime
+
+			for entry, size in sizes.items( ):
+				if entry in lastUsed:
+					entries.append( ( lastUsed[entry], size, entry ) )
+
+		return entries
+
+
+	def _Trim( self ):
+		"""Evict least recently used entries until the cache is under its size limit. Returns the number evicted."""
+		entries = self.GetContents( )
+		totalSize = sum( entry[1] for entry in entries )
+		if totalSize <= self.maxSize:
+			return 0
+
+		entries.sort( )
+		targetSize = self.maxSize * ObjectCache._TRIM_RATIO
+		evicted = 0
+		for _, size, entry in entries:
+			if totalSize <= targetSize:
+				break
+			try:
+				#The output file goes first; without it, what's left of the entry is never used.
+				for ext in ( ObjectCache._OUTPUT_EXT, ObjectCache._OBJECT_EXT, ObjectCache._DEPFILE_EXT ):
+					if os.access( entry + ext, os.F_OK ):
+						os.remove( entry + ext )
+			except OSError as e:
+				log.LOG_WARN( "Could not evict {} from the object cache: {}".format( entry, e ) )
+				continue
+			totalSize -= size
+			evicted += 1
+
+		log.LOG_INFO( "Evicted {} entries from the object cache".format( evicted ) )
+		return evicted
+
+
+	def _GetEntryPath( self, key ):
+		return os.path.join( self.directory, key[:2], key )
+
+
+	@staticmethod
+	def _Replace( src, dst ):
+		if platform.system( ) == "Windows" and os.access( dst, os.F_OK ):
+			os.remove( dst )
+		os.rename( src, dst )
+
+
+	def _GetDigest( self, path ):
+		"""Digest of a file's exact contents. Comments matter here, since they move the line numbers in debug info. Each
+		digest is reused for as long as the file's stat stays the same, so a long-lived process sees edits."""
+		stat = _utils.GetFileStat( path )
+		if stat is None:
+			return None
+		saved = self._digests.get( path )
+		if saved is not None and saved[0] == stat:
+			return saved[1]
+
+		try:
+			with open( path, "rb" ) as f:
+				data = f.read( )
+		except IOError:
+			return None
+		digest = _newHasher( )
+		digest.update( data )
+		digest = digest.digest( )
+		self._digests[path] = ( stat, digest )
+		return digest
+
+
+	def _GetCompilerIdentity( self, cmd ):
+		"""Identify the compiler a command runs by its resolved path, size, and modification time, so upgrading the
+		compiler in place invalidates everything it compiled."""
+		try:
+			compiler = shlex.split( cmd, posix = platform.system( ) != "Windows" )[0].strip( "\"" )
+		except ( ValueError, IndexError ):
+			return None
+
+		identity = self._compilers.get( compiler )
+		if identity is None:
+			path = compiler
+			if not os.path.dirname( path ):
+				for searchDir in os.environ.get( "PATH", "" ).split( os.pathsep ):
+					candidate = os.path.join( searchDir, compiler )
+					if os.path.isfile( candidate ) and os.access( candidate, os.X_OK ):
+						path = candidate
+						break
+			path = os.path.realpath( path )
+			stat = _utils.GetFileStat( path )
+			if stat is None:
+				return None
+			identity = "{}|{}|{}".format( path, stat[0], stat[1] )
+			self._compilers[compiler] = identity
+		return identity
@@ -31,6 +31,13 @@ are documented here. Others are left undocumented.
 :var max_threads: Number of threads available for compilation
 :type max_threads: int
 
+:var max_scan_threads: Number of threads used to check which files need to be recompiled
+:type max_scan_threads: int
+
+:var workerPool: Runs every compile and link, max_threads at a time, None until the first build starts. An
+	_async_engine.AsyncEngine where asyncio can run it, otherwise a _jobs.WorkerPool.
+:type workerPool: csbuild._jobs.WorkerPool or csbuild._async_engine.AsyncEngine
+
 :var build_success: Whether or not the build succeeded
 :type build_success: bool
 
@@ -67,11 +74,40 @@ are documented here. Others are left undocumented.
 
 :var target_list: List of targets requested by the user, empty if using default target
 :type target_list: list[str]
+
+:var fileHasher: ( name, factory ) of the hash function used for file digests, or None to use the default
+:type fileHasher: tuple[str, function]
+
+:var includeResolver: Lookup used to find the files named by #include directives
+:type includeResolver: csbuild._include_resolver.IncludeResolver
+
+:var includeCache: Persistent cache of the includes found in each scanned file, None until the build is prepared
+:type includeCache: csbuild._include_cache.IncludeCache
+
+:var directoryManifest: Persistent record of the contents of the directories searched for source files, None until the
+	build is prepared
+:type directoryManifest: csbuild._dir_manifest.DirectoryManifest
+
+:var searchedDirectories: What get_files found in each directory it has searched so far this run, for each distinct set
+	of search settings: { settings : { path : ( statKey, matches, subdirectories, hasCppFiles ) } }
+:type searchedDirectories: dict[tuple, dict[str, tuple]]
+
+:var buildDurations: Persistent record of how long compiles and links took in previous builds, None until the build is
+	prepared
+:type buildDurations: csbuild._durations.DurationHistory
+
+:var includeGraph: Graph of the #include relationships discovered while checking which files need to be recompiled
+:type includeGraph: csbuild._include_graph.IncludeGraph
+
+:var objectCache: Cache of previously compiled objects, or None if --object-cache wasn't passed
+:type objectCache: csbuild._object_cache.ObjectCache
 """
 
 import threading
 import multiprocessing
 from . import terminfo
+from . import _include_graph
+from . import _include_resolver
 
 class ProjectState( object ):
 	"""
@@ -141,9 +177,9 @@ columns = terminfo.TermInfo.GetNumColumns( ) if color_supported else 0
 
 max_threads = multiprocessing.cpu_count( )
 max_linker_threads = max_threads
+max_scan_threads = max_threads
 
-semaphore = threading.BoundedSemaphore( value = max_threads )
-link_semaphore = threading.BoundedSemaphore( value = max_linker_threads )
+workerPool = None
 
 lock = threading.Lock( )
 
@@ -157,8 +193,9 @@ interrupted = False
 
 show_commands = False
 
-oldmd5s = { }
-newmd5s = { }
+fileDigests = { }
+fileIdentifiers = { }
+fileHasher = None
 
 times = []
 
@@ -191,9 +228,15 @@ install_incdir = "{prefix}/include"
 
 makefile_dict = { }
 
-allheaders = { }
-headerPaths = {}
-headerCheck = {}
+includeResolver = _include_resolver.IncludeResolver( )
+includeCache = None
+directoryManifest = None
+searchedDirectories = { }
+buildDurations = None
+includeGraph = _include_graph.IncludeGraph( )
+hashDatabases = { }
+
+objectCache = None
 
 current_compile = 1
 
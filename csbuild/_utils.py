@@ -18,10 +18,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import bisect
+import mmap
 import os
 import re
 import hashlib
-import shlex
 import subprocess
 import threading
 import time
@@ -33,50 +34,202 @@ import platform
 if sys.version_info >= (3,0):
 	import io
 	StringIO = io.StringIO
+	import pickle
 else:
 	import cStringIO
 	StringIO = cStringIO.StringIO
+	import cPickle as pickle
 
 import csbuild
 from . import log
 from . import _shared_globals
 
 
-def remove_comments( text ):
-	def replacer( match ):
-		s = match.group( 0 )
-		if s.startswith( '/' ):
-			return ""
+_commentsAndLiterals = re.compile(
+	br'//[^\n]*|/\*.*?\*/|\'(?:\\.|[^\\\'\n])*\'|"(?:\\.|[^\\"\n])*"',
+	re.DOTALL
+)
+
+
+def _keepLiterals( match ):
+	text = match.group( 0 )
+	if text[:1] == b"/":
+		return b""
+	return text
+
+
+def remove_comments( data ):
+	"""
+	Strip the comments out of C/C++ source, leaving string and character literals alone.
+
+	:param data: Raw file contents
+	:type data: bytes
+
+	:return: The contents without comments
+	:rtype: bytes
+	"""
+	if b"/" not in data:
+		return data
+	return _commentsAndLiterals.sub( _keepLiterals, data )
+
+
+#Matches the comments and literals in source. Every alternative shares a leading character class so the regex engine
+#can skip quickly over the code in between. A ' right after a hex digit is taken to be a C++14 digit separator rather
+#than the start of a character literal, and a header name after #include is treated as a literal.
+_sourceLiterals = re.compile(
+	br'[/"\'<](?:(?<=/)/(?:\\\r?\n|[^\n])*|(?<=/)\*.*?\*/'
+	br'|(?<=R")([^()\\\s]{0,16})\(.*?\)\1"'
+	br'|(?<=")(?:\\.|[^\\"\n])*"'
+	br"|(?<=')(?<![0-9A-Fa-f]')(?:\\.|[^\\'\n])*'"
+	br'|(?:(?<=include<)|(?<=include <))[^>\n]*>)',
+	re.DOTALL
+)
+_lineSplice = re.compile( br'\\\r?\n' )
+#"#define X (y)" defines an object-like macro, and "#define X(y)" a function-like one, so the space in the first is
+#swapped for a \1 that the pass below leaves alone.
+_objectMacro = re.compile( br'(# ?define [A-Za-z_$][A-Za-z0-9_$]*) \(' )
+#A space is only kept where taking it out would join two tokens into one: between two identifiers, numbers or literals
+#(\0 stands in for a literal), or between two operator characters that could combine, like "+ +" or "- >".
+_wordChars = br'A-Za-z0-9_$\x80-\xff"\'\0'
+_joiningOperators = br'\-+<>=!&|:*/%^#.'
+_joinedOperators = br'\-+<>=&|:*/%#.'
+_insignificantSpace = re.compile(
+	br' (?:(?<=[' + _wordChars + br'] )(?=[^' + _wordChars + br'])'
+	br'|(?<=[' + _joiningOperators + br'] )(?=[^' + _joinedOperators + br'])'
+	br'|(?<=[^' + _wordChars + _joiningOperators + br'] ))'
+)
+
+
+def normalize_source( data ):
+	"""
+	Reduce C/C++ source to a canonical form that only changes if its tokens or line breaks do. Comments are removed,
+	whitespace is dropped wherever it doesn't separate two tokens and shrunk to a single space where it does, and
+	blank lines, indentation, and line continuations are removed. String and character literals, including raw
+	strings, are left exactly as they are.
+
+	:param data: Raw file contents
+	:type data: bytes
+
+	:return: The normalized contents
+	:rtype: bytes
+	"""
+	#This is a handful of regex passes rather than a single scan. A token-by-token scanner in python is several
+	#times slower again, and this only runs on files whose stat has changed.
+	if b"\0" in data:
+		#Not source, or at least nothing this can make sense of.
+		return data
+
+	#The literals are set aside while the code around them is normalized, leaving a \0 in place of each one.
+	literals = []
+	def _setAside( match ):
+		text = match.group( 0 )
+		if text[:1] == b"/":
+			return b" "
+		literals.append( text )
+		return b"\0"
+
+	text = _sourceLiterals.sub( _setAside, data )
+	text = _lineSplice.sub( b"", text )
+	text = b"\n".join( filter( None, [b" ".join( line.split( ) ) for line in text.split( b"\n" )] ) )
+	text = _objectMacro.sub( b"\\1\1(", text )
+	text = _insignificantSpace.sub( b"", text )
+
+	if not literals:
+		return text
+	pieces = text.split( b"\0" )
+	normalized = [None] * ( len( pieces ) * 2 - 1 )
+	normalized[0::2] = pieces
+	normalized[1::2] = literals
+	return b"".join( normalized )
+
+
+if hasattr( hashlib, "blake2b" ):
+	def _blake2( ):
+		return hashlib.blake2b( digest_size = 16 )
+	_defaultFileHasher = ( "blake2b-128", _blake2 )
+else:
+	_defaultFileHasher = ( "md5", hashlib.md5 )
+
+
+def GetFileHasher( ):
+	"""
+	Get the hash function used for file digests; BLAKE2 where it's available, MD5 otherwise, unless a makefile has
+	chosen another with :func:`csbuild.SetFileHasher`.
+
+	:return: ( name, factory ), where factory returns a new object with the hashlib update()/digest() interface
+	:rtype: tuple[str, function]
+	"""
+	return _shared_globals.fileHasher or _defaultFileHasher
+
+
+def GetDigestName( normalization = 0 ):
+	"""
+	Get the name digests made by :func:`GetFileDigest` are recorded under. Digests made with a different hash function or
+	normalization can't be compared, so it covers both.
+
+	:param normalization: The normalization the digests are made with
+	:type normalization: :csbuild.SourceNormalization:
+
+	:return: The name
+	:rtype: str
+	"""
+	name = GetFileHasher( )[0]
+	if normalization == csbuild.SourceNormalization.Whitespace:
+		name += "+whitespace"
+	return name
+
+
+def GetFileDigest( path, normalization = 0 ):
+	"""
+	Get the digest of a file's contents, as recorded in the hash database. Comments are always ignored; with
+	:SourceNormalization.Whitespace:, so is any whitespace that doesn't change the file's tokens. Each file is only
+	read once per run for each normalization.
+
+	:param path: Path to the file
+	:type path: str
+
+	:param normalization: Which edits to the file the digest should ignore
+	:type normalization: :csbuild.SourceNormalization:
+
+	:return: The digest
+	:rtype: bytes
+	"""
+	digests = _shared_globals.fileDigests.setdefault( path, { } )
+	digest = digests.get( normalization )
+	if digest is None:
+		with open( path, "rb" ) as f:
+			data = f.read( )
+		hasher = GetFileHasher( )[1]( )
+		if normalization == csbuild.SourceNormalization.Whitespace:
+			hasher.update( normalize_source( data ) )
 		else:
-			return s
+			hasher.update( remove_comments( data ) )
+		digest = hasher.digest( )
+		digests[normalization] = digest
+	return digest
 
 
-	pattern = re.compile(
-		r'//.*?$|/\*.*?\*/|\'(?:\\.|[^\\\'])*\'|"(?:\\.|[^\\"])*"',
-		re.DOTALL | re.MULTILINE
-	)
-	return re.sub( pattern, replacer, text )
+_identifier = re.compile( br"[A-Za-z_][A-Za-z0-9_]*" )
 
 
-def RemoveWhitespace( text ):
-	#This isn't working correctly, turning it off.
-	return text
-	#shlexer = shlex.shlex(text)
-	#out = []
-	#token = ""
-	#while True:
-	#    token = shlexer.get_token()
-	#    if token == "":
-	#        break
-	#    out.append(token)
-	#return "".join(out)
-
-
-def GetMd5( inFile ):
-	if sys.version_info >= (3, 0):
-		return hashlib.md5( RemoveWhitespace( remove_comments( inFile.read( ) ) ).encode( 'utf-8' ) ).digest( )
-	else:
-		return hashlib.md5( RemoveWhitespace( remove_comments( inFile.read( ) ) ) ).digest( )
+def GetFileIdentifiers( path ):
+	"""
+	Get every identifier that appears in a file outside of comments, which includes every macro the file could
+	possibly test or expand by name. Each file is only read once per run.
+
+	:param path: Path to the file
+	:type path: str
+
+	:return: The identifiers, encoded as UTF-8
+	:rtype: frozenset[bytes]
+	"""
+	identifiers = _shared_globals.fileIdentifiers.get( path )
+	if identifiers is None:
+		with open( path, "rb" ) as f:
+			data = f.read( )
+		identifiers = frozenset( _identifier.findall( remove_comments( data ) ) )
+		_shared_globals.fileIdentifiers[path] = identifiers
+	return identifiers
 
 
 def GetSize( chunk ):
@@ -89,374 +242,300 @@ def GetSize( chunk ):
 		return os.path.getsize( chunk )
 
 
-class ThreadedBuild( threading.Thread ):
-	"""Multithreaded build system, launches a new thread to run the compiler in.
-	Uses a threading.BoundedSemaphore object to keep the number of threads equal to the number of processors on the
-	machine.
+def GetFileStat( path ):
 	"""
+	Get a key describing the current on-disk state of a file, used to tell whether a file has been modified
+	without reading it.
 
+	:param path: Path to the file
+	:type path: str
 
-	def __init__( self, infile, inobj, proj, forPrecompiledHeader = False ):
-		"""Initialize the object. Also handles above-mentioned bug with dummy threads."""
-		threading.Thread.__init__( self )
-		self.file = os.path.normcase(infile)
-
-		self.originalIn = self.file
-		self.obj = os.path.abspath( inobj )
-		self.project = proj
-		self.forPrecompiledHeader = forPrecompiledHeader
-		#Prevent certain versions of python from choking on dummy threads.
-		if not hasattr( threading.Thread, "_Thread__block" ):
-			threading.Thread._Thread__block = _shared_globals.dummy_block( )
+	:return: ( size, mtime in nanoseconds, inode, ctime in nanoseconds ), or None if the file can't be accessed
+	:rtype: tuple or None
+	"""
+	try:
+		st = os.stat( path )
+	except OSError:
+		return None
+	if hasattr( st, "st_mtime_ns" ):
+		return ( st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns )
+	return ( st.st_size, int( st.st_mtime * 1000000000 ), st.st_ino, int( st.st_ctime * 1000000000 ) )
 
 
-	def run( self ):
-		"""Actually run the build process."""
-		starttime = time.time( )
-		try:
-			with self.project.mutex:
-				self.project.fileStatus[self.file] = _shared_globals.ProjectState.BUILDING
-				self.project.fileStart[self.file] = time.time()
-				self.project.updated = True
-
-			inc = ""
-			headerfile = ""
-			extension = "." + self.file.rsplit(".", 1)[1]
-			if extension in self.project.cExtensions or self.file == self.project.cHeaderFile:
-				if( (self.project.chunkedPrecompile and self.project.cHeaders) or self.project.precompileAsC )\
-					and not self.forPrecompiledHeader:
-					headerfile = self.project.cHeaderFile
-
-				if self.forPrecompiledHeader:
-					if self.originalIn in self.project.ccpcOverrideCmds:
-						baseCommand = self.project.ccpcOverrideCmds[self.originalIn]
-					else:
-						baseCommand = self.project.ccpccmd
-				else:
-					if self.originalIn in self.project.ccOverrideCmds:
-						baseCommand = self.project.ccOverrideCmds[self.originalIn]
-					else:
-						baseCommand = self.project.ccCmd
-			else:
-				if (self.project.precompile or self.project.chunkedPrecompile) \
-					and not self.forPrecompiledHeader:
-					headerfile = self.project.cppHeaderFile
+def ListDirectory( directory ):
+	"""
+	List a directory in a single pass, splitting its contents the same way os.walk does. Symlinks to directories are
+	left out entirely, since they're neither files nor followed.
 
-				if self.forPrecompiledHeader:
-					if self.originalIn in self.project.cxxpcOverrideCmds:
-						baseCommand = self.project.cxxpcOverrideCmds[self.originalIn]
-					else:
-						baseCommand = self.project.cxxpccmd
-				else:
-					if self.originalIn in self.project.cxxOverrideCmds:
-						baseCommand = self.project.cxxOverrideCmds[self.originalIn]
-					else:
-						baseCommand = self.project.cxxCmd
+	:param directory: Path to the directory
+	:type directory: str
 
-			indexes = {}
-			reverseIndexes = {}
+	:return: ( names of the files, names of the subdirectories ), both empty if the directory can't be read
+	:rtype: tuple[list[str], list[str]]
+	"""
+	filenames = []
+	dirnames = []
+	try:
+		if hasattr( os, "scandir" ):
+			#On most platforms, scandir knows each entry's type without having to stat it.
+			for entry in os.scandir( directory ):
+				try:
+					isDir = entry.is_dir( )
+				except OSError:
+					isDir = False
+				if not isDir:
+					filenames.append( entry.name )
+				elif not entry.is_symlink( ):
+					dirnames.append( entry.name )
+		else:
+			for name in os.listdir( directory ):
+				path = os.path.join( directory, name )
+				if not os.path.isdir( path ):
+					filenames.append( name )
+				elif not os.path.islink( path ):
+					dirnames.append( name )
+	except OSError:
+		return [], []
+	return filenames, dirnames
+
+
+def GetModifiedTime( path ):
+	"""
+	Get a file's modification time in integer nanoseconds, so comparisons aren't subject to float rounding.
 
-			if self.originalIn in self.project.fileOverrideSettings:
-				project = self.project.fileOverrideSettings[self.originalIn]
-			else:
-				project = self.project
+	:param path: Path to the file
+	:type path: str
 
-			if _shared_globals.profile:
-				profileIn = os.path.join( self.project.csbuildDir, "profileIn")
-				if not os.access(profileIn, os.F_OK):
-					os.makedirs(profileIn)
-				self.file = os.path.join( profileIn, "{}.{}".format(hashlib.md5(self.file).hexdigest(), self.file.rsplit(".", 1)[1]) )
+	:return: The modification time
+	:rtype: int
+	"""
+	st = os.stat( path )
+	if hasattr( st, "st_mtime_ns" ):
+		return st.st_mtime_ns
+	return int( st.st_mtime * 1000000000 )
 
-				preprocessCmd = self.project.activeToolchain.Compiler().GetPreprocessCommand( baseCommand, project, os.path.abspath( self.originalIn ))
-				if _shared_globals.show_commands:
-					print(preprocessCmd)
 
-				if platform.system() != "Windows":
-					preprocessCmd = shlex.split(preprocessCmd)
-				fd = subprocess.Popen(preprocessCmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+def WritePickle( filename, data, sync = False ):
+	"""
+	Pickle data to a file, writing to a temporary file first so an interrupted build can never leave a
+	partially-written file behind.
 
-				data = StringIO()
-				lastLine = 0
-				lastFile = 0
+	:param filename: File to write to
+	:type filename: str
 
-				highIndex = 0
+	:param data: Object to pickle
+	:type data: object
 
-				op, er = fd.communicate()
-				if sys.version_info >= (3, 0):
-					op = op.decode("utf-8")
-					er = er.decode("utf-8")
-
-				if fd.returncode == 0:
-					text = op.split("\n")
-
-					for line in text:
-						stripped = line.rstrip()
-
-						data.write(stripped)
-						data.write("\n")
-
-						if not stripped:
-							lastLine += 1
-							continue
-
-						if stripped.startswith("#line") or stripped.startswith("# "):
-							split = stripped.split(" ",2)
-							filename = split[2].split('"')[1]
-							lastLine = int(split[1])
-							if filename in indexes:
-								lastFile = indexes[filename]
-							else:
-								highIndex += 1
-								indexes[filename] = highIndex
-								lastFile = highIndex
-								filename = os.path.normcase(os.path.abspath(filename))
-								filename = filename.replace("\\\\", "\\")
-								reverseIndexes[highIndex] = filename
-
-							data.write(self.project.activeToolchain.Compiler().PragmaMessage("CSBPF[{}][{}]".format(lastFile, lastLine)))
-							data.write("\n")
-						else:
-							data.write(self.project.activeToolchain.Compiler().PragmaMessage("CSBPL[{}][{}]".format(lastFile, lastLine)))
-							data.write("\n")
-							lastLine += 1
-					if platform.system() == "Windows":
-						file_mode = 438 # Octal 0666
-						fd = os.open(self.file, os.O_WRONLY | os.O_CREAT | os.O_NOINHERIT | os.O_TRUNC, file_mode)
-						os.write(fd, data.getvalue())
-						os.fsync(fd)
-						os.close(fd)
-					else:
-						with open(self.file, "w") as f:
-							f.write(data.getvalue())
-				else:
-					print(er)
+	:param sync: Wait for the data to reach the disk before replacing the file
+	:type sync: bool
+	"""
+	tempFile = "{}.{}.tmp".format( filename, os.getpid( ) )
+	with open( tempFile, "wb" ) as f:
+		pickle.dump( data, f, 2 )
+		if sync:
+			f.flush( )
+			os.fsync( f.fileno( ) )
+	if platform.system( ) == "Windows" and os.access( filename, os.F_OK ):
+		os.remove( filename )
+	os.rename( tempFile, filename )
 
-			if headerfile:
-				inc += headerfile
-			if self.forPrecompiledHeader:
-				cmd = self.project.activeToolchain.Compiler().GetExtendedPrecompileCommand( baseCommand,
-					project, inc, self.obj, os.path.abspath( self.file ) )
-			else:
-				cmd = self.project.activeToolchain.Compiler().GetExtendedCommand( baseCommand,
-					project, inc, self.obj, os.path.abspath( self.file ) )
 
-			if _shared_globals.profile:
-				cmd += self.project.activeToolchain.Compiler().GetExtraPostPreprocessorFlags()
+#Matches an #include directive starting at its '#'. Whether that '#' actually starts a line, and whether it's inside
+#a block comment, are checked separately; a literal first character lets the regex engine skip ahead much faster.
+_includeDirective = re.compile( br'#[ \t]*include[ \t]*[<"]([^>"\r\n]*)[>"]' )
+_blockCommentStart = re.compile( br'/\*' )
+_blockCommentEnd = re.compile( br'\*/' )
+_literalsAndComments = re.compile( br'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|/\*.*?\*/' )
 
-			self.project.compileCommands[self.originalIn] = cmd
-			if _shared_globals.show_commands:
-				print(cmd)
-			if os.access(self.obj , os.F_OK):
-				os.remove( self.obj )
+#Files smaller than this are simply read; the cost of mapping them outweighs the copy.
+_mmapThreshold = 64 * 1024
 
-			class StringRef(object):
-				def __init__(self):
-					self.str = ""
 
-			errors = StringRef()
-			output = StringRef()
-			if platform.system() != "Windows":
-				cmd = shlex.split(cmd)
+def _getBlockComments( data, limit ):
+	"""
+	Find the block comments in a buffer, ignoring any "/*" that's inside a string, character literal or line comment.
+	Literals and line comments can't span lines, so only the text preceding a "/*" on its own line needs to be examined.
 
-			fd = subprocess.Popen( cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = self.project.workingDirectory )
-			running = True
+	:param data: File contents
+	:type data: bytes or mmap.mmap
 
-			times = {}
-			lastTimes = {}
+	:param limit: Stop looking for comments that start after this offset
+	:type limit: int
 
-			if platform.system() == "Windows":
-				timeFunc = time.clock
-			else:
-				timeFunc = time.time
+	:return: Sorted lists of the start and end offsets of each comment
+	:rtype: tuple[list[int], list[int]]
+	"""
+	starts = []
+	ends = []
+	pos = 0
+	lastEnd = 0
+	while True:
+		RMatch = _blockCommentStart.search( data, pos, limit )
+		if RMatch is None:
+			break
+		start = RMatch.start( )
+
+		prefix = data[max( data.rfind( b"\n", 0, start ) + 1, lastEnd ):start]
+		if prefix.strip( ):
+			prefix = _literalsAndComments.sub( b"", prefix )
+			if b"//" in prefix or b'"' in prefix or b"'" in prefix:
+				pos = start + 2
+				continue
 
-			sanitation_lines = self.project.activeToolchain.Compiler().GetPostPreprocessorSanitationLines()
-			ansi_escape = re.compile(r'\x1b[^m]*m')
+		RMatch = _blockCommentEnd.search( data, start + 2 )
+		if RMatch is None:
+			end = len( data )
+		else:
+			end = RMatch.end( )
+		starts.append( start )
+		ends.append( end )
+		pos = lastEnd = end
+	return starts, ends
 
-			summedTimes = {}
 
-			def GatherData(pipe, buffer):
-				while running:
-					try:
-						line = pipe.readline()
-					except IOError as e:
-						continue
-					if not line:
-						break
+def GetIncludedFiles( headerFile ):
+	"""
+	Scan a file for #include directives. Works on the raw bytes of the file, memory-mapping large ones, and skips
+	directives that have been commented out with block comments.
 
-					if sys.version_info >= (3, 0):
-						line = line.decode("utf-8");
+	:param headerFile: Path to the file to scan
+	:type headerFile: str
 
-					stripped = line.strip()
-					baseFile = os.path.basename(self.file)
-					if stripped == baseFile:
-						continue
-					if not " " in stripped:
-						baseStripped = stripped.rsplit(".",1)[0]
-						baseFile = baseFile.rsplit(".", 1)[0]
-						if baseStripped == baseFile:
-							continue
-
-					if _shared_globals.profile:
-						sanitized = False
-						for sanitationLine in sanitation_lines:
-							if stripped == sanitationLine:
-								sanitized = True
-								break
-						if sanitized:
-							continue
-
-						if "CSBPF" in line:
-							sub = re.sub(ansi_escape, '', line)
-							split = sub.split("[")
-							file = reverseIndexes[int(split[1].split("]")[0])]
-							lineNo = int(split[2].split("]")[0]) - 1
-							now = timeFunc()
-							if file in lastTimes:
-								if file not in times:
-									times[file] = {}
-								if lineNo not in times[file]:
-									times[file][lineNo] = 0
-								times[file][lineNo] += now - lastTimes[file]
-							else:
-								summedTimes[file] = 0
-							lastTimes[file] = now
-							continue
-
-						if "CSBPL" in line:
-							sub = re.sub(ansi_escape, '', line)
-							split = sub.split("[")
-							file = reverseIndexes[int(split[1].split("]")[0])]
-							lineNo = int(split[2].split("]")[0])
-							if file not in times:
-								times[file] = {}
-							if lineNo not in times[file]:
-								times[file][lineNo] = 0
-							now = timeFunc()
-							times[file][lineNo] += now - lastTimes[file]
-							summedTimes[file] += now - lastTimes[file]
-							lastTimes[file] = now
-							continue
-
-					buffer.str += line
-
-			outputThread = threading.Thread(target=GatherData, args=(fd.stdout, output))
-			errorThread = threading.Thread(target=GatherData, args=(fd.stderr, errors))
-
-			outputThread.start()
-			errorThread.start()
-
-			fd.wait()
-			running = False
-
-			outputThread.join()
-			errorThread.join()
-
-			with self.project.mutex:
-				self.project.times[self.originalIn] = times
-				for file in summedTimes:
-					if file in self.project.summedTimes:
-						self.project.summedTimes[file] += summedTimes[file]
-					else:
-						self.project.summedTimes[file] = summedTimes[file]
-
-			ret = fd.returncode
-
-			sys.stdout.write( output.str )
-			sys.stderr.write( errors.str )
-
-			with self.project.mutex:
-				stripped_errors = re.sub(ansi_escape, '', errors.str)
-				self.project.compileOutput[self.originalIn] = output.str
-				self.project.compileErrors[self.originalIn] = stripped_errors
-				errorlist = self.project.activeToolchain.Compiler()._parseOutput(output.str)
-				errorlist2 = self.project.activeToolchain.Compiler()._parseOutput(stripped_errors)
-				if errorlist is None:
-					errorlist = errorlist2
-				elif errorlist2 is not None:
-					errorlist += errorlist2
-
-				errorcount = 0
-				warningcount = 0
-				if errorlist:
-					for error in errorlist:
-						if error.level == _shared_globals.OutputLevel.ERROR:
-							errorcount += 1
-						if error.level == _shared_globals.OutputLevel.WARNING:
-							warningcount += 1
-
-					self.project.errors += errorcount
-					self.project.warnings += warningcount
-					self.project.errorsByFile[self.originalIn] = errorcount
-					self.project.warningsByFile[self.originalIn] = warningcount
-					self.project.parsedErrors[self.originalIn] = errorlist
-
-					if errorcount > 0:
-						self.project.fileStatus[self.originalIn] = _shared_globals.ProjectState.FAILED
-					else:
-						self.project.fileStatus[self.originalIn] = _shared_globals.ProjectState.FINISHED
-				else:
-					self.project.fileStatus[self.originalIn] = _shared_globals.ProjectState.FINISHED
-
-
-			with _shared_globals.sgmutex:
-				_shared_globals.warningcount += warningcount
-				_shared_globals.errorcount += errorcount
-
-			if ret:
-				if str( ret ) == str( self.project.activeToolchain.Compiler().InterruptExitCode( ) ):
-					_shared_globals.lock.acquire( )
-					if not _shared_globals.interrupted:
-						log.LOG_ERROR( "Keyboard interrupt received. Aborting build." )
-					_shared_globals.interrupted = True
-					log.LOG_BUILD( "Releasing lock..." )
-					_shared_globals.lock.release( )
-					log.LOG_BUILD( "Releasing semaphore..." )
-					_shared_globals.semaphore.release( )
-					log.LOG_BUILD( "Closing thread..." )
-				if not _shared_globals.interrupted:
-					log.LOG_ERROR( "Compile of {} failed!  (Return code: {})".format( self.originalIn, ret ) )
-				_shared_globals.build_success = False
-
-				self.project.mutex.acquire( )
-				self.project.compilationFailed = True
-				self.project.fileStatus[self.originalIn] = _shared_globals.ProjectState.FAILED
-				self.project.updated = True
-				self.project.mutex.release( )
-		except Exception as e:
-			#If we don't do this with ALL exceptions, any unhandled exception here will cause the semaphore to never
-			# release...
-			#Meaning the build will hang. And for whatever reason ctrl+c won't fix it.
-			#ABSOLUTELY HAVE TO release the semaphore on ANY exception.
-			#if os.path.dirname(self.originalIn) == _csbuildDir:
-			#   os.remove(self.originalIn)
-			_shared_globals.semaphore.release( )
-
-			self.project.mutex.acquire( )
-			self.project.compilationFailed = True
-			self.project.compilationCompleted += 1
-			self.project.fileStatus[self.originalIn] = _shared_globals.ProjectState.FAILED
-			self.project.fileEnd[self.originalIn] = time.time()
-			self.project.updated = True
-			self.project.mutex.release( )
-
-			traceback.print_exc()
-			raise e
+	:return: List of included file names, exactly as they were written, including system headers
+	:rtype: list[str]
+	"""
+	with open( headerFile, "rb" ) as f:
+		size = os.fstat( f.fileno( ) ).st_size
+		if size == 0:
+			return []
+		if size >= _mmapThreshold:
+			data = mmap.mmap( f.fileno( ), 0, access = mmap.ACCESS_READ )
 		else:
-			#if os.path.dirname(self.originalIn) == _csbuildDir:
-			#   os.remove(self.originalIn)
-			#if inc or (not self.project.precompile and not self.project.chunkedPrecompile):
-			#endtime = time.time( )
-			#_shared_globals.sgmutex.acquire( )
-			#_shared_globals.times.append( endtime - starttime )
-			#_shared_globals.sgmutex.release( )
+			data = f.read( )
 
-			_shared_globals.semaphore.release( )
+		try:
+			directives = []
+			for RMatch in _includeDirective.finditer( data ):
+				pos = RMatch.start( )
+				if data[data.rfind( b"\n", 0, pos ) + 1:pos].strip( ):
+					continue
+				directives.append( RMatch )
+
+			if not directives:
+				return []
+
+			#Includes are almost always at the top of the file, so there's no need to look for comments past the last one.
+			starts, ends = _getBlockComments( data, directives[-1].start( ) )
+
+			headers = []
+			for RMatch in directives:
+				pos = RMatch.start( )
+				index = bisect.bisect_right( starts, pos ) - 1
+				if index >= 0 and ends[index] > pos:
+					continue
+
+				header = RMatch.group( 1 )
+				if sys.version_info >= (3, 0):
+					header = header.decode( "latin-1" )
+				headers.append( header )
+			return headers
+		finally:
+			if size >= _mmapThreshold:
+				data.close( )
+
+
+def ParallelMap( func, items, numThreads ):
+	"""
+	Call a function on every item in a list using a pool of worker threads. Intended for work that spends most of
+	its time waiting on the filesystem, such as checking whether files are up to date.
+
+	:param func: Function to call with each item
+	:type func: function
+
+	:param items: Items to process
+	:type items: list
 
-			self.project.mutex.acquire( )
-			self.project.compilationCompleted += 1
-			self.project.fileEnd[self.originalIn] = time.time()
-			self.project.updated = True
-			self.project.mutex.release( )
+	:param numThreads: Maximum number of threads to use. With 1 or fewer, everything runs on the calling thread.
+	:type numThreads: int
+
+	:return: The results of each call, in the same order as the items
+	:rtype: list
+	"""
+	numThreads = min( numThreads, len( items ) )
+	if numThreads <= 1:
+		return [func( item ) for item in items]
+
+	results = [None] * len( items )
+	errors = []
+	indexes = iter( range( len( items ) ) )
+	indexLock = threading.Lock( )
+
+	def worker( ):
+		while not errors:
+			with indexLock:
+				index = next( indexes, None )
+			if index is None:
+				return
+			try:
+				results[index] = func( items[index] )
+			except Exception as e:
+				traceback.print_exc( )
+				errors.append( e )
+
+	threads = []
+	for _ in range( numThreads ):
+		thread = threading.Thread( target = worker )
+		thread.daemon = True
+		thread.start( )
+		threads.append( thread )
+
+	for thread in threads:
+		thread.join( )
+
+	if errors:
+		raise errors[0]
+	return results
+
+
+def GetDepFilePath( obj ):
+	"""
+	Get the path of the dependency file the compiler writes alongside an object file in
+	:DependencyMode.CompilerOutput:.
+
+	:param obj: The object file
+	:type obj: str
+
+	:return: The dependency file
+	:rtype: str
+	"""
+	return os.path.splitext( obj )[0] + ".d"
+
+
+def ParseDepFile( depFile ):
+	"""
+	Parse a make-style dependency file, as generated by gcc and clang with -MMD.
+
+	:param depFile: The dependency file to parse
+	:type depFile: str
+
+	:return: The list of prerequisites of the first rule in the file
+	:rtype: list[str]
+	"""
+	with open( depFile, "r" ) as f:
+		text = f.read( )
+
+	text = text.replace( "\\\r\n", " " ).replace( "\\\n", " " )
+	#The target is terminated by the first colon that's followed by whitespace; this skips over drive letters.
+	RMatch = re.search( r":(?=\s|$)", text )
+	if RMatch is None:
+		return []
+
+	#Only the first rule is needed. Any others would come from -MP, and only repeat the headers as phony targets.
+	rule = text[RMatch.end( ):].split( "\n", 1 )[0]
+	dependencies = []
+	for token in re.findall( r"(?:\\ |\S)+", rule ):
+		dependencies.append( token.replace( "\\ ", " " ).replace( "\\#", "#" ).replace( "$$", "$" ) )
+	return dependencies
 
 
 def BaseNames( l ):
@@ -576,12 +655,15 @@ def SortProjects( projects_to_sort ):
 	return sorted(dependencyFreeProjects, key=lambda proj: proj.priority, reverse=True) + ret
 
 
-def PreparePrecompiles( ):
+def PreparePrecompiles( projects = None ):
 	if _shared_globals.disable_precompile:
 		return
 
+	if projects is None:
+		projects = _shared_globals.projects.values( )
+
 	wd = os.getcwd( )
-	for project in _shared_globals.projects.values( ):
+	for project in projects:
 		os.chdir( project.workingDirectory )
 
 		precompileExcludeFiles = set( )
@@ -593,7 +675,8 @@ def PreparePrecompiles( ):
 			obj = project.activeToolchain.Compiler().GetPchFile( headerfile )
 
 			precompile = False
-			if not os.access(headerfile, os.F_OK ) or project.should_recompile( headerfile, obj, True ):
+			if not os.access(headerfile, os.F_OK ) or project.command_changed( headerfile, True ) \
+					or project.should_recompile( headerfile, obj, True ):
 				precompile = True
 			else:
 				for header in allheaders:
@@ -636,16 +719,7 @@ def PreparePrecompiles( ):
 
 		if project.chunkedPrecompile or project.precompile or project.precompileAsC:
 
-			if project.chunkedPrecompile:
-				cppHeaders = project.cppHeaders
-				cHeaders = project.cHeaders
-			else:
-				if not project.hasCppFiles:
-					cppHeaders = []
-					cHeaders = project.precompile + project.precompileAsC
-				else:
-					cppHeaders = project.precompile
-					cHeaders = project.precompileAsC
+			cppHeaders, cHeaders = project.get_precompiled_headers( )
 
 			if cppHeaders:
 				project.cppHeaderFile = os.path.join( project.csbuildDir, "{}_cpp_precompiled_headers_{}.hpp".format(
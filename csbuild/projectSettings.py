@@ -37,10 +37,8 @@ It has no name and is NOT itself a valid or "real" group.
 
 import csbuild
 
-import fnmatch
 import os
 import re
-import hashlib
 import time
 import sys
 import math
@@ -54,6 +52,15 @@ from . import log
 from . import _shared_globals
 from . import _utils
 from . import toolchain
+from . import _hash_db
+from . import _dir_manifest
+from . import _jobs
+
+#What get_files classifies each file it finds as, also the index of the list it goes into.
+_C_SOURCE, _CPP_SOURCE, _CPP_HEADER, _C_HEADER, _AMBIGUOUS_HEADER = range( 5 )
+
+_buildSteps = ( "prePrepareBuildStep", "postPrepareBuildStep", "preMakeStep", "postMakeStep", "preBuildStep",
+	"preLinkStep", "postBuildStep" )
 
 class projectSettings( object ):
 	"""
@@ -203,6 +210,12 @@ class projectSettings( object ):
 	:ivar ignoreExternalHeaders: Whether or not to ignore external headers when building header information
 	:type ignoreExternalHeaders: bool
 
+	:ivar dependencyMode: Whether header dependencies are found by scanning or taken from compiler-generated dependency files
+	:type dependencyMode: int
+
+	:ivar sourceNormalization: Which edits to a file are ignored when checking whether it has changed
+	:type sourceNormalization: int
+
 	:ivar defaultTarget: The target to be built when none is specified
 	:type defaultTarget: str
 
@@ -251,7 +264,7 @@ class projectSettings( object ):
 	:ivar ccpccmd: Base C precompile command, returned from toolchain.get_base_cc_precompile_command
 	:type ccpccmd: str
 
-	:ivar recompileAll: Whether or not conditions have caused the entire project to need recompilation
+	:ivar recompileAll: Whether or not the entire project needs to be recompiled, as requested with --rebuild
 	:type recompileAll: bool
 
 	:ivar targets: List of targets in this project with their associated settings functions, decorated with @target
@@ -264,6 +277,32 @@ class projectSettings( object ):
 		them as chunks, etc.
 	:type _finalChunkSet: list[str]
 
+	:ivar _hashDatabase: File states and header dependencies recorded by the last build, None until first needed
+	:type _hashDatabase: csbuild._hash_db.HashDatabase
+
+	:ivar _unitDependencies: Mask of header dependencies found for each source checked in this build
+	:type _unitDependencies: dict[str, int]
+
+	:ivar _includeSearchDirs: includeDirs as last seen by get_include_search_dirs, paired with the same directories made
+		absolute
+	:type _includeSearchDirs: tuple[list[str], tuple[str]]
+
+	:ivar _commandFingerprints: Fingerprints already computed by get_command_fingerprint, keyed by what goes into them
+	:type _commandFingerprints: dict[tuple, bytes]
+
+	:ivar _fingerprintCmds: ( ccCmd, cxxCmd ) as they would be without any defines, undefines, or include directories
+	:type _fingerprintCmds: tuple[str, str]
+
+	:ivar _fingerprintOverrideCmds: _fingerprintCmds for each file with overridden settings
+	:type _fingerprintOverrideCmds: dict[str, tuple[str, str]]
+
+	:ivar _includeChanges: For each set of include directories files were last compiled with and each file checked,
+		the first #include in that file that resolves differently now, and the files it includes
+	:type _includeChanges: dict[tuple[tuple[str], str], tuple[tuple[str, str], list[str]]]
+
+	:ivar _sourceDirs: Stat of each directory get_files searched, as it was when the directory was searched
+	:type _sourceDirs: dict[str, tuple]
+
 	:ivar compilationCompleted: The number of files that have been compiled (successfully or not) at this point in the
 		compile process. Note that this variable is modified in multiple threads and should be handled within project.mutex
 	:type compilationCompleted: int
@@ -423,6 +462,15 @@ class projectSettings( object ):
 		self.chunks = []
 		self.forceChunks = []
 		self.chunksByFile = {}
+		self._chunkNameCache = None
+		self._hashDatabase = None
+		self._unitDependencies = {}
+		self._includeSearchDirs = None
+		self._commandFingerprints = {}
+		self._fingerprintCmds = ( "", "" )
+		self._fingerprintOverrideCmds = {}
+		self._includeChanges = {}
+		self._sourceDirs = {}
 
 		self.useChunks = True
 		self.chunkTolerance = 3
@@ -432,6 +480,8 @@ class projectSettings( object ):
 
 		self.headerRecursionDepth = 0
 		self.ignoreExternalHeaders = False
+		self.dependencyMode = csbuild.DependencyMode.ScanHeaders
+		self.sourceNormalization = csbuild.SourceNormalization.Comments
 
 		self.defaultTarget = "release"
 
@@ -661,40 +711,22 @@ class projectSettings( object ):
 		if not os.access(self.csbuildDir , os.F_OK):
 			os.makedirs( self.csbuildDir )
 
-		# Walk the source directory and construct the paths to each possible intermediate object file.
-		# Make sure the paths exist, and if they don't, create them.
-		for root, _, _ in os.walk(self.workingDirectory):
-			# Exclude the intermediate and output paths in case they're in the working directory.
-			if ".csbuild" in root or self.outputDir in root or self.objDir in root:
-				continue
-			tempFilename = os.path.join(root, "not_a_real.file")
-			objFilePath = os.path.dirname(_utils.GetSourceObjPath(self, tempFilename))
-			if not os.access(objFilePath, os.F_OK):
-				os.makedirs(objFilePath)
-
 		for item in self.fileOverrideSettings.items():
 			item[1].activeToolchain = item[1].toolchains[self.activeToolchainName]
 			self.ccOverrideCmds[item[0]] = self.activeToolchain.Compiler().GetBaseCcCommand( item[1] )
 			self.cxxOverrideCmds[item[0]] = self.activeToolchain.Compiler().GetBaseCxxCommand( item[1] )
 			self.ccpcOverrideCmds[item[0]] = self.activeToolchain.Compiler().GetBaseCcPrecompileCommand( item[1] )
 			self.cxxpcOverrideCmds[item[0]] = self.activeToolchain.Compiler().GetBaseCxxPrecompileCommand( item[1] )
+			self._fingerprintOverrideCmds[item[0]] = self.get_fingerprint_commands( item[1] )
 
 		self.ccCmd = self.activeToolchain.Compiler().GetBaseCcCommand( self )
 		self.cxxCmd = self.activeToolchain.Compiler().GetBaseCxxCommand( self )
 		self.ccpccmd = self.activeToolchain.Compiler().GetBaseCcPrecompileCommand( self )
 		self.cxxpccmd = self.activeToolchain.Compiler().GetBaseCxxPrecompileCommand( self )
+		self._fingerprintCmds = self.get_fingerprint_commands( self )
 
-		cmdfile = os.path.join( self.csbuildDir, "{}.csbuild".format( self.targetName ) )
-		cmd = ""
-		if os.access(cmdfile , os.F_OK):
-			with open( cmdfile, "r" ) as f:
-				cmd = f.read( )
-
-		if self.cxxCmd + self.ccCmd != cmd or _shared_globals.rebuild:
+		if _shared_globals.rebuild:
 			self.recompileAll = True
-			with open( cmdfile, "w" ) as f:
-				f.write( self.cxxCmd + self.ccCmd )
-
 
 		self.RediscoverFiles()
 
@@ -744,14 +776,26 @@ class projectSettings( object ):
 
 		if not _shared_globals.CleanBuild and not _shared_globals.do_install and csbuild.GetOption(
 				"generate_solution" ) is None:
-			for source in self.allsources:
-				if self.should_recompile( source ):
+			self.get_hash_database( )
+			results = _utils.ParallelMap( self.should_recompile, self.allsources, _shared_globals.max_scan_threads )
+			for source, recompile in zip( self.allsources, results ):
+				if recompile:
 					self.sources.append( source )
 		else:
 			self.sources = list( self.allsources )
 
+		self.make_obj_dirs( self.allsources )
 		_shared_globals.allfiles |= set(self.sources)
 
+
+	def make_obj_dirs( self, sources ):
+		"""Make sure the directories the given sources' intermediate object files go in exist."""
+		#Only the directories that actually have sources in them get one. Walking the whole working directory for them
+		#would also walk, and mirror, the object directories of every other target and architecture kept inside it.
+		for objDir in set( os.path.dirname( _utils.GetSourceObjPath( self, source ) ) for source in sources ):
+			if not os.access( objDir, os.F_OK ):
+				os.makedirs( objDir )
+
 	def SetValue(self, key, value):
 		scope = self._currentScope
 		if scope & csbuild.ScopeDef.Self:
@@ -1030,6 +1074,15 @@ class projectSettings( object ):
 			"chunks": list( self.chunks ),
 			"forceChunks": list( self.forceChunks ),
 			"chunksByFile" : dict( self.chunksByFile ),
+			"_chunkNameCache" : None,
+			"_hashDatabase" : None,
+			"_unitDependencies" : {},
+			"_includeSearchDirs" : None,
+			"_commandFingerprints" : {},
+			"_fingerprintCmds" : self._fingerprintCmds,
+			"_fingerprintOverrideCmds" : dict( self._fingerprintOverrideCmds ),
+			"_includeChanges" : {},
+			"_sourceDirs" : {},
 			"useChunks": self.useChunks,
 			"chunkTolerance": self.chunkTolerance,
 			"chunkSize": self.chunkSize,
@@ -1037,6 +1090,8 @@ class projectSettings( object ):
 			"chunkSizeTolerance": self.chunkSizeTolerance,
 			"headerRecursionDepth": self.headerRecursionDepth,
 			"ignoreExternalHeaders": self.ignoreExternalHeaders,
+			"dependencyMode": self.dependencyMode,
+			"sourceNormalization": self.sourceNormalization,
 			"defaultTarget": self.defaultTarget,
 			"chunkedPrecompile": self.chunkedPrecompile,
 			"precompile": list( self.precompile ),
@@ -1186,226 +1241,975 @@ class projectSettings( object ):
 
 		excludeFiles = set( )
 		excludeDirs = set( )
-		ambiguousHeaders = set()
+		ambiguousHeaders = []
 
 		for exclude in self.excludeFiles:
 			excludeFiles |= set( glob.glob( exclude ) )
 
 		for exclude in self.excludeDirs:
-			excludeDirs |= set( glob.glob( exclude ) )
+			excludeDirs |= set( os.path.abspath( excludeDir ) for excludeDir in glob.glob( exclude ) )
+
+		#Each file is classified by looking its suffix up here, rather than matching it against every extension.
+		#Sources win over headers if an extension is listed as both.
+		found = { }
+		if headers is not None or cHeaders is not None:
+			for extension in self.ambiguousHeaderExtensions:
+				found[os.path.normcase( extension )] = _AMBIGUOUS_HEADER
+		if cHeaders is not None:
+			for extension in self.cHeaderExtensions:
+				found[os.path.normcase( extension )] = _C_HEADER
+		if headers is not None:
+			for extension in self.cppHeaderExtensions:
+				found[os.path.normcase( extension )] = _CPP_HEADER
+		if sources is not None:
+			for extension in self.cExtensions:
+				found[os.path.normcase( extension )] = _C_SOURCE
+			for extension in self.cppExtensions:
+				found[os.path.normcase( extension )] = _CPP_SOURCE
+		fileLists = ( sources, sources, headers, cHeaders, ambiguousHeaders )
+
+		#Every target, architecture, and toolchain a project is built for searches the same directories, so what's found
+		#in each one is kept for the rest of the run and shared by everything searching it with the same settings. The
+		#build directories are different for each of them, so those are skipped while walking instead.
+		settings = ( frozenset( excludeFiles ), frozenset( excludeDirs ), frozenset( found.items( ) ) )
+		searched = _shared_globals.searchedDirectories.setdefault( settings, { } )
+
+		#The build's own directories never have anything in them worth finding.
+		buildDirs = { self.csbuildDir, self.objDir, self.outputDir }
 
 		for sourceDir in [ '.' ] + self.extraDirs:
-			for root, dirnames, filenames in os.walk( sourceDir ):
-				absroot = os.path.abspath( root )
-				if absroot in excludeDirs:
-					if absroot != self.csbuildDir:
-						log.LOG_INFO( "Skipping dir {0}".format( root ) )
-					continue
-				if ".csbuild" in root or self.objDir in root or self.outputDir in root:
-					continue
-				if absroot == self.csbuildDir or absroot.startswith( self.csbuildDir ):
-					continue
-				bFound = False
-				for testDir in excludeDirs:
-					if absroot.startswith( testDir ):
-						bFound = True
-						break
-				if bFound:
-					if not absroot.startswith( self.csbuildDir ):
-						log.LOG_INFO( "Skipping dir {0}".format( root ) )
-					continue
+			absSourceDir = os.path.abspath( sourceDir )
+			if self._is_excluded_dir( absSourceDir, excludeDirs ):
+				log.LOG_INFO( "Skipping dir {0}".format( sourceDir ) )
+				continue
+
+			pending = [( sourceDir, absSourceDir )]
+			while pending:
+				root, absroot = pending.pop( )
 				log.LOG_INFO( "Looking in directory {0}".format( root ) )
-				if sources is not None:
-					for extension in self.cppExtensions:
-						for filename in fnmatch.filter( filenames, '*'+extension ):
-							path = os.path.join( absroot, filename )
-							if path not in excludeFiles:
-								sources.append( os.path.abspath( path ) )
-								self.hasCppFiles = True
-					for extension in self.cExtensions:
-						for filename in fnmatch.filter( filenames, '*'+extension ):
-							path = os.path.join( absroot, filename )
-							if path not in excludeFiles:
-								sources.append( os.path.abspath( path ) )
-
-					sources.sort( key = str.lower )
-
-				if headers is not None:
-					for extension in self.cppHeaderExtensions:
-						for filename in fnmatch.filter( filenames, '*'+extension ):
-							path = os.path.join( absroot, filename )
-							if path not in excludeFiles:
-								headers.append( os.path.abspath( path ) )
-								self.hasCppFiles = True
-				if cHeaders is not None:
-					for extension in self.cHeaderExtensions:
-						for filename in fnmatch.filter( filenames, '*'+extension ):
-							path = os.path.join( absroot, filename )
-							if path not in excludeFiles:
-								cHeaders.append( os.path.abspath( path ) )
-
-				if headers is not None or cHeaders is not None:
-					for extension in self.ambiguousHeaderExtensions:
-						for filename in fnmatch.filter( filenames, '*'+extension ):
-							path = os.path.join( absroot, filename )
-							if path not in excludeFiles:
-								ambiguousHeaders.add( os.path.abspath( path ) )
-
-		if self.hasCppFiles:
-			headers += list(ambiguousHeaders)
-		else:
-			cHeaders += list(ambiguousHeaders)
+				stat = _utils.GetFileStat( absroot )
+				self._sourceDirs[absroot] = stat
+				entry = searched.get( absroot )
+				if entry is None or entry[0] != stat:
+					entry = self._search_directory( absroot, stat, found, excludeFiles, excludeDirs )
+					if _dir_manifest.IsSettled( stat ):
+						searched[absroot] = entry
+				matches, subdirs, hasCppFiles = entry[1:]
+
+				for dirname, path, excluded in subdirs:
+					if path in buildDirs:
+						continue
+					if excluded:
+						log.LOG_INFO( "Skipping dir {0}".format( os.path.join( root, dirname ) ) )
+						continue
+					pending.append( ( os.path.join( root, dirname ), path ) )
 
-		headers.sort( key = str.lower )
+				for path, category in matches:
+					fileLists[category].append( path )
+				if hasCppFiles:
+					self.hasCppFiles = True
 
+		if ambiguousHeaders:
+			#They're C++ headers if there's any C++ in the project, and C headers otherwise.
+			if cHeaders is None or ( self.hasCppFiles and headers is not None ):
+				headers += ambiguousHeaders
+			else:
+				cHeaders += ambiguousHeaders
 
-	def get_full_path( self, headerFile, relativeDir ):
-		if relativeDir in _shared_globals.headerPaths:
-			if headerFile in _shared_globals.headerPaths[relativeDir]:
-				return _shared_globals.headerPaths[relativeDir][headerFile]
-		else:
-			_shared_globals.headerPaths[relativeDir] = {}
+		for fileList in ( sources, headers, cHeaders ):
+			if fileList is not None:
+				fileList.sort( key = str.lower )
 
-		if os.access(headerFile, os.F_OK):
-			_shared_globals.headerPaths[relativeDir][headerFile] = headerFile
-			path = os.path.join(os.getcwd(), headerFile)
-			_shared_globals.headerPaths[relativeDir][headerFile] = path
-			return path
-		else:
-			if relativeDir is not None:
-				path = os.path.join( relativeDir, headerFile )
-				if os.access(path, os.F_OK):
-					return path
 
-			for incDir in self.includeDirs:
-				path = os.path.join( incDir, headerFile )
-				if os.access(path, os.F_OK):
-					_shared_globals.headerPaths[relativeDir][headerFile] = path
-					return path
+	@staticmethod
+	def _search_directory( directory, stat, found, excludeFiles, excludeDirs ):
+		#Everything get_files needs from one directory that doesn't depend on which variant is searching it:
+		#( statKey, [( path, category )], [( dirname, path, excluded )], hasCppFiles )
+		filenames, dirnames = projectSettings._list_directory( directory, stat )
+
+		subdirs = []
+		for dirname in dirnames:
+			if ".csbuild" not in dirname:
+				path = os.path.join( directory, dirname )
+				subdirs.append( ( dirname, path, path in excludeDirs ) )
+
+		matches = []
+		hasCppFiles = False
+		for filename in filenames:
+			name = os.path.normcase( filename )
+			index = name.find( "." )
+			while index != -1:
+				category = found.get( name[index:] )
+				if category is not None:
+					path = os.path.join( directory, filename )
+					if path not in excludeFiles:
+						matches.append( ( path, category ) )
+						if category == _CPP_SOURCE or category == _CPP_HEADER:
+							hasCppFiles = True
+					break
+				index = name.find( ".", index + 1 )
+
+		return stat, matches, subdirs, hasCppFiles
 
-			_shared_globals.headerPaths[relativeDir][headerFile] = ""
-			return ""
 
+	@staticmethod
+	def _list_directory( directory, stat = None ):
+		#Directories that haven't changed since the last run come from the manifest without being listed.
+		manifest = _shared_globals.directoryManifest
+		if manifest is None:
+			return _utils.ListDirectory( directory )
+		return manifest.List( directory, stat )
 
-	def get_included_files( self, headerFile ):
-		headers = []
-		if sys.version_info >= (3, 0):
-			f = open( headerFile, encoding = "latin-1" )
-		else:
-			f = open( headerFile )
-		with f:
-			for line in f:
-				if line[0] != '#':
-					continue
 
-				RMatch = re.search( r"#\s*include\s*[<\"](.*?)[\">]", line )
-				if RMatch is None:
-					continue
+	@staticmethod
+	def _is_excluded_dir( directory, excludeDirs ):
+		for excludeDir in excludeDirs:
+			if directory == excludeDir or directory.startswith( excludeDir + os.sep ):
+				return True
+		return False
 
-				#Don't follow system headers, we should assume those are immutable
-				if "." not in RMatch.group( 1 ):
-					continue
 
-				headers.append( RMatch.group( 1 ) )
+	def get_include_search_dirs( self ):
+		"""Get the project's include directories as absolute paths."""
+		includeDirs = self.includeDirs
+		searchDirs = self._includeSearchDirs
+		if searchDirs is None or searchDirs[0] is not includeDirs:
+			#Relative include directories are relative to the working directory, not wherever the process happens to be.
+			workingDirectory = self.workingDirectory
+			searchDirs = ( includeDirs, tuple( os.path.join( workingDirectory, incDir ) for incDir in includeDirs ) )
+			self._includeSearchDirs = searchDirs
+		return searchDirs[1]
 
-		return headers
 
+	def get_include_graph_key( self ):
+		"""Get the key identifying how this project resolves includes in the shared include graph. Projects and variants
+		with the same working directory and include directories share the files scanned for each other."""
+		return self.workingDirectory, self.get_include_search_dirs( )
 
-	def follow_headers( self, headerFile, allheaders ):
-		"""Follow the headers in a file.
-		First, this will check to see if the given header has been followed already.
-		If it has, it pulls the list from the allheaders global dictionary and returns it.
-		If not, it populates a new allheaders list with follow_headers2, and then adds
-		that to the allheaders dictionary
+
+	def get_full_path( self, headerFile, relativeDir, searchDirs = None ):
 		"""
-		headers = []
+		Find the file an #include directive refers to.
+
+		:param headerFile: File name exactly as written in the directive
+		:type headerFile: str
+
+		:param relativeDir: Directory of the file containing the directive
+		:type relativeDir: str
 
+		:param searchDirs: Absolute include directories to search instead of the project's
+		:type searchDirs: tuple[str]
+
+		:return: Path to the file, or an empty string if it wasn't found
+		:rtype: str
+		"""
+		if searchDirs is None:
+			searchDirs = self.get_include_search_dirs( )
+		return _shared_globals.includeResolver.Resolve( headerFile, ( self.workingDirectory, relativeDir ), searchDirs )
+
+
+	def get_included_files( self, headerFile ):
+		if _shared_globals.includeCache is None:
+			return _utils.GetIncludedFiles( headerFile )
+		return _shared_globals.includeCache.GetIncludes( headerFile, _utils.GetIncludedFiles )
+
+
+	def resolve_includes( self, path ):
+		"""Get the full paths of the files directly included by a file, leaving out any that can't be found."""
+		relativeDir = os.path.dirname( path )
+		paths = []
+		for header in self.get_included_files( path ):
+			#Don't follow system headers, we should assume those are immutable
+			if "." not in header:
+				continue
+			subpath = self.get_full_path( header, relativeDir )
+			if subpath:
+				paths.append( subpath )
+		return paths
+
+
+	def get_header_dependencies( self, headerFile ):
+		"""Follow the headers in a file, recursively, honoring headerRecursionDepth and ignoreExternalHeaders.
+		Returns the result as a mask from the shared include graph; the graph only scans each file once per build.
+		"""
 		if not headerFile:
-			return
+			return 0
 
 		path = self.get_full_path( headerFile, self.workingDirectory )
 
 		if not path:
-			return
+			return 0
 
-		if path in _shared_globals.allheaders:
-			allheaders.update(_shared_globals.allheaders[path])
-			return
+		filterFunc = None
+		if self.ignoreExternalHeaders:
+			workingDirectory = self.workingDirectory
+			filterFunc = lambda subpath: subpath.startswith( workingDirectory )
 
-		headers = self.get_included_files( path )
+		return _shared_globals.includeGraph.GetDependencies( path, self.resolve_includes, self.headerRecursionDepth,
+			filterFunc, self.get_include_graph_key( ) )
 
-		for header in headers:
 
-			#Find the header in the listed includes.
-			subpath = self.get_full_path( header, os.path.dirname( headerFile ) )
+	def follow_headers( self, headerFile, allheaders ):
+		"""Follow the headers in a file, adding the full path of every header it includes, recursively, to allheaders."""
+		graph = _shared_globals.includeGraph
+		allheaders.update( graph.GetPaths( self.get_header_dependencies( headerFile ) ) )
 
-			if self.ignoreExternalHeaders and not subpath.startswith( self.workingDirectory ):
-				continue
 
-			#If we've already looked at this header (i.e., it was included twice) just ignore it
-			if subpath in allheaders:
-				continue
+	def get_recorded_dependencies( self, ofile ):
+		"""
+		Get the headers the compiler reported as dependencies the last time the given object file was built,
+		when the project uses :DependencyMode.CompilerOutput:.
+
+		:param ofile: The object file
+		:type ofile: str
+
+		:return: Set of header paths, or None if no usable dependency file was recorded for the object
+		:rtype: set[str] or None
+		"""
+		if self.dependencyMode != csbuild.DependencyMode.CompilerOutput:
+			return None
+
+		depFile = _utils.GetDepFilePath( ofile )
+		if not os.access( depFile, os.F_OK ):
+			return None
 
-			if subpath in _shared_globals.allheaders:
-				allheaders.update(_shared_globals.allheaders[subpath])
+		try:
+			dependencies = _utils.ParseDepFile( depFile )
+		except (IOError, ValueError):
+			return None
+
+		headers = set()
+		for dependency in dependencies:
+			#The dependency file also lists the file that was compiled (or every file in the chunk); those are checked
+			#on their own and don't belong in the header list.
+			extension = os.path.splitext( dependency )[1]
+			if extension in self.cppExtensions or extension in self.cExtensions:
 				continue
+			#The compiler runs in the working directory, so relative paths are relative to that.
+			headers.add( os.path.normpath( os.path.join( self.workingDirectory, dependency ) ) )
+		return headers
 
-			allheaders.add( subpath )
 
-			theseheaders = set( )
+	def get_unit_dependencies( self, srcFile, ofile ):
+		"""Get the headers a source depends on, as a mask from the shared include graph.
+		Uses the compiler's dependency file for the given object if one was recorded, and follows the headers otherwise.
+		"""
+		headers = self.get_recorded_dependencies( ofile )
+		if headers is None:
+			return self.get_header_dependencies( srcFile )
+		return _shared_globals.includeGraph.GetMask( headers )
 
-			if self.headerRecursionDepth != 1:
-				self.follow_headers2( subpath, theseheaders, 1, headerFile )
 
-			_shared_globals.allheaders.update( { subpath: theseheaders } )
-			allheaders.update(theseheaders)
+	def get_check_object( self, srcFile, ofile = None ):
+		"""Get the object file a source's up-to-date check should be made against.
+		This is the source's own object unless it doesn't exist and the source was last built as part of a chunk.
+		"""
+		if not ofile:
+			ofile = _utils.GetSourceObjPath( self, srcFile )
 
-		_shared_globals.allheaders.update( { path: set( allheaders ) } )
+		if self.useChunks and not _shared_globals.disable_chunks:
+			chunk = self.get_chunk( srcFile )
+			if chunk:
+				log.LOG_INFO("{} belongs to chunk {}".format(srcFile, chunk))
 
+				chunkfile = _utils.GetChunkedObjPath( self, chunk )
 
-	def follow_headers2( self, headerFile, allheaders, n, parent ):
-		"""More intensive, recursive, and cpu-hogging function to follow a header.
-		Only executed the first time we see a given header; after that the information is cached."""
-		headers = []
+				log.LOG_INFO("Checking for chunk file {}...".format(chunkfile))
+				#First check: If the object file doesn't exist, we obviously have to create it.
+				if not os.access(ofile , os.F_OK):
+					ofile = chunkfile
 
-		if not headerFile:
+		return ofile
+
+
+	def get_fingerprint_commands( self, project ):
+		"""
+		Get the base C and C++ commands for a project as they would be without any defines, undefines, or include
+		directories. Each of those is checked separately for every file, against what the file actually uses.
+
+		:param project: The project, or the settings for a file with overridden settings
+		:type project: projectSettings
+
+		:return: ( C command, C++ command )
+		:rtype: tuple[str, str]
+		"""
+		defines = project.defines
+		undefines = project.undefines
+		includeDirs = project.includeDirs
+		project.defines = []
+		project.undefines = []
+		project.includeDirs = []
+		try:
+			compiler = self.activeToolchain.Compiler()
+			return compiler.GetBaseCcCommand( project ), compiler.GetBaseCxxCommand( project )
+		finally:
+			project.defines = defines
+			project.undefines = undefines
+			project.includeDirs = includeDirs
+
+
+	def get_base_command( self, srcFile, for_precompiled_header = False, for_fingerprint = False ):
+		"""
+		Get the base command a file is compiled with, taking per-file overrides into account.
+
+		:param srcFile: The file to be compiled
+		:type srcFile: str
+
+		:param for_precompiled_header: Whether the file is a precompiled header
+		:type for_precompiled_header: bool
+
+		:param for_fingerprint: If True, get the command as returned by get_fingerprint_commands. Precompiled headers
+			always get the full command.
+		:type for_fingerprint: bool
+
+		:return: ( base command, True if the file is compiled as C rather than C++ )
+		:rtype: tuple[str, bool]
+		"""
+		isC = "." + srcFile.rsplit( ".", 1 )[1] in self.cExtensions or srcFile == self.cHeaderFile
+		if not for_precompiled_header and for_fingerprint:
+			return self._fingerprintOverrideCmds.get( srcFile, self._fingerprintCmds )[0 if isC else 1], isC
+
+		if isC:
+			if for_precompiled_header:
+				return self.ccpcOverrideCmds.get( srcFile, self.ccpccmd ), True
+			return self.ccOverrideCmds.get( srcFile, self.ccCmd ), True
+
+		if for_precompiled_header:
+			return self.cxxpcOverrideCmds.get( srcFile, self.cxxpccmd ), False
+		return self.cxxOverrideCmds.get( srcFile, self.cxxCmd ), False
+
+
+	def get_macros( self, srcFile ):
+		"""
+		Get the macros defined and undefined on the command line a file is compiled with.
+
+		:param srcFile: The file to be compiled
+		:type srcFile: str
+
+		:return: { name : definition as passed to the compiler }, with None as the definition of undefined names
+		:rtype: dict[str, str]
+		"""
+		project = self.fileOverrideSettings.get( srcFile, self )
+		macros = {}
+		for define in project.defines:
+			macros[define.split( "=", 1 )[0].strip( )] = define
+		for undefine in project.undefines:
+			macros[undefine] = None
+		return macros
+
+
+	def get_macro_change( self, srcFile, ofile, recordedMacros ):
+		"""
+		Find the first macro whose definition on the command line has changed since a file was last compiled that could
+		affect the file's object.
+
+		Only the source, the headers it includes, and the precompiled header it's compiled against are searched for
+		uses of each changed macro, so any macro with a reserved name, or NDEBUG, is assumed to be used by system
+		headers and always affects the object. Any other changed macro does too if the search can't cover everything the
+		file includes: if an include couldn't be found, as system headers usually can't, or wasn't followed, or was left
+		out of the compiler's dependency file. Macros only ever named through token pasting aren't seen.
+
+		:param srcFile: The file to be compiled
+		:type srcFile: str
+
+		:param ofile: The object file the source was last compiled to
+		:type ofile: str
+
+		:param recordedMacros: The macros recorded when the file was last compiled
+		:type recordedMacros: dict[str, str]
+
+		:return: The name of a macro affecting the object, or None if no change matters
+		:rtype: str or None
+		"""
+		macros = self.get_macros( srcFile )
+		if macros == recordedMacros:
+			return None
+
+		changed = set( )
+		for name in set( macros ) | set( recordedMacros ):
+			if macros.get( name, "" ) != recordedMacros.get( name, "" ):
+				if name == "NDEBUG" or name.startswith( "__" ) or ( name[:1] == "_" and name[1:2].isupper( ) ):
+					return name
+				changed.add( name.encode( "utf-8" ) )
+
+		graph = _shared_globals.includeGraph
+		recordedHeaders = self.get_recorded_dependencies( ofile )
+		if recordedHeaders is None:
+			paths = [srcFile] + graph.GetPaths( self.get_header_dependencies( srcFile ) )
+		else:
+			paths = [srcFile] + sorted( recordedHeaders )
+		isC = self.get_base_command( srcFile )[1]
+		if self.uses_precompiled_header( isC ):
+			for header in self.get_precompiled_headers( )[1 if isC else 0]:
+				paths.append( header )
+				paths += graph.GetPaths( self.get_header_dependencies( header ) )
+
+		for path in paths:
+			try:
+				used = changed.intersection( _utils.GetFileIdentifiers( path ) )
+			except IOError:
+				return changed.pop( ).decode( "utf-8" )
+			if used:
+				return used.pop( ).decode( "utf-8" )
+
+		if self.has_unfollowed_includes( paths ):
+			#Some of what the file includes wasn't searched, and could use any of the macros.
+			return changed.pop( ).decode( "utf-8" )
+		return None
+
+
+	def has_unfollowed_includes( self, paths ):
+		"""
+		Check whether any of the given files includes something that isn't among them: a header that can't be found in
+		the project's include directories, such as a system header, or one that was never reached, whether because of
+		headerRecursionDepth or ignoreExternalHeaders or because the compiler left it out of its dependency file.
+
+		:param paths: Files to check, which should be everything they include
+		:type paths: list[str]
+
+		:return: True if anything they include is missing from them
+		:rtype: bool
+		"""
+		known = set( paths )
+		for path in paths:
+			relativeDir = os.path.dirname( path )
+			try:
+				headers = self.get_included_files( path )
+			except IOError:
+				return True
+			for header in headers:
+				if self.get_full_path( header, relativeDir ) not in known:
+					return True
+		return False
+
+
+	def uses_precompiled_header( self, isC ):
+		"""Whether sources in the given language are compiled against the project's precompiled header."""
+		if isC:
+			return bool( ( self.chunkedPrecompile and self.cHeaders ) or self.precompileAsC )
+		return bool( self.precompile or self.chunkedPrecompile )
+
+
+	def get_precompiled_headers( self ):
+		"""
+		Get the headers that go into the project's precompiled headers.
+
+		:return: ( headers in the C++ precompiled header, headers in the C precompiled header ), both empty if
+			precompiling is disabled
+		:rtype: tuple[list[str], list[str]]
+		"""
+		if _shared_globals.disable_precompile or not ( self.chunkedPrecompile or self.precompile or self.precompileAsC ):
+			return [], []
+		if self.chunkedPrecompile:
+			return self.cppHeaders, self.cHeaders
+		if not self.hasCppFiles:
+			return [], self.precompile + self.precompileAsC
+		return self.precompile, self.precompileAsC
+
+
+	def get_command_fingerprint( self, srcFile, for_precompiled_header = False ):
+		"""
+		Get a fingerprint of everything about the way a file is compiled that isn't one of its inputs: the toolchain
+		and architecture, the base command including any per-file override, and the contents of the precompiled header
+		it's compiled against. If this differs from the fingerprint recorded when the file was last compiled, the file
+		has to be compiled again.
+
+		Defines, undefines, and include directories are left out for everything but precompiled headers, and checked by
+		get_macro_change and get_include_change instead.
+
+		:param srcFile: The file to be compiled
+		:type srcFile: str
+
+		:param for_precompiled_header: Whether the file is a precompiled header
+		:type for_precompiled_header: bool
+
+		:return: The fingerprint
+		:rtype: bytes
+		"""
+		baseCommand, isC = self.get_base_command( srcFile, for_precompiled_header, True )
+		precompiledHeaders = ()
+		if for_precompiled_header or self.uses_precompiled_header( isC ):
+			precompiledHeaders = tuple( self.get_precompiled_headers( )[1 if isC else 0] )
+		searchDirs = ()
+		if for_precompiled_header:
+			searchDirs = self.get_include_search_dirs( )
+
+		key = ( baseCommand, precompiledHeaders, searchDirs )
+		fingerprint = self._commandFingerprints.get( key )
+		if fingerprint is None:
+			hasher = _utils.GetFileHasher( )[1]( )
+			for part in ( self.activeToolchainName, self.outputArchitecture, baseCommand ) + precompiledHeaders + searchDirs:
+				hasher.update( part.encode( "utf-8" ) )
+				hasher.update( b"\0" )
+			fingerprint = hasher.digest( )
+			self._commandFingerprints[key] = fingerprint
+		return fingerprint
+
+
+	def command_changed( self, srcFile, for_precompiled_header = False ):
+		"""Checks whether a file would be compiled differently than it was the last time it was compiled successfully."""
+		recorded = self.get_hash_database( ).commands.get( srcFile )
+		return recorded is None or recorded[0] != self.get_command_fingerprint( srcFile, for_precompiled_header )
+
+
+	def get_include_change( self, srcFile, recordedDirs ):
+		"""
+		Find an #include in a file, or in anything it includes, that resolves to a different file under the project's
+		include directories than it did under the ones the file was last compiled with. Only the files reached through
+		the old include directories need to be checked; as long as every include in those resolves the same way, the
+		file includes exactly the same headers as before.
+
+		:param srcFile: The file to be compiled
+		:type srcFile: str
+
+		:param recordedDirs: The absolute include directories recorded when the file was last compiled
+		:type recordedDirs: tuple[str]
+
+		:return: ( including file, name as written in the directive ) for the first include found that resolves
+			differently, or None if they all resolve the same way
+		:rtype: tuple[str, str] or None
+		"""
+		searchDirs = self.get_include_search_dirs( )
+		if recordedDirs == searchDirs:
+			return None
+
+		includeChanges = self._includeChanges
+		visited = { srcFile }
+		frontier = [srcFile]
+		while frontier:
+			path = frontier.pop( )
+			key = ( recordedDirs, path )
+			result = includeChanges.get( key )
+			if result is None:
+				change = None
+				paths = []
+				relativeDir = os.path.dirname( path )
+				try:
+					names = self.get_included_files( path )
+				except ( IOError, OSError ):
+					#A file that's gone is caught by the header checks.
+					names = []
+				for name in names:
+					oldPath = self.get_full_path( name, relativeDir, recordedDirs )
+					if oldPath != self.get_full_path( name, relativeDir, searchDirs ):
+						change = ( path, name )
+						break
+					if oldPath:
+						paths.append( oldPath )
+				result = ( change, paths )
+				includeChanges[key] = result
+
+			if result[0] is not None:
+				return result[0]
+			for subpath in result[1]:
+				if subpath not in visited:
+					visited.add( subpath )
+					frontier.append( subpath )
+		return None
+
+
+	def get_dependency_settings_key( self ):
+		"""Settings that change which headers are recorded for each source; the dependency index is discarded if they
+		don't match. Changes to the include directories are checked for each source instead, by get_include_change."""
+		return ( self.dependencyMode, self.headerRecursionDepth, self.ignoreExternalHeaders )
+
+
+	def get_hash_database( self ):
+		"""Get the project's hash database, loading it the first time it's needed."""
+		if self._hashDatabase is None:
+			filename = os.path.join( self.csbuildDir, "{}.csdb".format( self.targetName ) )
+			settingsKey = self.get_dependency_settings_key( )
+			hasherName = _utils.GetDigestName( self.sourceNormalization )
+			#A build daemon keeps databases loaded between builds; all that's needed then is to check what's changed.
+			hashDatabase = _shared_globals.hashDatabases.get( filename )
+			if hashDatabase is not None and hashDatabase.settingsKey == settingsKey and hashDatabase.hasherName == hasherName:
+				hashDatabase.Refresh( )
+			else:
+				hashDatabase = _hash_db.HashDatabase( filename )
+				hashDatabase.Load( settingsKey, hasherName )
+				_shared_globals.hashDatabases[filename] = hashDatabase
+			self._hashDatabase = hashDatabase
+		return self._hashDatabase
+
+
+	def file_changed( self, path ):
+		"""Checks whether a file's contents differ from what was recorded at the end of the last build.
+		Files whose stat still matches the record aren't read."""
+		record = self.get_hash_database( ).files.get( path )
+		if record is None:
+			return True
+		if _utils.GetFileStat( path ) == record[0]:
+			return False
+		return _utils.GetFileDigest( path, self.sourceNormalization ) != record[1]
+
+
+	def mark_sources_pending( self ):
+		"""Forget how every source that's about to be compiled was compiled before, before any of them are. A source
+		that compiles records its headers as up to date, and if the build is interrupted, the other sources sharing
+		those headers would otherwise look up to date too. Nothing's needed for the sources that aren't being compiled:
+		if any of their headers had changed, they would be."""
+		hashDatabase = self._hashDatabase
+		if hashDatabase is None or not self.sources:
 			return
+		for source in self.sources:
+			hashDatabase.RemoveCommand( source )
+		hashDatabase.Flush( )
 
-		path = self.get_full_path( headerFile, os.path.dirname( parent ) )
 
-		if not path:
+	def journal_unit( self, chunk ):
+		"""Record a chunk or source that has just compiled successfully the same way save_hashes will, and get it onto
+		the disk right away, so it isn't compiled again if the build is interrupted before it finishes."""
+		hashDatabase = self._hashDatabase
+		if hashDatabase is None:
 			return
 
-		if path in _shared_globals.allheaders:
-			allheaders.update(_shared_globals.allheaders[path])
+		graph = _shared_globals.includeGraph
+		for source in self.chunksByFile.get( chunk, [chunk] ):
+			headerMask = self._unitDependencies.get( source )
+			if headerMask is None:
+				headerMask = self.get_unit_dependencies( source, self.get_check_object( source ) )
+			headers = tuple( graph.GetPaths( headerMask ) )
+
+			records = []
+			for path in ( source, ) + headers:
+				stat = _utils.GetFileStat( path )
+				if stat is None:
+					break
+				records.append( ( path, stat, _utils.GetFileDigest( path, self.sourceNormalization ) ) )
+			else:
+				for path, stat, digest in records:
+					hashDatabase.SetFile( path, stat, digest )
+				hashDatabase.SetCommand( source, self.get_command_fingerprint( source ), self.get_macros( source ),
+					self.get_include_search_dirs( ) )
+				hashDatabase.SetUnit( source, headers )
+
+		hashDatabase.Flush( )
+
+
+	def save_hashes( self ):
+		"""Record the state of every input file, and the header dependencies of every source that's up to date, at the
+		end of the build. Sources whose compile failed or never ran, and the headers they depend on, keep their old
+		records so the next build still sees them as changed."""
+		hashDatabase = self._hashDatabase
+		if hashDatabase is None:
 			return
 
-		headers = self.get_included_files( path )
+		failed = set( )
+		for chunk in self._finalChunkSet:
+			if self.fileStatus.get( os.path.normcase( chunk ) ) != _shared_globals.ProjectState.FINISHED:
+				failed.update( self.chunksByFile.get( chunk, [chunk] ) )
+
+		#Every source that didn't fail is up to date with the current command, including any that were skipped because
+		#none of the macros that changed affect them.
+		for source in self.allsources:
+			if source not in failed:
+				hashDatabase.SetCommand( source, self.get_command_fingerprint( source ), self.get_macros( source ),
+					self.get_include_search_dirs( ) )
+
+		for headerFile, needsPrecompile in ( ( self.cppHeaderFile, self.needsPrecompileCpp ),
+				( self.cHeaderFile, self.needsPrecompileC ) ):
+			if needsPrecompile and self.fileStatus.get( os.path.normcase( headerFile ) ) == _shared_globals.ProjectState.FINISHED:
+				hashDatabase.SetCommand( headerFile, self.get_command_fingerprint( headerFile, True ) )
+
+		#If every source was skipped using the database and nothing else has changed, it's still accurate as it stands.
+		if not self.sources and not self._unitDependencies and not hashDatabase.changedFiles \
+				and len( hashDatabase.units ) == len( self.allsources ):
+			hashDatabase.Flush( )
+			return
 
-		for header in headers:
-			subpath = self.get_full_path( header, os.path.dirname( headerFile ) )
+		graph = _shared_globals.includeGraph
+		compiled = set( self.sources )
+		units = {}
+		unchanged = set( )
+		for source in self.allsources:
+			headerMask = self._unitDependencies.get( source )
+			if headerMask is not None:
+				headers = graph.GetPaths( headerMask )
+			elif source not in compiled and source in hashDatabase.units:
+				#Skipped using the database, so nothing it depends on has changed.
+				headers = hashDatabase.units[source]
+			elif source in failed:
+				headers = hashDatabase.units.get( source, () )
+			else:
+				#Compiled without ever getting as far as checking its headers.
+				headers = graph.GetPaths( self.get_unit_dependencies( source, self.get_check_object( source ) ) )
 
-			if self.ignoreExternalHeaders and not subpath.startswith( self.workingDirectory ):
+			if source in failed:
+				unchanged.add( source )
+				unchanged.update( headers )
+			else:
+				units[source] = tuple( headers )
+
+		paths = set( self.allsources )
+		paths.update( self.allheaders )
+		paths.update( self.allPaths )
+		for headers in units.values( ):
+			paths.update( headers )
+		paths -= unchanged
+
+		files = hashDatabase.files
+		for path in paths:
+			stat = _utils.GetFileStat( path )
+			if stat is None:
+				hashDatabase.RemoveFile( path )
 				continue
-
-				#Check to see if we've already followed this header.
-			#If we have, the list we created from it is already stored in _allheaders under this header's key.
-			if subpath in allheaders:
+			record = files.get( path )
+			if record is not None and record[0] == stat:
 				continue
+			hashDatabase.SetFile( path, stat, _utils.GetFileDigest( path, self.sourceNormalization ) )
+
+		for source in self.allsources:
+			headers = units.get( source )
+			#A source is only known to be up to date if everything it depends on was recorded along with it.
+			if headers is None or source not in files or not all( header in files for header in headers ):
+				hashDatabase.RemoveUnit( source )
+			else:
+				hashDatabase.SetUnit( source, headers )
+
+		hashDatabase.Flush( )
+
+
+	def has_build_steps( self ):
+		"""Checks whether the makefile or any tool in the active toolchain adds its own steps to the build."""
+		for name in _buildSteps:
+			if getattr( self, name ):
+				return True
+			for tool in self.activeToolchain.tools.values( ):
+				step = getattr( type( tool ), name, None )
+				step = getattr( step, "__func__", step )
+				if step is not None and step is not toolchain.compilerBase.__dict__.get( name ) \
+						and step is not toolchain.linkerBase.__dict__.get( name ):
+					return True
+		return False
+
+
+	def get_build_snapshot( self ):
+		"""Get the stat of everything the up-to-date checks look at after a successful build: the recorded input files
+		(as recorded), the directories searched for sources, the objects, and the output. As long as none of them have
+		changed, building the project again would do nothing. Returns None if the project has build steps of its own,
+		since there's no telling what those depend on."""
+		if self.has_build_steps( ):
+			return None
+
+		hashDatabase = self.get_hash_database( )
+		snapshot = {}
+		for directory, stat in self._sourceDirs.items( ):
+			#The build writes to the output and object directories itself, so they can only be compared as they are now.
+			if directory == self.outputDir or directory == self.objDir or directory.startswith( self.objDir + os.sep ):
+				stat = _utils.GetFileStat( directory )
+			snapshot[directory] = stat
+		for path, record in hashDatabase.files.items( ):
+			snapshot[path] = record[0]
+
+		outputs = [hashDatabase.filename, os.path.join( self.outputDir, self.outputName )]
+		outputs += self.libraryLocations
+		outputs += self.extraObjs
+		for source in self.allsources:
+			outputs.append( _utils.GetSourceObjPath( self, source ) )
+		for chunk in self.chunks:
+			if type( chunk ) == list:
+				outputs.append( _utils.GetChunkedObjPath( self, chunk ) )
+		if self.unity:
+			outputs.append( _utils.GetUnityChunkObjPath( self ) )
+		for headerFile in ( self.cppHeaderFile, self.cHeaderFile ):
+			if headerFile:
+				outputs.append( headerFile )
+				outputs.append( self.activeToolchain.Compiler( ).GetPchFile( headerFile ) )
+
+		for path in outputs:
+			snapshot[path] = _utils.GetFileStat( path )
+		return snapshot
 
-			if subpath in _shared_globals.allheaders:
-				allheaders.update(_shared_globals.allheaders[subpath])
+
+	def get_watch_dirs( self ):
+		"""Get the directories --watch has to keep an eye on for this project: the ones searched for its sources, and
+		its include directories."""
+		return [self.workingDirectory] + self.extraDirs + list( self.get_include_search_dirs( ) )
+
+
+	def reset_build_state( self ):
+		"""Put back everything a build keeps track of while it runs, so the project can be built again in the same
+		process. The files found when the build was prepared are left as they are."""
+		self.sources = []
+		self._finalChunkSet = []
+		self.chunksByFile = {}
+		self.splitChunks = {}
+		self._unitDependencies = {}
+		self._builtSomething = False
+		self.libraryLocations = []
+		self.needsPrecompileC = False
+		self.needsPrecompileCpp = False
+		self.cPchContents = []
+		self.cppPchContents = []
+		self.precompileDone = False
+		self.precompileFailed = False
+		self.compilationCompleted = 0
+		self.compilationFailed = False
+
+		self.state = _shared_globals.ProjectState.PENDING
+		self.startTime = 0
+		self.buildEnd = 0
+		self.linkQueueStart = 0
+		self.linkStart = 0
+		self.endTime = 0
+		self.compileOutput = {}
+		self.compileErrors = {}
+		self.parsedErrors = {}
+		self.fileStatus = {}
+		self.fileStart = {}
+		self.fileEnd = {}
+		self.updated = False
+		self.warnings = 0
+		self.errors = 0
+		self.warningsByFile = {}
+		self.errorsByFile = {}
+		self.times = {}
+		self.summedTimes = {}
+		self.linkCommand = ""
+		self.compileCommands = {}
+		self.linkOutput = ""
+		self.linkErrors = ""
+		self.parsedLinkErrors = None
+
+
+	def is_discoverable( self, path ):
+		"""Checks whether get_files would find a file at the given path, apart from its extension."""
+		directory = os.path.dirname( path )
+		for sourceDir in [self.workingDirectory] + self.extraDirs:
+			sourceDir = os.path.abspath( sourceDir )
+			if directory == sourceDir or directory.startswith( sourceDir + os.sep ):
+				break
+		else:
+			return False
+		excludeDirs = set( )
+		for exclude in self.excludeDirs:
+			excludeDirs |= set( os.path.abspath( excludeDir ) for excludeDir in glob.glob( exclude ) )
+		if self._is_excluded_dir( directory, excludeDirs ):
+			return False
+		buildDirs = { self.csbuildDir, self.objDir, self.outputDir }
+		while directory != sourceDir:
+			if ".csbuild" in os.path.basename( directory ) or directory in buildDirs:
+				return False
+			directory = os.path.dirname( directory )
+		for exclude in self.excludeFiles:
+			if path in glob.glob( exclude ):
+				return False
+		return True
+
+
+	def apply_file_changes( self, changedPaths ):
+		"""
+		Bring the project up to date with files that --watch has seen change since the last build, and set its sources
+		to the ones that have to be compiled because of them. The sources affected by a changed file are found with the
+		header dependencies recorded by the last build, so only the files that actually changed are looked at.
+
+		:param changedPaths: Absolute paths of every file that has been modified, created, or deleted
+		:type changedPaths: set[str]
+
+		:return: Whether the project needs to be built
+		:rtype: bool
+		"""
+		hashDatabase = self.get_hash_database( )
+
+		knownSources = set( self.allsources )
+		knownHeaders = set( self.allheaders )
+		added = []
+		removed = set( )
+		movedNames = set( )
+		headersChanged = False
+		for path in changedPaths:
+			exists = os.access( path, os.F_OK )
+			if path in knownSources or path in knownHeaders:
+				if exists:
+					continue
+				if path in knownSources:
+					removed.add( path )
+				else:
+					self.allheaders.remove( path )
+					for headers in ( self.cppHeaders, self.cHeaders ):
+						if path in headers:
+							headers.remove( path )
+					headersChanged = True
+				movedNames.add( os.path.basename( path ) )
 				continue
 
-			allheaders.add( subpath )
+			if not exists or self.forceChunks or not self.is_discoverable( path ):
+				continue
+			extension = os.path.splitext( path )[1]
+			if extension in self.cppExtensions or extension in self.cExtensions:
+				log.LOG_INFO( "Found new file {}".format( path ) )
+				added.append( path )
+				if extension in self.cppExtensions:
+					self.hasCppFiles = True
+			elif extension in self.cppHeaderExtensions or extension in self.cHeaderExtensions \
+					or extension in self.ambiguousHeaderExtensions:
+				log.LOG_INFO( "Found new file {}".format( path ) )
+				if extension in self.cHeaderExtensions or ( extension in self.ambiguousHeaderExtensions
+						and not self.hasCppFiles ):
+					self.cHeaders.append( path )
+				else:
+					self.cppHeaders.append( path )
+				self.allheaders.append( path )
+				headersChanged = True
+			else:
+				continue
+			movedNames.add( os.path.basename( path ) )
+
+		rebuild = set( added )
+		if added or removed:
+			for source in removed:
+				log.LOG_INFO( "{} has been deleted".format( source ) )
+				hashDatabase.RemoveUnit( source )
+				hashDatabase.RemoveCommand( source )
+				hashDatabase.RemoveFile( source )
+
+			self.allsources = [source for source in self.allsources if source not in removed] + added
+			self.allsources.sort( key = str.lower )
+			self.make_obj_dirs( added )
+			if len( self.chunks ) == 1 and ( _shared_globals.disable_chunks or not self.useChunks or self.unity ):
+				self.chunks = [self.allsources]
+			else:
+				chunks = []
+				for chunk in self.chunks:
+					remaining = [source for source in chunk if source not in removed]
+					#A chunk's object is named after the files in it, so whatever's left of the chunk can't use it.
+					if len( remaining ) != len( chunk ) and len( chunk ) > 1:
+						rebuild.update( remaining )
+					if remaining:
+						chunks.append( remaining )
+				chunks += [[source] for source in added]
+				self.chunks = chunks
+			#Even if nothing gets compiled, the output no longer has the right set of objects in it.
+			self._builtSomething = True
+
+		if headersChanged:
+			self.allheaders.sort( key = str.lower )
+
+		#A new file can hide another file with the same name that used to be found by an #include, and a deleted one
+		#can uncover one.
+		if movedNames:
+			for source, headers in hashDatabase.units.items( ):
+				for header in headers:
+					if os.path.basename( header ) in movedNames:
+						rebuild.add( source )
+						break
 
-			theseheaders = set( allheaders )
+		#Files that were only touched, or only had their comments edited, haven't changed as far as the build is concerned.
+		files = hashDatabase.files
+		changed = [path for path in changedPaths
+			if path in files and ( not os.access( path, os.F_OK ) or self.file_changed( path ) )]
+		hashDatabase.MarkChanged( changed )
+		rebuild.update( hashDatabase.dirtyUnits )
 
-			if self.headerRecursionDepth == 0 or n < self.headerRecursionDepth:
-				self.follow_headers2( subpath, theseheaders, n + 1, headerFile )
+		#Anything that didn't build the last time around still needs to, and there's no telling what it depends on.
+		units = hashDatabase.units
+		for source in self.allsources:
+			if source not in units:
+				rebuild.add( source )
 
-			_shared_globals.allheaders.update( { subpath: theseheaders } )
-			allheaders.update(theseheaders)
+		self.sources = [source for source in self.allsources if source in rebuild]
+		_shared_globals.allfiles |= set( self.sources )
+		return bool( self.sources ) or self._builtSomething
 
 
 	def should_recompile( self, srcFile, ofile = None, for_precompiled_header = False ):
@@ -1414,35 +2218,45 @@ class projectSettings( object ):
 		log.LOG_INFO( "Checking whether to recompile {0}...".format( srcFile ) )
 
 		if self.recompileAll:
-			log.LOG_INFO(
-				"Going to recompile {0} because settings have changed in the makefile that will impact output.".format(
-					srcFile ) )
+			log.LOG_INFO( "Going to recompile {0} because a full rebuild was requested.".format( srcFile ) )
 			return True
 
-		if not ofile:
-			ofile = _utils.GetSourceObjPath( self, srcFile )
-
-		if self.useChunks and not _shared_globals.disable_chunks:
-			chunk = self.get_chunk( srcFile )
-			if chunk:
-				log.LOG_INFO("{} belongs to chunk {}".format(srcFile, chunk))
-
-				chunkfile = _utils.GetChunkedObjPath( self, chunk )
-
-				log.LOG_INFO("Checking for chunk file {}...".format(chunkfile))
-				#First check: If the object file doesn't exist, we obviously have to create it.
-				if not os.access(ofile , os.F_OK):
-					ofile = chunkfile
+		ofile = self.get_check_object( srcFile, ofile )
 
 		if not os.access(ofile , os.F_OK):
 			log.LOG_INFO(
 				"Going to recompile {0} because the associated object file does not exist.".format( srcFile ) )
 			return True
 
+		if not for_precompiled_header:
+			if self.command_changed( srcFile ):
+				log.LOG_INFO(
+					"Going to recompile {0} because the settings it's compiled with have changed in the makefile.".format(
+						srcFile ) )
+				return True
+
+			record = self.get_hash_database( ).commands[srcFile]
+			macro = self.get_macro_change( srcFile, ofile, record[1] )
+			if macro is not None:
+				log.LOG_INFO( "Going to recompile {0} because the definition of {1} has changed.".format( srcFile, macro ) )
+				return True
+
+			include = self.get_include_change( srcFile, record[2] )
+			if include is not None:
+				log.LOG_INFO( "Going to recompile {0} because #include \"{2}\" in {1} now finds a different file.".format(
+					srcFile, *include ) )
+				return True
+
+		#Second check: the last build's hash database.
+		#If neither the source nor any header it depended on last time has been touched, there's nothing else to check.
+		if not for_precompiled_header and self.get_hash_database( ).IsUpToDate( srcFile ):
+			log.LOG_INFO( "Skipping {0}: Already up to date".format( srcFile ) )
+			return False
+
 		#Third check: modified time.
 		#If the source file is newer than the object file, we assume it's been changed and needs to recompile.
-		mtime = os.path.getmtime( srcFile )
-		omtime = os.path.getmtime( ofile )
+		mtime = _utils.GetModifiedTime( srcFile )
+		omtime = _utils.GetModifiedTime( ofile )
 
 		if mtime > omtime:
 			if for_precompiled_header:
@@ -1451,38 +2265,7 @@ class projectSettings( object ):
 						srcFile ) )
 				return True
 
-			oldmd5 = 1
-			newmd5 = 9
-
-			try:
-				newmd5 = _shared_globals.newmd5s[srcFile]
-			except KeyError:
-				with open( srcFile, "r" ) as f:
-					newmd5 = _utils.GetMd5( f )
-				_shared_globals.newmd5s.update( { srcFile: newmd5 } )
-
-			if platform.system( ) == "Windows":
-				src = srcFile[2:]
-			else:
-				src = srcFile
-
-			if sys.version_info >= (3,0):
-				src = src.encode("utf-8")
-				baseName = os.path.basename( src ).decode("utf-8")
-			else:
-				baseName = os.path.basename( src )
-
-			md5file = "{}.md5".format( os.path.join( self.csbuildDir, "md5s", hashlib.md5( src ).hexdigest(), baseName ) )
-
-			if os.access(md5file , os.F_OK):
-				try:
-					oldmd5 = _shared_globals.oldmd5s[md5file]
-				except KeyError:
-					with open( md5file, "rb" ) as f:
-						oldmd5 = f.read( )
-					_shared_globals.oldmd5s.update( { md5file: oldmd5 } )
-
-			if oldmd5 != newmd5:
+			if self.file_changed( srcFile ):
 				log.LOG_INFO(
 					"Going to recompile {0} because it has been modified since the last successful build.".format(srcFile ) )
 				return True
@@ -1490,87 +2273,40 @@ class projectSettings( object ):
 		#Fourth check: Header files
 		#If any included header file (recursive, to include headers included by headers) has been changed,
 		#then we need to recompile every source that includes that header.
-		#Follow the headers for this source file and find out if any have been changed o necessitate a recompile.
-		headers = set()
-
-		self.follow_headers( srcFile, headers )
-
-		updatedheaders = []
-
-		for header in headers:
-			if not header:
-				continue
-
-			path = header
-
-			if header in _shared_globals.headerCheck:
-				b = _shared_globals.headerCheck[header]
-				if b:
-					updatedheaders.append( [header, path] )
-				else:
-					continue
-
-
-			header_mtime = os.path.getmtime( path )
+		#If the compiler recorded the dependencies the last time this object was built, those are exact, so use them.
+		#Otherwise, follow the headers for this source file and find out if any have been changed o necessitate a recompile.
+		graph = _shared_globals.includeGraph
+		headerMask = self.get_unit_dependencies( srcFile, ofile )
+		if not for_precompiled_header:
+			self._unitDependencies[srcFile] = headerMask
+
+		def header_changed( path ):
+			#Headers recorded by the compiler may have been deleted since.
+			if not os.access( path, os.F_OK ):
+				return True
 
-			if header_mtime > omtime:
-				if for_precompiled_header:
-					updatedheaders.append( [header, path] )
-					_shared_globals.headerCheck[header] = True
-					continue
+			header_mtime = _utils.GetModifiedTime( path )
 
-				#newmd5 is 0, oldmd5 is 1, so that they won't report equal if we ignore them.
-				newmd5 = 0
-				oldmd5 = 1
+			if header_mtime <= omtime:
+				return False
 
-				if platform.system( ) == "Windows":
-					header = header[2:]
+			if for_precompiled_header:
+				return True
 
-				if sys.version_info >= (3,0):
-					header = header.encode("utf-8")
-					baseName = os.path.basename( header ).decode("utf-8")
-				else:
-					baseName = os.path.basename( header )
-
-				md5file = "{}.md5".format( os.path.join( self.csbuildDir, "md5s", hashlib.md5( header ).hexdigest(), baseName ) )
-
-				if os.access(md5file , os.F_OK):
-					try:
-						newmd5 = _shared_globals.newmd5s[path]
-					except KeyError:
-						if sys.version_info >= (3, 0):
-							f = open( path, encoding = "latin-1" )
-						else:
-							f = open( path )
-						with f:
-							newmd5 = _utils.GetMd5( f )
-						_shared_globals.newmd5s.update( { path: newmd5 } )
-					if os.access(md5file , os.F_OK):
-						try:
-							oldmd5 = _shared_globals.oldmd5s[md5file]
-						except KeyError:
-							with open( md5file, "rb" ) as f:
-								oldmd5 = f.read( )
-							_shared_globals.oldmd5s.update( { md5file: oldmd5 } )
-
-				if oldmd5 != newmd5:
-					updatedheaders.append( [header, path] )
-					_shared_globals.headerCheck[header] = True
-					continue
+			return self.file_changed( path )
 
-			_shared_globals.headerCheck[header] = False
+		#Each header is only checked the first time it turns up; the graph remembers the result for everything else.
+		updatedheaders = graph.GetPaths( graph.GetChangedMask( headerMask, header_changed ) )
 
 		if updatedheaders:
-			files = []
-			for pair in updatedheaders:
-				files.append( pair[0] )
-				path = pair[1]
-				if path not in self.allPaths:
-					self.allPaths.append( os.path.abspath( path ) )
+			with self.mutex:
+				for path in updatedheaders:
+					if path not in self.allPaths:
+						self.allPaths.append( os.path.abspath( path ) )
 			log.LOG_INFO(
 				"Going to recompile {0} because included headers {1} have been modified since the last successful build."
 				.format(
-					srcFile, files ) )
+					srcFile, updatedheaders ) )
 			return True
 
 		#If we got here, we assume the object file's already up to date.
@@ -1646,11 +2382,15 @@ class projectSettings( object ):
 		if newFile in self.chunkExcludes:
 			return False #NEVER ok to join chunk with this file!
 
+		chunkMutexes = self.chunkMutexes
+		if not chunkMutexes:
+			return True
+
 		for sourceFile in chunk:
-			if newFile in self.chunkMutexes and sourceFile in self.chunkMutexes[newFile]:
+			if newFile in chunkMutexes and sourceFile in chunkMutexes[newFile]:
 				log.LOG_INFO("Rejecting {} for this chunk because it is labeled as mutually exclusive with {} for chunking".format(newFile, sourceFile))
 				return False
-			if sourceFile in self.chunkMutexes and newFile in self.chunkMutexes[sourceFile]:
+			if sourceFile in chunkMutexes and newFile in chunkMutexes[sourceFile]:
 				log.LOG_INFO("Rejecting {} for this chunk because it is labeled as mutually exclusive with {} for chunking".format(newFile, sourceFile))
 				return False
 
@@ -1729,10 +2469,17 @@ class projectSettings( object ):
 
 	def get_chunk( self, srcFile ):
 		"""Retrieves the chunk that a given file belongs to."""
-		for chunk in self.chunks:
-			if srcFile in chunk:
-				return _utils.GetChunkName( self.outputName, chunk )
-		return None
+		#Chunk names are expensive to compute, so map every file to its chunk's name once per set of chunks.
+		chunks = self.chunks
+		with self.mutex:
+			if self._chunkNameCache is None or self._chunkNameCache[0] is not chunks:
+				names = {}
+				for chunk in chunks:
+					name = _utils.GetChunkName( self.outputName, chunk )
+					for source in chunk:
+						names.setdefault( source, name )
+				self._chunkNameCache = ( chunks, names )
+			return self._chunkNameCache[1].get( srcFile )
 
 
 	def ContainsChunk( self, inputChunkFile ):
@@ -1745,53 +2492,16 @@ class projectSettings( object ):
 		return False
 
 
-	def save_md5( self, inFile ):
-		# If we're running on Windows, we need to remove the drive letter from the input file path.
-		#if platform.system( ) == "Windows":
-		#	inFile = inFile[2:]
-
-		if sys.version_info >= (3,0):
-			inFile = inFile.encode("utf-8")
-			baseName = os.path.basename( inFile ).decode("utf-8")
-		else:
-			baseName = os.path.basename( inFile )
-
-		md5file = "{}.md5".format( os.path.join( self.csbuildDir, "md5s", hashlib.md5( inFile ).hexdigest(), baseName ) )
-
-		md5dir = os.path.dirname( md5file )
-		if not os.access(md5dir , os.F_OK):
-			os.makedirs( md5dir )
-		newmd5 = ""
-		try:
-			newmd5 = _shared_globals.newmd5s[inFile]
-		except KeyError:
-			if sys.version_info >= (3, 0):
-				f = open( inFile, encoding = "latin-1" )
-			else:
-				f = open( inFile )
-			with f:
-				newmd5 = _utils.GetMd5( f )
-		finally:
-			with open( md5file, "wb" ) as f:
-				f.write( newmd5 )
-
-
-	def save_md5s( self, sources, headers ):
-		for source in sources:
-			self.save_md5( source )
-
-		for header in headers:
-			self.save_md5( header )
-
-		for path in self.allPaths:
-			self.save_md5( path )
-
-
 	def precompile_headers( self ):
+		"""
+		Get the jobs that precompile the project's headers. Nothing else in the project can compile until they're done.
+
+		:return: The jobs, not yet queued; empty if there's nothing to precompile
+		:rtype: list[csbuild._jobs.CompileJob]
+		"""
 		if not self.needsPrecompileC and not self.needsPrecompileCpp:
-			return True
+			return []
 
-		starttime = time.time( )
 		log.LOG_BUILD( "Precompiling headers..." )
 
 		self._builtSomething = True
@@ -1799,65 +2509,37 @@ class projectSettings( object ):
 		if not os.access(self.objDir , os.F_OK):
 			os.makedirs( self.objDir )
 
-		thread = None
-		cthread = None
-		cppobj = ""
-		cobj = ""
+		#Everything else in the project is waiting on these, so they go ahead of anything else that's waiting for a
+		#worker.
+		jobs = []
 		if self.needsPrecompileCpp:
-			if not _shared_globals.semaphore.acquire( False ):
-				if _shared_globals.max_threads != 1:
-					log.LOG_INFO( "Waiting for a build thread to become available..." )
-				_shared_globals.semaphore.acquire( True )
-			if _shared_globals.interrupted:
-				csbuild.Exit( 2 )
-
-			log.LOG_BUILD(
-				"Precompiling {0} ({1}/{2})...".format(
-					self.cppHeaderFile,
-					_shared_globals.current_compile,
-					_shared_globals.total_compiles ) )
-
-			_shared_globals.current_compile += 1
-
 			cppobj = self.activeToolchain.Compiler().GetPchFile( self.cppHeaderFile )
-
-			#precompiled headers block on current thread - run runs on current thread rather than starting a new one
-			thread = _utils.ThreadedBuild( self.cppHeaderFile, cppobj, self, True )
-			thread.start( )
+			jobs.append( _jobs.CompileJob( self.cppHeaderFile, cppobj, self, True, priority = float( "inf" ) ) )
 
 		if self.needsPrecompileC:
-			if not _shared_globals.semaphore.acquire( False ):
-				if _shared_globals.max_threads != 1:
-					log.LOG_INFO( "Waiting for a build thread to become available..." )
-				_shared_globals.semaphore.acquire( True )
-			if _shared_globals.interrupted:
-				csbuild.Exit( 2 )
+			cobj = self.activeToolchain.Compiler().GetPchFile( self.cHeaderFile )
+			jobs.append( _jobs.CompileJob( self.cHeaderFile, cobj, self, True, priority = float( "inf" ) ) )
 
-			log.LOG_BUILD(
-				"Precompiling {0} ({1}/{2})...".format(
-					self.cHeaderFile,
-					_shared_globals.current_compile,
-					_shared_globals.total_compiles ) )
+		return jobs
 
-			_shared_globals.current_compile += 1
 
-			cobj = self.activeToolchain.Compiler().GetPchFile( self.cHeaderFile )
+	def finish_precompile( self, jobs ):
+		"""
+		Record that the jobs from precompile_headers have all finished.
+
+		:param jobs: The jobs
+		:type jobs: list[csbuild._jobs.CompileJob]
+
+		:return: Whether or not they succeeded
+		:rtype: bool
+		"""
+		if jobs:
+			_shared_globals.precompiles_done += len( jobs )
 
-			#precompiled headers block on current thread - run runs on current thread rather than starting a new one
-			cthread = _utils.ThreadedBuild( self.cHeaderFile, cobj, self, True )
-			cthread.start( )
-
-		if thread:
-			thread.join( )
-			_shared_globals.precompiles_done += 1
-		if cthread:
-			cthread.join( )
-			_shared_globals.precompiles_done += 1
-
-		totaltime = time.time( ) - starttime
-		totalmin = math.floor( totaltime / 60 )
-		totalsec = math.floor( totaltime % 60 )
-		log.LOG_BUILD( "Precompile took {0}:{1:02}".format( int( totalmin ), int( totalsec ) ) )
+			totaltime = max( job.endTime for job in jobs ) - min( job.queueTime for job in jobs )
+			totalmin = math.floor( totaltime / 60 )
+			totalsec = math.floor( totaltime % 60 )
+			log.LOG_BUILD( "Precompile took {0}:{1:02}".format( int( totalmin ), int( totalsec ) ) )
 
 		self.precompileDone = True
 		self.precompileFailed = self.compilationFailed
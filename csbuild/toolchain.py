@@ -653,6 +653,41 @@ class SettingsOverrider( object ):
 		self._settingsOverrides["ignoreExternalHeaders"] = True
 
 
+	def SetDependencyMode( self, mode ):
+		"""
+		Sets how csbuild determines which headers each source file depends on.
+
+		With :DependencyMode.ScanHeaders: (the default), csbuild scans source and header files for #include directives
+		itself. With :DependencyMode.CompilerOutput:, the compiler is asked to write out a dependency file alongside each
+		object it generates, and those dependencies are used on later builds instead. This costs nothing beyond the compile
+		itself and takes preprocessor conditionals into account, so it's both faster and more exact than scanning.
+
+		Toolchains whose compiler can't generate dependency files, and objects that were built without one, fall back to
+		scanning.
+
+		:type mode: :DependencyMode:
+		:param mode: The dependency mode to use
+		"""
+		self._settingsOverrides["dependencyMode"] = mode
+
+
+	def SetSourceNormalization( self, mode ):
+		"""
+		Sets which changes to a source or header file are ignored when deciding whether the files that depend on it have
+		to be recompiled.
+
+		With :SourceNormalization.Comments: (the default), only edits to comments are ignored. With
+		:SourceNormalization.Whitespace:, whitespace that doesn't change how the file is tokenized is ignored as well, so
+		reindenting or reformatting a file doesn't cause a rebuild. Line breaks still count, since they end preprocessor
+		directives. Changes that only move code to different lines, or that only affect the spacing of text that's turned
+		into a string with the # operator, won't cause a rebuild in this mode either.
+
+		:type mode: :SourceNormalization:
+		:param mode: The normalization to use
+		"""
+		self._settingsOverrides["sourceNormalization"] = mode
+
+
 	def DisableWarnings( self ):
 		"""
 		Disables all warnings.
@@ -1307,6 +1342,35 @@ class compilerBase( SettingsOverrider ):
 		return ""
 
 
+	def GetDependencyFileArgs( self, depFile ):
+		"""
+		Get the arguments that make the compiler write a make-style dependency file listing every file included while
+		compiling, which is used in :DependencyMode.CompilerOutput:. These are appended to the extended command.
+
+		Compilers that can't generate dependency files should return an empty string, in which case csbuild falls back
+		on scanning for #include directives itself.
+
+		:param depFile: The dependency file to be generated
+		:type depFile: str
+
+		:return: The arguments to append to the extended command, or an empty string if unsupported
+		:rtype: str
+		"""
+		return ""
+
+
+	def SupportsObjectCache( self ):
+		"""
+		Whether objects built by this compiler can be stored in and fetched from the object cache. This requires that
+		the compiler writes nothing but the object file and the dependency file; compilers that also write to shared
+		files, such as program databases, should return False.
+
+		:return: True if the object cache can be used with this compiler
+		:rtype: bool
+		"""
+		return False
+
+
 	def GetExtraPostPreprocessorFlags(self):
 		return ""
 
@@ -350,6 +350,14 @@ class compiler_gcc( gccBase, toolchain.compilerBase ):
 		return 2
 
 
+	def GetDependencyFileArgs( self, depFile ):
+		return " -MMD -MF \"{}\"".format( depFile )
+
+
+	def SupportsObjectCache( self ):
+		return True
+
+
 	def GetPreprocessCommand(self, baseCmd, project, inFile ):
 		return "\"{}\" -E {} \"{}\"".format(baseCmd, self._getIncludeDirs( project.includeDirs ), inFile)
 
@@ -409,6 +417,9 @@ class compiler_gcc( gccBase, toolchain.compilerBase ):
 
 
 class linker_gcc( gccBase, toolchain.linkerBase ):
+	#Results of FindLibrary, shared by every copy of the linker: { key : ( path, actual library name ) }
+	_libraryLookups = { }
+
 	def __init__( self ):
 		gccBase.__init__(self)
 		toolchain.linkerBase.__init__( self )
@@ -693,10 +704,26 @@ class linker_gcc( gccBase, toolchain.linkerBase ):
 
 
 	def FindLibrary( self, project, library, libraryDirs, force_static, force_shared ):
-		if platform.system() == "Darwin":
-			return self._findLibraryDarwin( project, library, libraryDirs )
+		#Every target and architecture a project is built for looks for the same libraries, and asking ld is slow, so
+		#each distinct search is only made once per run. Relative library directories are relative to the current
+		#directory, and whether lib64 gets searched depends on the architecture.
+		key = ( self._ld, library, tuple( libraryDirs ), force_static, force_shared, os.getcwd( ),
+			project.outputArchitecture == "x64" )
+		result = linker_gcc._libraryLookups.get( key )
+		if result is None:
+			if platform.system() == "Darwin":
+				lib = self._findLibraryDarwin( project, library, libraryDirs )
+			else:
+				lib = self._findLibraryUnix( project, library, libraryDirs, force_static, force_shared )
+			result = ( lib, self._actual_library_names.get( library ) if lib else None )
+			linker_gcc._libraryLookups[key] = result
 		else:
-			return self._findLibraryUnix( project, library, libraryDirs, force_static, force_shared )
+			self._setupForProject( project )
+
+		lib, actualName = result
+		if actualName is not None:
+			self._actual_library_names[library] = actualName
+		return lib
 
 
 	def GetDefaultOutputExtension( self, projectType ):